@@ -0,0 +1,270 @@
+import logging
+import time
+
+import numpy as np
+
+from app.cell_index import CellIndex
+from app.gridmap import GridMap
+from app.profiling import peak_rss_mb
+from app.sequence import SequenceBuilder
+from app.traversal import BatchTraversal
+
+# 'off' skips the estimate, 'log' only logs it, 'enforce' stops before the data is reduced
+# when the estimate exceeds a budget and 'coarsen' doubles all grid resolutions until it fits
+BUDGET_ACTIONS = ['off', 'log', 'enforce', 'coarsen']
+
+# The estimate simplifies and traces at most this many individuals and points, a contiguous
+# piece of every sampled trajectory, and extrapolates to all points
+SAMPLE_INDIVIDUALS = 16
+SAMPLE_POINTS = 100_000
+
+# Building the map (polygons, rendering and saving) is estimated per occupied cell, measured
+# on a single core with the folium renderer. Tracing is estimated per traced (cell, individual)
+# triple, reduction and tracing themselves are timed on the sample
+SECONDS_PER_CELL = 5e-5
+BYTES_PER_CELL = 1000
+BYTES_PER_TRIPLE = 120
+# the raster and its labels of the dense backend
+BYTES_PER_RASTER_CELL = 5
+
+# 'coarsen' gives up beyond this factor
+MAX_COARSENING = 64
+
+def sample_trajectories(extracted, sample_individuals = SAMPLE_INDIVIDUALS, sample_points = SAMPLE_POINTS):
+    """
+    Picks evenly spaced individuals and a contiguous piece of each of their trajectories
+
+    :param extracted: List[Tuple(id, timestamps, coordinates)] - see DataExtractor
+    :param sample_individuals: The maximum number of individuals
+    :param sample_points: The maximum number of points of all pieces together
+    :returns: List[Tuple(id, timestamps, coordinates)] - the pieces
+    """
+    if len(extracted) == 0:
+        return []
+
+    picked = np.unique(np.linspace(0, len(extracted) - 1, min(len(extracted), sample_individuals)).astype(np.int64))
+    length = max(sample_points // len(picked), 2)
+
+    sample = []
+    for i in picked.tolist():
+        individual, timestamps, coordinates = extracted[i]
+        # the middle of the trajectory, the start is often the release site
+        start = max((len(coordinates) - length) // 2, 0)
+        sample.append((individual, timestamps[start:start + length], coordinates[start:start + length]))
+
+    return sample
+
+class Estimate:
+    """
+    The predicted size, runtime and memory of a run
+    """
+
+    def __init__(self, resolutions, raster_cells, points, triples, cells, seconds, memory_mb) -> None:
+        """
+        Initializes this instance
+
+        :param resolutions: The grid resolutions in meters
+        :param raster_cells: The cells of the bounding box raster at the finest resolution
+        :param points: The points after reduction
+        :param triples: The traced (cell, individual) triples at the finest resolution
+        :param cells: The occupied cells of all resolutions
+        :param seconds: The runtime in seconds
+        :param memory_mb: The peak memory in MB
+        """
+        self.__resolutions = resolutions
+        self.__raster_cells = raster_cells
+        self.__points = points
+        self.__triples = triples
+        self.__cells = cells
+        self.__seconds = seconds
+        self.__memory_mb = memory_mb
+
+    @property
+    def resolutions(self):
+        """
+        Gets the grid resolutions in meters
+        """
+        return self.__resolutions
+
+    @property
+    def raster_cells(self):
+        """
+        Gets the cells of the bounding box raster at the finest resolution
+        """
+        return self.__raster_cells
+
+    @property
+    def points(self):
+        """
+        Gets the points after reduction
+        """
+        return self.__points
+
+    @property
+    def triples(self):
+        """
+        Gets the traced (cell, individual) triples at the finest resolution
+        """
+        return self.__triples
+
+    @property
+    def cells(self):
+        """
+        Gets the occupied cells of all resolutions
+        """
+        return self.__cells
+
+    @property
+    def seconds(self):
+        """
+        Gets the runtime in seconds
+        """
+        return self.__seconds
+
+    @property
+    def memory_mb(self):
+        """
+        Gets the peak memory in MB
+        """
+        return self.__memory_mb
+
+    def fits(self, runtime_budget_s, memory_budget_mb):
+        """
+        Checks the estimate against the budgets, a budget of 0 is unlimited
+
+        :param runtime_budget_s: The runtime budget in seconds
+        :param memory_budget_mb: The memory budget in MB
+        """
+        return (runtime_budget_s <= 0 or self.__seconds <= runtime_budget_s) and \
+               (memory_budget_mb <= 0 or self.__memory_mb <= memory_budget_mb)
+
+    def to_dict(self):
+        """
+        Gets the estimate as dict, e.g. for a profiling record
+        """
+        return {'resolutions': list(self.__resolutions), 'raster_cells': self.__raster_cells,
+                'points': self.__points, 'triples': self.__triples, 'cells': self.__cells,
+                'seconds': round(self.__seconds, 1), 'memory_mb': round(self.__memory_mb)}
+
+    def __str__(self) -> str:
+        return 'grid resolutions {} m: {:,} raster cells, {:,} reduced points, {:,} traced triples, {:,} occupied cells, ' \
+               'about {:.0f} s and {:.0f} MB'.format(', '.join(str(x) for x in self.__resolutions), self.__raster_cells,
+                                                    self.__points, self.__triples, self.__cells, self.__seconds,
+                                                    self.__memory_mb)
+
+class ParameterAdvisor:
+    """
+    Predicts the runtime and memory of a run from a sample of the data, before all of it is
+    reduced and traced.
+
+    The sample is simplified once, its runtime and the number of points it keeps are
+    extrapolated to all points. For every grid resolution the simplified sample is traced,
+    the traced triples and occupied cells are extrapolated alike, but never beyond the raster
+    of the bounding box. The estimate is meant to catch settings that are off by orders of
+    magnitude, not to predict the runtime to the second.
+    """
+
+    def __init__(self, extracted, rdp_reduce, sample_individuals = SAMPLE_INDIVIDUALS, sample_points = SAMPLE_POINTS) -> None:
+        """
+        Samples and simplifies the data
+
+        :param extracted: List[Tuple(id, timestamps, coordinates)] - see DataExtractor
+        :param rdp_reduce: A serial Reduce instance without cache, with the settings of the run,
+                            so that its timing isn't distorted by starting worker processes
+        :param sample_individuals: The maximum number of sampled individuals
+        :param sample_points: The maximum number of sampled points
+        """
+        self.__points = sum(len(x[2]) for x in extracted)
+
+        coordinates = [x[2] for x in extracted if len(x[2]) > 0]
+        if len(coordinates) > 0:
+            lower = np.min([x.min(axis=0) for x in coordinates], axis=0)
+            upper = np.max([x.max(axis=0) for x in coordinates], axis=0)
+            self.__extent_in_m = (upper - lower) * SequenceBuilder.DEG_TO_M
+        else:
+            self.__extent_in_m = np.zeros(2)
+
+        sample = sample_trajectories(extracted, sample_individuals, sample_points)
+        sample_points = sum(len(x[2]) for x in sample)
+        self.__scale = self.__points / sample_points if sample_points > 0 else 0.0
+
+        start = time.perf_counter()
+        self.__sample = rdp_reduce(sample)
+        self.__reduce_seconds = (time.perf_counter() - start) * self.__scale
+
+    def raster_cells(self, resolution_in_m):
+        """
+        Gets the number of cells of the raster that covers the bounding box of all points
+
+        :param resolution_in_m: The resolution of the raster in meters
+        """
+        return int(np.prod(np.floor(self.__extent_in_m / resolution_in_m) + 1))
+
+    def estimate(self, resolutions):
+        """
+        Estimates a run at some grid resolutions, the finest one is traced, the others are
+        derived from it
+
+        :param resolutions: The grid resolutions in meters
+        :returns: Estimate
+        """
+        resolutions = sorted(resolutions)
+
+        triples = 0
+        seconds = self.__reduce_seconds
+        cells = []
+        for resolution in resolutions:
+            start = time.perf_counter()
+            cell_x, cell_y, individual, individuals = BatchTraversal(resolution)(self.__sample)
+            cell_index = CellIndex.from_triples(cell_x, cell_y, individual, individuals)
+            if resolution == resolutions[0]:
+                seconds += (time.perf_counter() - start) * self.__scale
+                triples = int(len(cell_x) * self.__scale)
+
+            cells.append(min(int(len(cell_index.keys) * self.__scale), self.raster_cells(resolution)))
+
+        seconds += sum(cells) * SECONDS_PER_CELL
+
+        raster_cells = self.raster_cells(resolutions[0])
+        raster_bytes = raster_cells * BYTES_PER_RASTER_CELL if raster_cells <= GridMap.DENSE_CELL_LIMIT else 0
+        memory = max(triples * BYTES_PER_TRIPLE, max(cells) * BYTES_PER_CELL + raster_bytes)
+        memory_mb = memory / (1024 * 1024) + (peak_rss_mb() or 0)
+
+        points = int(sum(len(x) for x in self.__sample.values()) * self.__scale)
+
+        return Estimate(resolutions, raster_cells, points, triples, sum(cells), seconds, memory_mb)
+
+    def advise(self, resolutions, runtime_budget_s = 0, memory_budget_mb = 0, action = 'log'):
+        """
+        Estimates a run and checks it against the budgets
+
+        :param resolutions: The grid resolutions in meters
+        :param runtime_budget_s: The runtime budget in seconds, 0 is unlimited
+        :param memory_budget_mb: The memory budget in MB, 0 is unlimited
+        :param action: One of BUDGET_ACTIONS except 'off'
+        :returns: Estimate - of the resolutions to use, with 'coarsen' all of them may be
+                    multiplied by a power of two
+        """
+        if action not in BUDGET_ACTIONS or action == 'off':
+            raise ValueError("Unknown budget action '{}'".format(action))
+
+        estimate = self.estimate(resolutions)
+        logging.info('Estimated run for %s', estimate)
+        if estimate.fits(runtime_budget_s, memory_budget_mb):
+            return estimate
+
+        if action == 'log':
+            logging.warning('The estimated run exceeds the budget of %s s and %s MB', runtime_budget_s, memory_budget_mb)
+            return estimate
+
+        if action == 'coarsen':
+            factor = 2
+            while factor <= MAX_COARSENING:
+                coarser = self.estimate([x * factor for x in resolutions])
+                if coarser.fits(runtime_budget_s, memory_budget_mb):
+                    logging.warning('Coarsened the grid resolutions by %s to fit the budget: %s', factor, coarser)
+                    return coarser
+                factor *= 2
+
+        raise ValueError("The estimated run ({}) exceeds the budget of {} s and {} MB, use a coarser grid resolution, "
+                         "a greater Rdp Epsilon or raise the budget".format(estimate, runtime_budget_s, memory_budget_mb))
@@ -1,15 +1,30 @@
 from sdk.moveapps_spec import hook_impl
-from movingpandas import TrajectoryCollection
+from typing import TYPE_CHECKING
 import logging
 
-import fiona
+import numpy as np
 import os
-import shutil
-from shapely.geometry import mapping
 
 from app.data_extract import DataExtractor
 from app.reduce import Reduce
-from app.generate_map import generate_map
+from app.reduce_cache import ReduceCache
+from app.simplify import SIMPLIFIERS
+from app.polygonize import POLYGONIZATION_MODES
+from app.gridmap import GridMap
+from app.projection import GridProjection, GRID_PROJECTIONS
+from app.profiling import StageProfiler
+from app.generate_map import build_map, RENDERERS
+from app.graduation import GRADUATION_MODES
+from app.export import OUTPUT_FORMATS, polygons_to_frame, write_polygons
+from app.trace_store import TraceStore
+from app.incremental import CorridorState, update_index, build_map_incremental
+from app.streaming import TrajectorySource, open_source, trace_stream
+from app.time_windows import TIME_WINDOWS, split_windows, join_windows, trace_windows
+from app.advisor import BUDGET_ACTIONS, ParameterAdvisor
+
+if TYPE_CHECKING:
+    # movingpandas takes long to import, the data is unpickled as TrajectoryCollection anyway
+    from movingpandas import TrajectoryCollection
 
 class App(object):
 
@@ -38,12 +53,91 @@ class App(object):
 
         check_for_key_and_value('rdp_resolution', 350)
         check_for_key_and_value('grid_resolution', 2000)
+        check_for_key_and_value('workers', 1)
+        check_for_key_and_value('reduce_cache_size_mb', 512)
+        check_for_key_and_value('map_simplification', 0)
+        check_for_key_and_value('runtime_budget_s', 0)
+        check_for_key_and_value('memory_budget_mb', 0)
         check_for_key_and_value('graduation_white', 0)
         check_for_key_and_value('graduation_lg', 1)
         check_for_key_and_value('graduation_g', 2)
         check_for_key_and_value('graduation_dg', 3)
         check_for_key_and_value('graduation_blk', 4)
 
+        if 'simplifier' not in config:
+            config['simplifier'] = 'douglas_peucker'
+        elif config['simplifier'] not in SIMPLIFIERS:
+            raise ValueError("Simplifier has to be one of {}".format(", ".join(SIMPLIFIERS.keys())))
+
+        if 'polygonization' not in config:
+            config['polygonization'] = 'outline'
+        elif config['polygonization'] not in POLYGONIZATION_MODES:
+            raise ValueError("Polygonization has to be one of {}".format(", ".join(POLYGONIZATION_MODES)))
+
+        if 'grid_resolution_sweep' not in config or config['grid_resolution_sweep'] in (None, ''):
+            config['grid_resolution_sweep'] = []
+        else:
+            sweep = config['grid_resolution_sweep']
+            if isinstance(sweep, str):
+                sweep = sweep.replace(',', ' ').split()
+
+            try:
+                sweep = [int(x) for x in sweep]
+            except (TypeError, ValueError):
+                raise ValueError("Grid resolution sweep has to be a list of resolutions in meters, e.g. '1000, 4000'")
+
+            if any(x <= 0 for x in sweep):
+                raise ValueError("Grid resolution sweep may only contain positive resolutions")
+            config['grid_resolution_sweep'] = sweep
+
+        if 'grid_projection' not in config:
+            config['grid_projection'] = 'none'
+        elif config['grid_projection'] not in GRID_PROJECTIONS:
+            raise ValueError("Grid projection has to be one of {}".format(", ".join(GRID_PROJECTIONS)))
+
+        if 'raster_backend' not in config:
+            config['raster_backend'] = 'auto'
+        elif config['raster_backend'] not in GridMap.BACKENDS:
+            raise ValueError("Raster backend has to be one of {}".format(", ".join(GridMap.BACKENDS)))
+
+        if 'graduation_mode' not in config:
+            config['graduation_mode'] = 'linear'
+        elif config['graduation_mode'] not in GRADUATION_MODES:
+            raise ValueError("Graduation mode has to be one of {}".format(", ".join(GRADUATION_MODES)))
+
+        if 'map_renderer' not in config:
+            config['map_renderer'] = 'folium'
+        elif config['map_renderer'] not in RENDERERS:
+            raise ValueError("Map renderer has to be one of {}".format(", ".join(RENDERERS)))
+
+        if 'output_format' not in config:
+            config['output_format'] = 'shapefile'
+        elif config['output_format'] not in OUTPUT_FORMATS:
+            raise ValueError("Output format has to be one of {}".format(", ".join(OUTPUT_FORMATS.keys())))
+
+        if 'time_windows' not in config:
+            config['time_windows'] = 'none'
+        elif config['time_windows'] not in TIME_WINDOWS:
+            raise ValueError("Time windows has to be one of {}".format(", ".join(TIME_WINDOWS)))
+
+        if 'budget_action' not in config:
+            config['budget_action'] = 'log'
+        elif config['budget_action'] not in BUDGET_ACTIONS:
+            raise ValueError("Budget action has to be one of {}".format(", ".join(BUDGET_ACTIONS)))
+
+        if 'incremental' not in config:
+            config['incremental'] = False
+        elif config['incremental'] and any(x % config['grid_resolution'] != 0 for x in config['grid_resolution_sweep']):
+            raise ValueError("With incremental updates every additional grid resolution has to be a multiple of grid resolution")
+        elif config['incremental'] and config['time_windows'] != 'none':
+            raise ValueError("Incremental updates can't be combined with time windows")
+
+        if 'profiling' not in config:
+            config['profiling'] = False
+
+        if 'reduce_cache' not in config:
+            config['reduce_cache'] = False
+
         w_leq_lg = config['graduation_white'] <= config["graduation_lg"]
         lg_leq_g = config['graduation_lg'] <= config["graduation_g"]
         g_leq_dg = config['graduation_g'] <= config["graduation_dg"]
@@ -60,81 +154,245 @@ class App(object):
         
         return config
 
-    def save_polygon(self, data, crs, graduation):
+    @staticmethod
+    def sample_positions(data):
+        """
+        Gets the positions of the first trajectory, enough to choose a projection without
+        reading all data
+
+        :param data: The TrajectoryCollection or TrajectorySource
+        :returns: Array (n, 2) of (lat, lon)
+        """
+        source = data if isinstance(data, TrajectorySource) else DataExtractor()(data)
+        for _, _, coordinates in source:
+            return coordinates[:, ::-1]
+
+        return np.empty((0, 2))
+
+    def save_polygon(self, data, crs, graduation, name = 'corridors', output_format = 'shapefile'):
         """
-        Experimental: Tries to save data to a shapefile using fiona engine
+        Saves the polygons of every layer as one file, one feature per polygon
 
         :param data: Dict[int, Multipolygon/Polygon] - The polygon data with its bin
+        :param crs: The coordinate reference system of the polygons
+        :param graduation: The borders of each bin
+        :param name: The name of the artifact, e.g. <name>.shp.zip for a shapefile
+        :param output_format: One of OUTPUT_FORMATS
         """
+        path = self.moveapps_io.create_artifacts_file(name + OUTPUT_FORMATS[output_format][1])
+        write_polygons(polygons_to_frame(data, graduation, crs), path, output_format, name)
 
-        def swap_mapping(map):
-            polygon_exterior = map['coordinates']
-
-            res = []
-            for coordinates in polygon_exterior:
-                tmp = tuple((x[1], x[0]) for x in coordinates)
-                res.append(tmp)
-
-            map['coordinates'] = tuple(res)
-            return map
-
-
-
-        schema = {
-            'geometry': 'Polygon',
-            'properties': {'recorded individuals': 'int'},
-        }
-
-        # corridors_shape_path = self.moveapps_io.create_artifacts_file('corridors.shp')
-        corridors_shape_folder = self.moveapps_io.create_artifacts_file('shapefile')
-        if os.path.exists(corridors_shape_folder):
-            shutil.rmtree(corridors_shape_folder)
-        os.mkdir(corridors_shape_folder)
-
-        shape_output_path = self.moveapps_io.create_artifacts_file('shapefile/corridors.shp')
-        with fiona.open(shape_output_path, 'w', 'ESRI Shapefile', schema, crs=crs) as c:
-                for i in data.keys():
-                    if i == 0:
-                        continue
-                    
-                    try:
-                        for poly in data[i].geoms:
-                            if poly.geom_type != "Polygon":
-                                continue
-                            
-                            c.write(
-                                {
-                                    'geometry': swap_mapping(mapping(poly)),
-                                    'properties': { 'recorded individuals': graduation[i-1] }
-                                }
-                            )
-                    except AttributeError:
-                        c.write(
-                            {
-                                'geometry': swap_mapping(mapping(data[i])),
-                                'properties': { 'recorded individuals': graduation[i-1] }
-                            }
-                        )
-        
-        shutil.make_archive(self.moveapps_io.create_artifacts_file('corridors.shp'), "zip", corridors_shape_folder)
-        shutil.rmtree(corridors_shape_folder)
+    @hook_impl
+    def load_input(self, source_file: str):
+        """
+        Streams large CSV/Parquet inputs instead of loading them at once
+
+        :param source_file: The path of the input data
+        :returns: TrajectorySource or None for pickled input
+        """
+        return open_source(source_file)
 
     @hook_impl
-    def execute(self, data: TrajectoryCollection, config: dict) -> TrajectoryCollection:
+    def execute(self, data: 'TrajectoryCollection', config: dict) -> 'TrajectoryCollection':
         """Your app code goes here"""
         logging.info(f'Welcome to the {config}')
         config = App.check_config(config)
 
-        extractor = DataExtractor()
-        d = [x for x in extractor(data)]
-        # return some useful data for next apps in the workflow
+        profiler = StageProfiler()
+        cache = None
+        if config['reduce_cache'] and 'REDUCE_CACHE_DIR' not in os.environ:
+            # the artifacts directory is new for every run and published, a cache there would never hit
+            logging.warning('Caching simplified trajectories requires the environment variable REDUCE_CACHE_DIR, '
+                            'running without cache')
+        elif config['reduce_cache']:
+            cache = ReduceCache(os.environ['REDUCE_CACHE_DIR'], config['reduce_cache_size_mb'] * 1024 * 1024)
+
+        rdpReduce = Reduce(config['rdp_resolution'], workers=config['workers'], simplifier=config['simplifier'],
+                           cache=cache)
+
+        # the finest resolution is traced first, so that coarser ones can be derived from it
+        resolutions = sorted(set([config['grid_resolution']] + config['grid_resolution_sweep']))
+
+        if config['incremental'] and 'CORRIDOR_STATE_FILE' not in os.environ:
+            # like the cache, a state in the artifacts directory would never be found again
+            logging.warning('Incremental updates require the environment variable CORRIDOR_STATE_FILE, '
+                            'running without incremental updates')
+            config['incremental'] = False
+
+        state = None
+        projection = None
+        if config['incremental']:
+            # only the fixes after the last stored one of every individual are traced
+            state_path = os.environ['CORRIDOR_STATE_FILE']
+            parameters = {key: config[key] for key in ('grid_resolution', 'rdp_resolution', 'simplifier', 'grid_projection',
+                                                       'polygonization')}
+            # the stored outlines are keyed by their tile
+            parameters['tile_size'] = GridMap.TILE_SIZE
+
+            state = CorridorState.load(state_path)
+            if state is not None and not state.matches(parameters):
+                logging.info('Settings differ from the stored corridor state, starting from scratch')
+                state = None
+
+            # the stored cells can only be continued in the projection they were traced in
+            if state is not None and state.parameters.get('projection_crs') is not None:
+                projection = GridProjection(state.parameters['projection_crs'])
+            elif state is None and config['grid_projection'] != 'none':
+                projection = GridProjection.for_points(App.sample_positions(data), config['grid_projection'])
+            parameters['projection_crs'] = projection.crs if projection is not None else None
+
+            source = data if isinstance(data, TrajectorySource) else DataExtractor()(data)
+            with profiler.stage('update', resolution=config['grid_resolution']) as record:
+                updated, last_timestamps, last_positions = update_index(source, rdpReduce, config['grid_resolution'],
+                                                                        state, record, projection)
+                record['resumed'] = state is not None
+
+            def trace(resolution):
+                if resolution == config['grid_resolution']:
+                    return updated
+                return updated.coarsen(resolution // config['grid_resolution'])
+
+            crs = data.crs if isinstance(data, TrajectorySource) else data.trajectories[0].crs
+        elif isinstance(data, TrajectorySource):
+            if config['time_windows'] != 'none':
+                raise ValueError("Time windows are not supported for streamed input")
+
+            # streamed input, only the traced cells are kept in memory
+            if config['grid_projection'] != 'none':
+                projection = GridProjection.for_points(App.sample_positions(data), config['grid_projection'])
+
+            with profiler.stage('stream', resolution=resolutions[0]) as record:
+                finest = trace_stream(data, rdpReduce, resolutions[0], record, projection=projection)
+                if cache is not None:
+                    record['cache_hits'] = cache.hits
+                    record['cache_misses'] = cache.misses
+
+            def trace(resolution):
+                if resolution == resolutions[0]:
+                    return finest
+                if resolution % resolutions[0] == 0:
+                    return finest.coarsen(resolution // resolutions[0])
+
+                # not derivable, the source has to be read again
+                return trace_stream(data, rdpReduce, resolution, projection=projection)
+
+            crs = data.crs
+        else:
+            with profiler.stage('extract') as record:
+                extractor = DataExtractor()
+                d = [x for x in extractor(data)]
+
+                record['individuals'] = len(d)
+                record['points'] = sum(len(x[2]) for x in d)
+            # return some useful data for next apps in the workflow
+
+            if config['budget_action'] != 'off':
+                with profiler.stage('advise') as record:
+                    # serial and without cache, the sample must neither pay for a process pool nor fill the cache
+                    sampleReduce = Reduce(config['rdp_resolution'], workers=1, simplifier=config['simplifier'], cache=None)
+                    estimate = ParameterAdvisor(d, sampleReduce).advise(resolutions, config['runtime_budget_s'],
+                                                                        config['memory_budget_mb'], config['budget_action'])
+                    record.update(estimate.to_dict())
+
+                if estimate.resolutions != resolutions:
+                    # coarsened to fit the budget, all resolutions by the same factor
+                    factor = estimate.resolutions[0] // resolutions[0]
+                    config['grid_resolution'] *= factor
+                    config['grid_resolution_sweep'] = [x * factor for x in config['grid_resolution_sweep']]
+                    resolutions = estimate.resolutions
+
+            with profiler.stage('reduce', points_in=sum(len(x[2]) for x in d)) as record:
+                if config['time_windows'] != 'none':
+                    # the windows are derived from the timestamps of the reduced points, the trajectories
+                    # are split where the window changes, so that every window keeps its first fix
+                    timestamps = join_windows(rdpReduce(split_windows(d, config['time_windows']), timestamps=True))
+                    reduced = {key: points for key, (_, points) in timestamps.items()}
+                    timestamps = {key: times for key, (times, _) in timestamps.items()}
+                else:
+                    reduced = rdpReduce(d)
+                record['points_out'] = sum(len(x) for x in reduced.values())
+                if cache is not None:
+                    record['cache_hits'] = cache.hits
+                    record['cache_misses'] = cache.misses
+
+            if config['grid_projection'] != 'none':
+                with profiler.stage('project', points=sum(len(x) for x in reduced.values())):
+                    projection = GridProjection.for_points(np.concatenate(list(reduced.values())), config['grid_projection'])
+                    reduced = {key: projection.forward(points) for key, points in reduced.items()}
+
+            if config['time_windows'] != 'none':
+                finest = {}
+                def trace(resolution):
+                    if resolution == resolutions[0]:
+                        finest.update(trace_windows({key: (timestamps[key], points) for key, points in reduced.items()},
+                                                    resolution, config['time_windows']))
+                        return finest
+                    if resolution % resolutions[0] == 0:
+                        return {key: x.coarsen(resolution // resolutions[0]) for key, x in finest.items()}
+
+                    return trace_windows({key: (timestamps[key], points) for key, points in reduced.items()},
+                                         resolution, config['time_windows'])
+            else:
+                store = TraceStore(workers=config['workers'])
+                def trace(resolution):
+                    return store.trace(reduced, resolution)
+
+            crs = data.trajectories[0].crs
+
+        for resolution in resolutions:
+            with profiler.stage('trace', resolution=resolution) as record:
+                # the cells per time window, a single entry without time windows
+                if config['time_windows'] != 'none':
+                    windows = trace(resolution)
+                else:
+                    windows = {None: trace(resolution)}
+
+                record['windows'] = len(windows)
+                record['cell_individual_pairs'] = sum(len(x.keys) for x in windows.values())
+                record['cells'] = sum(len(x) for x in windows.values())
+
+            for window, cell_index in windows.items():
+                if config['incremental'] and resolution == config['grid_resolution']:
+                    tiles = {}
+                    if config['polygonization'] == 'outline':
+                        map, polygon_data, graduation, tiles = build_map_incremental(state, cell_index, resolution,\
+                                                                       config['minimum_individuals_per_cell'], profiler,\
+                                                                       projection, config['map_renderer'],\
+                                                                       config['map_simplification'], config['graduation_mode'])
+                    else:
+                        map, polygon_data, graduation = build_map(cell_index, resolution_in_m=resolution,\
+                                                         individual_threshold=config['minimum_individuals_per_cell'],\
+                                                         polygonization=config['polygonization'], profiler=profiler,\
+                                                         backend=config['raster_backend'], workers=config['workers'],\
+                                                         projection=projection, renderer=config['map_renderer'],\
+                                                         simplify_in_m=config['map_simplification'],\
+                                                         graduation_mode=config['graduation_mode'])
+
+                    CorridorState(parameters, cell_index, last_timestamps, last_positions, graduation, tiles).save(state_path)
+                else:
+                    map, polygon_data, graduation = build_map(cell_index, resolution_in_m=resolution,\
+                                                     individual_threshold=config['minimum_individuals_per_cell'],\
+                                                     polygonization=config['polygonization'], profiler=profiler,\
+                                                     backend=config['raster_backend'], workers=config['workers'],\
+                                                     projection=projection, renderer=config['map_renderer'],\
+                                                     simplify_in_m=config['map_simplification'],\
+                                                     graduation_mode=config['graduation_mode'])
+
+                # the artifacts of the sweep are suffixed with their resolution, those of a time window with its name
+                suffix = '' if resolution == config['grid_resolution'] else '_{}'.format(resolution)
+                suffix += '' if window is None else '_{}'.format(window)
+
+                with profiler.stage('save_map'):
+                    map.save(self.moveapps_io.create_artifacts_file('corridors_map{}.html'.format(suffix)))
+
+                with profiler.stage('export', output_format=config['output_format'], layers=len(polygon_data)):
+                    self.save_polygon(polygon_data, crs, graduation, 'corridors{}'.format(suffix), config['output_format'])
 
-        rdpReduce = Reduce(config['rdp_resolution'])
-        reduced = rdpReduce(d)
-        map, polygon_data, graduation = generate_map(reduced, resolution_in_m=config['grid_resolution'],\
-                                         individual_threshold=config['minimum_individuals_per_cell'])
+        if config['profiling']:
+            profiler.write(self.moveapps_io.create_artifacts_file('profiling.json'))
 
-        map.save(self.moveapps_io.create_artifacts_file('corridors_map.html'))
-        self.save_polygon(polygon_data, data.trajectories[0].crs, graduation)
+        # a streamed input is no TrajectoryCollection, next apps in the workflow can't process it
+        if isinstance(data, TrajectorySource):
+            return None
 
         return data
\ No newline at end of file
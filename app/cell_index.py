@@ -0,0 +1,252 @@
+import numpy as np
+
+class CellIndex:
+    """
+    Compact index of the individuals recorded per grid cell
+
+    Cells are packed into int64 keys, individuals are stored as small integer codes
+    into the list of individuals. Only the distinct (cell, individual) pairs are kept,
+    sorted by cell and individual.
+    """
+
+    OFFSET = 1 << 31
+
+    def __init__(self, keys, codes, individuals) -> None:
+        """
+        Initializes this instance, use from_triples to build an index from traced cells
+
+        :param keys: The sorted packed cell keys of the distinct (cell, individual) pairs
+        :param codes: The individual codes of the distinct (cell, individual) pairs
+        :param individuals: The individuals, indexed by code
+        """
+        self.__keys = keys
+        self.__codes = codes
+        self.__individuals = list(individuals)
+
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+        starts = np.flatnonzero(first)
+
+        self.__cell_keys = keys[starts]
+        self.__counts = np.diff(np.append(starts, len(keys)))
+
+    @staticmethod
+    def pack(cell_a, cell_b):
+        """
+        Packs both cell coordinates into one int64 key, the keys sort like the
+        (cell_a, cell_b) tuples
+        """
+        a = np.asarray(cell_a, dtype=np.int64)
+        b = np.asarray(cell_b, dtype=np.int64) + CellIndex.OFFSET
+        return (a << 32) | b
+
+    @staticmethod
+    def unpack(keys):
+        """
+        Unpacks int64 keys to an (n, 2) array of cell coordinates
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        return np.stack((keys >> 32, (keys & 0xFFFFFFFF) - CellIndex.OFFSET), axis=1)
+
+    @staticmethod
+    def deduplicate(keys, codes):
+        """
+        Sorts the (key, code) pairs and removes duplicates
+
+        :returns: Tuple(keys, codes) of the distinct pairs
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        codes = np.asarray(codes, dtype=np.int32)
+
+        order = np.lexsort((codes, keys))
+        keys = keys[order]
+        codes = codes[order]
+
+        distinct = np.ones(len(keys), dtype=bool)
+        distinct[1:] = (keys[1:] != keys[:-1]) | (codes[1:] != codes[:-1])
+
+        return keys[distinct], codes[distinct]
+
+    @classmethod
+    def from_triples(cls, cell_a, cell_b, codes, individuals):
+        """
+        Builds the index from traced cells, duplicates are allowed
+
+        :param cell_a: The first cell coordinate of every traced cell
+        :param cell_b: The second cell coordinate of every traced cell
+        :param codes: The individual code of every traced cell
+        :param individuals: The individuals, indexed by code
+        """
+        keys, codes = CellIndex.deduplicate(CellIndex.pack(cell_a, cell_b), codes)
+        return cls(keys, codes, individuals)
+
+    def coarsen(self, factor):
+        """
+        Aggregates the cells to a grid with factor times the resolution, a coarse cell
+        records every individual of the fine cells it contains
+
+        :param factor: The integer ratio of the coarse and the fine resolution
+        :returns: CellIndex of the coarse cells
+        """
+        cells = np.floor_divide(CellIndex.unpack(self.__keys), int(factor))
+        keys, codes = CellIndex.deduplicate(CellIndex.pack(cells[:, 0], cells[:, 1]), self.__codes)
+        return CellIndex(keys, codes, self.__individuals)
+
+    @property
+    def keys(self):
+        """
+        Gets the packed cell keys of all (cell, individual) pairs
+        """
+        return self.__keys
+
+    @property
+    def codes(self):
+        """
+        Gets the individual codes of all (cell, individual) pairs
+        """
+        return self.__codes
+
+    @property
+    def individuals(self):
+        """
+        Gets the individuals, indexed by code
+        """
+        return self.__individuals
+
+    @property
+    def cell_keys(self):
+        """
+        Gets the packed keys of the distinct cells
+        """
+        return self.__cell_keys
+
+    @property
+    def cells(self):
+        """
+        Gets the distinct cells as (n, 2) array
+        """
+        return CellIndex.unpack(self.__cell_keys)
+
+    @property
+    def counts(self):
+        """
+        Gets the number of individuals recorded per distinct cell
+        """
+        return self.__counts
+
+    def __len__(self):
+        """
+        The number of distinct cells
+        """
+        return len(self.__cell_keys)
+
+    def to_dict(self):
+        """
+        Converts the index to a mapping from cell tuple to the set of its individuals
+        """
+        res = {}
+        for (a, b), code in zip(CellIndex.unpack(self.__keys).tolist(), self.__codes.tolist()):
+            if (a, b) not in res:
+                res[(a, b)] = set()
+
+            res[(a, b)].add(self.__individuals[code])
+
+        return res
+
+class CellIndexBuilder:
+    """
+    Accumulates traced cells batch by batch, e.g. individual by individual.
+
+    Added cells are buffered and compacted to the distinct (cell, individual) pairs
+    whenever the buffer grows beyond COMPACT_PAIRS, so the memory needed is bounded by
+    the size of the final index rather than by the number of traced cells.
+    """
+
+    COMPACT_PAIRS = 1 << 22
+
+    def __init__(self) -> None:
+        """
+        Initializes an empty builder
+        """
+        self.__individuals = []
+        self.__codes_of = {}
+
+        self.__keys = np.empty(0, dtype=np.int64)
+        self.__codes = np.empty(0, dtype=np.int32)
+
+        self.__pending_keys = []
+        self.__pending_codes = []
+        self.__pending = 0
+
+    @classmethod
+    def from_index(cls, cell_index):
+        """
+        Creates a builder that continues an existing index
+
+        :param cell_index: The CellIndex, its individuals keep their codes
+        """
+        builder = cls()
+        for individual in cell_index.individuals:
+            builder.code(individual)
+
+        builder.__keys = cell_index.keys
+        builder.__codes = cell_index.codes
+        return builder
+
+    @property
+    def individuals(self):
+        """
+        Gets the individuals added so far, indexed by code
+        """
+        return self.__individuals
+
+    def code(self, individual):
+        """
+        Gets the code of an individual, individuals seen for the first time get the next free code
+        """
+        if individual not in self.__codes_of:
+            self.__codes_of[individual] = len(self.__individuals)
+            self.__individuals.append(individual)
+
+        return self.__codes_of[individual]
+
+    def add(self, cell_a, cell_b, individual):
+        """
+        Adds traced cells of one individual, duplicates are allowed
+
+        :param cell_a: The first cell coordinate of every traced cell
+        :param cell_b: The second cell coordinate of every traced cell
+        :param individual: The individual all cells were recorded for
+        """
+        code = self.code(individual)
+        if len(cell_a) == 0:
+            return
+
+        self.__pending_keys.append(CellIndex.pack(cell_a, cell_b))
+        self.__pending_codes.append(np.full(len(cell_a), code, dtype=np.int32))
+        self.__pending += len(cell_a)
+
+        if self.__pending >= CellIndexBuilder.COMPACT_PAIRS:
+            self.__compact()
+
+    def __compact(self):
+        """
+        Merges the buffered cells into the distinct pairs
+        """
+        if self.__pending == 0:
+            return
+
+        self.__keys, self.__codes = CellIndex.deduplicate(
+            np.concatenate([self.__keys] + self.__pending_keys),
+            np.concatenate([self.__codes] + self.__pending_codes))
+
+        self.__pending_keys = []
+        self.__pending_codes = []
+        self.__pending = 0
+
+    def build(self):
+        """
+        Builds the index of all cells added so far
+        """
+        self.__compact()
+        return CellIndex(self.__keys, self.__codes, self.__individuals)
@@ -9,33 +9,28 @@ class DataExtractor:
     def __call__(self, trajectory_collection):
         """
         Performs extraction on passed TrajectoryCollection
-        """
 
-        for trajectory in trajectory_collection.trajectories:
-            df_columns = trajectory.df.columns.values
+        The data is read column wise, timestamps as datetime64 and the positions straight
+        from the coordinate buffer of the GeoSeries.
 
-            timestamp_key = trajectory.df.timestamp.name
-            geo_key = trajectory.df.geometry.name
-            individual_key = trajectory.df.individual_local_identifier.name
+        :returns: Generator of Tuple(id, timestamps, coordinates) - coordinates is a
+                    contiguous (n, 2) float64 array of (x, y) per timestamp
+        """
+        import shapely
 
-            ts_index = np.where(df_columns == timestamp_key)[0][0]
-            geo_index = np.where(df_columns == geo_key)[0][0]
-            individual_index = np.where(df_columns == individual_key)[0][0]
+        for trajectory in trajectory_collection.trajectories:
+            df = trajectory.df
 
-            first_id = None
-            data = []
-            for row in trajectory.df.values:
+            timestamp_key = df.timestamp.name
+            individual_key = df.individual_local_identifier.name
 
-                id = row[individual_index]
-                ts = row[ts_index]
-                geo = row[geo_index]
+            ids = df[individual_key].to_numpy()
 
-                if first_id is None:
-                    first_id = id
+            first_id = ids[0] if len(ids) > 0 else None
+            if len(ids) > 1 and np.any(ids[1:] != first_id):
+                raise ValueError("Multiple individual IDs in one trajectory!")
 
-                if first_id != id:
-                    raise ValueError("Multiple individual IDs in one trajectory!")
-                
-                data.append([ts, geo.x, geo.y])
+            timestamps = df[timestamp_key].to_numpy(dtype='datetime64[ns]')
+            coordinates = np.ascontiguousarray(shapely.get_coordinates(df.geometry.array), dtype=np.float64)
 
-            yield (first_id, data)
+            yield (first_id, timestamps, coordinates)
@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+# The file formats the corridors can be exported in: the OGR driver and the suffix of the artifact.
+# A shapefile consists of several files and is zipped, the other formats are single files
+OUTPUT_FORMATS = {
+    'shapefile': ('ESRI Shapefile', '.shp.zip'),
+    'geopackage': ('GPKG', '.gpkg'),
+    'flatgeobuf': ('FlatGeobuf', '.fgb')
+}
+
+def polygons_to_frame(data, graduation, crs):
+    """
+    Splits the geometry of every layer into its polygons, one row per polygon
+
+    :param data: Dict[int, Multipolygon/Polygon] - the geometry per layer in (lat, lon)
+    :param graduation: The borders of each bin, see generate_map
+    :param crs: The coordinate reference system of the polygons
+    :returns: GeoDataFrame with the column 'recorded individuals' and the polygons in (lon, lat)
+    """
+    import geopandas as gpd
+    import shapely
+
+    labels = [x for x in sorted(data.keys()) if x != 0]
+
+    parts = [shapely.get_parts(data[x]) for x in labels]
+    parts = [x[shapely.get_type_id(x) == shapely.GeometryType.POLYGON] for x in parts]
+    counts = [len(x) for x in parts]
+
+    geometries = np.concatenate(parts) if len(parts) > 0 else np.empty(0, dtype=object)
+    individuals = np.repeat(np.array([graduation[x - 1] for x in labels], dtype=np.int64), counts)
+
+    # the polygons are stored in (lat, lon), files expect (x, y)
+    geometries = shapely.transform(geometries, lambda x: x[:, ::-1])
+
+    return gpd.GeoDataFrame({'recorded individuals': individuals}, geometry=geometries, crs=crs)
+
+def write_polygons(frame, path, output_format = 'shapefile', name = 'corridors'):
+    """
+    Writes all polygons at once
+
+    :param frame: GeoDataFrame, see polygons_to_frame
+    :param path: The path of the artifact, including the suffix of OUTPUT_FORMATS
+    :param output_format: One of OUTPUT_FORMATS
+    :param name: The name of the layer, and of the files in the zipped shapefile
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError("Unknown output format '{}'".format(output_format))
+
+    driver = OUTPUT_FORMATS[output_format][0]
+
+    if output_format != 'shapefile':
+        # an existing GeoPackage would keep its other layers, so the file is replaced
+        if os.path.exists(path):
+            os.remove(path)
+
+        frame.to_file(path, driver=driver, layer=name)
+        return
+
+    with tempfile.TemporaryDirectory() as folder:
+        frame.to_file(os.path.join(folder, '{}.shp'.format(name)), driver=driver)
+        shutil.make_archive(path[:-len('.zip')], 'zip', folder)
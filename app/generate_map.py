@@ -1,44 +1,177 @@
-import numpy as np
-import folium
-import branca
-
-from collections import Counter
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 
-from scipy.spatial import ConvexHull
-from shapely.geometry import Polygon
+import numpy as np
 
 from app.sequence import SequenceBuilder
+from app.traversal import BatchTraversal
+from app.cell_index import CellIndex
 from app.gridmap import GridMap
+from app.polygonize import polygonize, subtract_higher_layers
+from app.profiling import StageProfiler
+from app.graduation import determine_graduation
+
+# 'folium' draws every polygon as its own folium.Polygon, 'geojson' writes all layers once as a
+# quantized GeoJSON FeatureCollection drawn by a single folium.GeoJson layer
+RENDERERS = ['folium', 'geojson']
+
+# Parallel tracing sends shards of at least this many segments to a worker process, long
+# trajectories are split into several shards
+TRACE_SHARD_SEGMENTS = 50_000
+
+def trace_cells(individual_and_data, resolution_in_m, engine = 'batch', workers = 1):
+    """
+    Traces all cells along each trajectory line segment
+
+    :param individual_and_data: A map that contains the trajectory for every individual
+    :param resolution_in_m: The resolution of the raster in meters
+    :param engine: 'batch' traces all segments at once with BatchTraversal, 'sequence'
+                    walks every segment that leaves the neighborhood of its cell with a Sequence
+    :param workers: The number of worker processes, see trace_cells_parallel, 1 runs serially,
+                    0 uses all available cores
+    :returns: CellIndex - the individuals recorded per cell
+    """
+    workers = workers if workers > 0 else os.cpu_count()
+    if workers > 1:
+        return trace_cells_parallel(individual_and_data, resolution_in_m, engine, workers)
+
+    if engine == 'batch':
+        return CellIndex.from_triples(*BatchTraversal(resolution_in_m)(individual_and_data))
 
-MAX_GRADUATION_SIZE = 12
+    if engine != 'sequence':
+        raise ValueError("Unknown tracing engine '{}'".format(engine))
 
-def determine_graduation(all_cells_stripped, individual_threshold):
-    key_lengths = [len(value) for  value in all_cells_stripped.values()]
+    individuals = list(individual_and_data.keys())
+    cell_a = []
+    cell_b = []
+    codes = []
 
-    occurances = dict(Counter(key_lengths))
+    builder = SequenceBuilder(resolution_in_m)
+    traversal = BatchTraversal(resolution_in_m)
+    for code, individual in enumerate(individuals):
+        data = individual_and_data[individual]
+        if len(data) < 2:
+            continue
+
+        # segments that stay in their cell or move into an adjacent one cover just their
+        # start and stop cell, only the others are walked
+        cells = traversal.cells(data)
+        distance = np.abs(np.diff(cells, axis=0)).sum(axis=1)
+        short = np.flatnonzero(distance <= 1)
+        adjacent = np.flatnonzero(distance == 1) + 1
+        direct = np.concatenate((cells[short], cells[adjacent]))
 
-    max_val = max(occurances.keys())
-    min_val = min(occurances.keys())
-    min_val = min_val if min_val >= individual_threshold else individual_threshold
-    max_val = max_val if max_val > min_val else min_val
+        cell_a.extend(direct[:, 0].tolist())
+        cell_b.extend(direct[:, 1].tolist())
+        codes.extend([code] * len(direct))
+
+        for i in np.flatnonzero(distance > 1).tolist():
+
+            start = data[i]
+            stop = data[i + 1]
 
-    grad_size = max_val - min_val + 1
-    grad_size = grad_size if grad_size <= MAX_GRADUATION_SIZE else MAX_GRADUATION_SIZE
+            seq = builder.create(start, stop)
+            res = set(seq.calculate_cells())
 
-    #linear interpolation
-    dif = max_val - min_val
+            for a, b in res:
+                cell_a.append(a)
+                cell_b.append(b)
+                codes.append(code)
 
-    size_m_one = grad_size - 1
-    increment = dif / (size_m_one if size_m_one > 0 else 1) #number of distinct colors
+    return CellIndex.from_triples(cell_a, cell_b, codes, individuals)
 
-    return [int(min_val + x * increment) for x in range(grad_size)]
+def shard_trajectories(individual_and_data, shard_segments):
+    """
+    Splits the trajectories into shards of about shard_segments segments. Short trajectories
+    are packed together, long ones are split into pieces that share their border position,
+    so that no segment is lost
 
-def generate_map(individual_and_data, resolution_in_m = 1000, individual_threshold = 2):
+    :param individual_and_data: A map that contains the trajectory for every individual
+    :param shard_segments: The number of segments per shard
+    :returns: List[List[Tuple(code, points)]] - code is the index into the list of individuals
+    """
+    shards = []
+    current = []
+    current_segments = 0
+
+    for code, individual in enumerate(individual_and_data.keys()):
+        data = np.asarray(individual_and_data[individual], dtype=np.float64).reshape(-1, 2)
+
+        start = 0
+        while start < len(data) - 1:
+            stop = min(start + shard_segments - current_segments, len(data) - 1)
+            current.append((code, data[start:stop + 1]))
+            current_segments += stop - start
+            start = stop
+
+            if current_segments >= shard_segments:
+                shards.append(current)
+                current = []
+                current_segments = 0
+
+    if len(current) > 0:
+        shards.append(current)
+
+    return shards
+
+def _trace_shard(shard, resolution_in_m, engine):
+    """
+    Traces a shard, used as worker function of the process pool
+
+    :param shard: The (code, points) pairs of the shard, see shard_trajectories
+    :returns: Tuple(keys, codes) - the distinct (cell, individual) pairs, sorted
+    """
+    cell_index = trace_cells({i: points for i, (_, points) in enumerate(shard)}, resolution_in_m, engine)
+    codes = np.array([code for code, _ in shard], dtype=np.int32)[cell_index.codes]
+
+    return CellIndex.deduplicate(cell_index.keys, codes)
+
+def trace_cells_parallel(individual_and_data, resolution_in_m, engine = 'batch', workers = 2,
+                         shard_segments = TRACE_SHARD_SEGMENTS):
+    """
+    Traces the trajectories in shards on a process pool, every worker returns the distinct
+    (cell, individual) pairs of its shard, which are merged by a single sort
+
+    :param individual_and_data: A map that contains the trajectory for every individual
+    :param resolution_in_m: The resolution of the raster in meters
+    :param engine: The tracing engine, see trace_cells
+    :param workers: The number of worker processes
+    :param shard_segments: The minimum number of segments per shard, more if needed to give
+                            every worker about four shards
+    :returns: CellIndex - the individuals recorded per cell
+    """
+    individuals = list(individual_and_data.keys())
+
+    segments = sum(max(len(x) - 1, 0) for x in individual_and_data.values())
+    shards = shard_trajectories(individual_and_data, max(shard_segments, -(-segments // (4 * workers)), 1))
+
+    if len(shards) <= 1:
+        return trace_cells(individual_and_data, resolution_in_m, engine)
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(shards))) as executor:
+        traced = list(executor.map(_trace_shard, shards, [resolution_in_m] * len(shards), [engine] * len(shards)))
+
+    keys, codes = CellIndex.deduplicate(np.concatenate([x[0] for x in traced]), np.concatenate([x[1] for x in traced]))
+    return CellIndex(keys, codes, individuals)
+
+def generate_map(individual_and_data, resolution_in_m = 1000, individual_threshold = 2, engine = 'batch',
+                 polygonization = 'outline', profiler = None, backend = 'auto', workers = 1, renderer = 'folium',
+                 simplify_in_m = 0, graduation_mode = 'linear'):
     """
     The do it all function
 
     :param individual_and_data: A map that contains the trajectory for every individual
     :param resolution_in_m: The resolution of the raster in meters
+    :param engine: The tracing engine, either 'batch' (vectorized) or 'sequence'
+    :param polygonization: 'outline' for the exact outline of the cells, 'convex_hull' for the
+                            convex hull of every connected component
+    :param profiler: Optional StageProfiler that records every stage
+    :param backend: The raster backend, see GridMap
+    :param workers: The number of processes tracing the cells and labeling the tiles of the tiled raster backend
+    :param renderer: How the map is drawn, see render_map
+    :param simplify_in_m: The simplification tolerance of the 'geojson' renderer
+    :param graduation_mode: How the borders of the bins are chosen, see determine_graduation
     :param graduation: The borders of each bin:
         [2, 5, 10, 20, 30] means 
             * discard every cell that has fewer than 2 individuals
@@ -49,118 +182,252 @@ def generate_map(individual_and_data, resolution_in_m = 1000, individual_thresho
             * color every cell black that has between [30, inf[ individuals
     """
     
+    profiler = profiler if profiler is not None else StageProfiler()
+
     #Trace all cells along each trajectory line segment    
-    all_cells_stripped = {}
-    builder = SequenceBuilder(resolution_in_m)
-    for individual, data in individual_and_data.items():
-        for i in range(len(data) - 1):
+    with profiler.stage('trace', engine=engine) as record:
+        cell_index = trace_cells(individual_and_data, resolution_in_m, engine, workers)
 
-            start = data[i]
-            stop = data[i + 1]
+        record['segments'] = sum(max(len(x) - 1, 0) for x in individual_and_data.values())
+        record['cell_individual_pairs'] = len(cell_index.keys)
+        record['cells'] = len(cell_index)
 
-            seq = builder.create(start, stop)
-            res = set(seq.calculate_cells())
+    return build_map(cell_index, resolution_in_m, individual_threshold, polygonization, profiler, backend, workers,
+                     renderer=renderer, simplify_in_m=simplify_in_m, graduation_mode=graduation_mode)
 
-            for r in res:
-                if r not in all_cells_stripped:
-                    all_cells_stripped[r] = set()
+def build_map(cell_index, resolution_in_m = 1000, individual_threshold = 2, polygonization = 'outline', profiler = None,
+              backend = 'auto', workers = 1, projection = None, renderer = 'folium', simplify_in_m = 0,
+              graduation_mode = 'linear'):
+    """
+    Generates the map from already traced cells, see generate_map
+
+    :param cell_index: CellIndex - the individuals recorded per cell
+    :param resolution_in_m: The resolution of the raster the cells were traced with
+    :param individual_threshold: Cells with fewer individuals are discarded
+    :param polygonization: 'outline' or 'convex_hull'
+    :param profiler: Optional StageProfiler that records every stage
+    :param backend: The raster backend, see GridMap
+    :param workers: The number of processes of the tiled raster backend
+    :param projection: The GridProjection the cells were traced in, None if they were traced in degrees
+    :param renderer: How the map is drawn, see render_map
+    :param simplify_in_m: The simplification tolerance of the 'geojson' renderer
+    :param graduation_mode: How the borders of the bins are chosen, see determine_graduation
+    :returns: Tuple(map, polygons per label, graduation)
+    """
+    import shapely
 
-                all_cells_stripped[r].add(individual)
+    profiler = profiler if profiler is not None else StageProfiler()
 
-    graduation = determine_graduation(all_cells_stripped, individual_threshold)
+    with profiler.stage('graduation', mode=graduation_mode) as record:
+        graduation = determine_graduation(cell_index.counts, individual_threshold, graduation_mode)
+        record['layers'] = len(graduation)
 
     # Create a raster 
-    g = GridMap(all_cells_stripped)
-    data = g.fill(graduation)
+    with profiler.stage('fill') as record:
+        g = GridMap(cell_index, backend, workers)
+        data = g.fill(graduation)
 
-    # compute the convex hull of every rastered polygon
-    print("Building hull")
-    plg_per_label = {}
-    for i, (label, plg) in enumerate(g.generate_polygons(data)):
-        pts = []
-        for point in plg:
-            corners = builder.get_edges_from_cell(point)
-            for corner in corners:
-               pts.append(corner)
+        record['backend'] = g.backend
+        record['raster_cells'] = g.width * g.height
 
-        transformed_pts = [corner for point in plg for corner in builder.get_edges_from_cell(point)]
-        ch = ConvexHull(transformed_pts)
+    # convert every layer of the raster to polygons
+    plg_per_label = polygonize(g, data, polygonization, profiler)
 
-        hull = []
+    # calculate the difference of the higher labeled polygons
+    # basically, if a black polygon is overlapping with a dark gray one,
+    # the dark gray portion that is overlapped by black gets cut out.
+    # Outlines follow the raster cells, so their layers never overlap
+    if polygonization == 'convex_hull':
+        with profiler.stage('difference') as record:
+            plg_per_label = subtract_higher_layers(plg_per_label)
+            record['polygon_vertices'] = int(sum(shapely.get_num_coordinates(x) for x in plg_per_label.values()))
 
-        for vertex in ch.vertices:
-            hull.append(transformed_pts[vertex])
+    plg_per_label_processed = {}
+    for label, geometry in plg_per_label.items():
+        plg_per_label_processed[label] = cells_to_degrees(geometry, resolution_in_m, projection)
 
-        if label not in plg_per_label:
-            plg_per_label[label] = []
+    bounds = cells_to_degrees(shapely.box(*g.lower_left, *g.upper_right), resolution_in_m, projection).bounds
+    m = render_map(plg_per_label_processed, graduation, bounds[:2], bounds[2:], profiler, renderer, resolution_in_m,
+                   simplify_in_m)
 
-        plg_per_label[label].append(hull)
+    return m, plg_per_label_processed, graduation
 
-    
-    # unify all polygons as due to the convex hull algorithm there may be polygons 
-    # of identical label nested inside other polygons with the same label
-    print("Processing geometries - union")
-    plg_per_label_processed = {}
-    for i in plg_per_label.keys():
-        if i == 0:
-            continue
-        
-        res = None
-        for plg in plg_per_label[i]:
-            if res is None:
-                res = Polygon(plg)
-            else:
-                res = res.union(Polygon(plg))
+def cells_to_degrees(geometry, resolution_in_m, projection = None):
+    """
+    Converts a geometry from grid cell coordinates to (lat, lon)
 
-        plg_per_label_processed[i] = res
+    :param geometry: Geometry in grid cell coordinates
+    :param resolution_in_m: The resolution of the raster in meters
+    :param projection: The GridProjection the cells were traced in, None if they were traced in degrees
+    """
+    import shapely
 
-    # calculate the difference of the higher labeled polygons
-    # basically, if a black polygon is overlapping with a dark gray one,
-    # the dark gray portion that is overlapped by black gets cut out
-    print("Processing geometries - difference")
-    keys = sorted(plg_per_label_processed.keys())
-    for i in range(1, len(keys) + 1):
+    geometry = shapely.transform(geometry, SequenceBuilder(resolution_in_m).convert_cells_back_to_deg)
+    if projection is not None:
+        geometry = projection.inverse_geometry(geometry)
+
+    return geometry
+
+def render_map(plg_per_label_processed, graduation, lower_left, upper_right, profiler = None, renderer = 'folium',
+               resolution_in_m = None, simplify_in_m = 0):
+    """
+    Draws the polygons of every layer on a folium map
+
+    :param plg_per_label_processed: Dict[int, Polygon/MultiPolygon] - the geometry per layer in (lat, lon)
+    :param graduation: The borders of each bin, see generate_map
+    :param lower_left: (lat, lon) of the lower left corner of the map
+    :param upper_right: (lat, lon) of the upper right corner of the map
+    :param profiler: Optional StageProfiler that records the render stage
+    :param renderer: 'folium' adds one folium.Polygon per polygon, 'geojson' adds all layers as
+                        a single GeoJSON layer, see layers_to_geojson
+    :param resolution_in_m: The resolution of the raster, the 'geojson' renderer quantizes
+                        the coordinates to a tenth of it
+    :param simplify_in_m: The simplification tolerance of the 'geojson' renderer, 0 to keep the exact outline
+    :returns: The folium map
+    """
+    if renderer not in RENDERERS:
+        raise ValueError("Unknown renderer '{}'".format(renderer))
+
+    import branca
+    import folium
+
+    profiler = profiler if profiler is not None else StageProfiler()
+
+    with profiler.stage('render', renderer=renderer) as record:
+        m = folium.Map(start=[0,0])
+
+        colormap = branca.colormap.linear.viridis.scale(graduation[0], graduation[-1])
         
-        # starting with 1 and counting backwards...
-        my_index = keys[-i]
+        # try:
+        #     colormap = branca.colormap.linear._colormaps['YlOrRd_09'].scale(graduation[0], graduation[-1])
+        # except KeyError:
+        #     pass
 
-        for j in range(0, len(keys) - i):
-            current = keys[j]
-            plg_per_label_processed[current] = plg_per_label_processed[current].difference(plg_per_label_processed[my_index])
+        if len(set(graduation)) > 2:
+            colormap = colormap.to_step(index=graduation)
+        colormap.caption = "Recorded individuals per cell"
+        colormap.add_to(m)
 
-    # generate the map
-    m = folium.Map(start=[0,0])
+        m.fit_bounds([lower_left, upper_right])
 
-    colormap = branca.colormap.linear.viridis.scale(graduation[0], graduation[-1])
-    
-    # try:
-    #     colormap = branca.colormap.linear._colormaps['YlOrRd_09'].scale(graduation[0], graduation[-1])
-    # except KeyError:
-    #     pass
-
-    if len(set(graduation)) > 2:
-        colormap = colormap.to_step(index=graduation)
-    colormap.caption = "Recorded individuals per cell"
-    colormap.add_to(m)
-
-    m.fit_bounds([builder.convert_back_to_deg(g.lower_left), builder.convert_back_to_deg(g.upper_right)])
-    def add_to_map(polygon, i):
-        coords = np.asarray(polygon.exterior.coords[:-1])
-        plg = folium.Polygon(locations=coords, fill=True, color=colormap(graduation[i - 1]), fill_opacity=0.5)
-        m.add_child(plg)
-
-    for i in plg_per_label_processed.keys():
-        if i == 0:
-            continue
+        if renderer == 'geojson':
+            colors = {i: colormap(graduation[i - 1]) for i in plg_per_label_processed.keys() if i != 0}
+            geojson = layers_to_geojson(plg_per_label_processed, graduation, resolution_in_m, simplify_in_m)
+
+            def style(feature):
+                color = colors[feature['properties']['label']]
+                return {'color': color, 'fillColor': color, 'fillOpacity': 0.5}
 
-        try:
-            for poly in plg_per_label_processed[i].geoms:
-                if poly.geom_type != "Polygon":
-                    continue
+            folium.GeoJson(geojson, style_function=style, name='corridors').add_to(m)
 
-                add_to_map(poly, i)
-        except AttributeError:
-            add_to_map(plg_per_label_processed[i], i)
-            pass
+            record['features'] = len(geojson['features'])
+            return m
 
-    return m, plg_per_label_processed, graduation
\ No newline at end of file
+        def add_to_map(polygon, i):
+            rings = [polygon.exterior] + list(polygon.interiors)
+            coords = [np.asarray(ring.coords[:-1]) for ring in rings]
+            plg = folium.Polygon(locations=coords, fill=True, color=colormap(graduation[i - 1]), fill_opacity=0.5)
+            m.add_child(plg)
+            record['polygons'] += 1
+
+        record['polygons'] = 0
+        for i in plg_per_label_processed.keys():
+            if i == 0:
+                continue
+
+            try:
+                for poly in plg_per_label_processed[i].geoms:
+                    if poly.geom_type != "Polygon":
+                        continue
+
+                    add_to_map(poly, i)
+            except AttributeError:
+                add_to_map(plg_per_label_processed[i], i)
+                pass
+
+    return m
+
+def layers_to_geojson(plg_per_label_processed, graduation, resolution_in_m = None, simplify_in_m = 0):
+    """
+    Converts the geometry of every layer to one GeoJSON feature. The coordinates are rounded,
+    so that the polygons are written with as few digits as the resolution needs
+
+    :param plg_per_label_processed: Dict[int, Polygon/MultiPolygon] - the geometry per layer in (lat, lon)
+    :param graduation: The borders of each bin, see generate_map
+    :param resolution_in_m: The resolution of the raster, coordinates are rounded to a tenth of it,
+                            to 6 decimals if None
+    :param simplify_in_m: The tolerance of the topology preserving simplification, 0 to keep the exact outline
+    :returns: Dict - the FeatureCollection in (lon, lat)
+    """
+    import shapely
+
+    decimals = 6
+    if resolution_in_m is not None:
+        decimals = max(int(np.ceil(-np.log10(resolution_in_m / 10 / SequenceBuilder.DEG_TO_M))), 0)
+
+    labels = [x for x in sorted(plg_per_label_processed.keys()) if x != 0]
+    parts = [shapely.get_parts(plg_per_label_processed[x]) for x in labels]
+    parts = [x[shapely.get_type_id(x) == shapely.GeometryType.POLYGON] for x in parts]
+
+    if simplify_in_m > 0 and sum(len(x) for x in parts) > 0:
+        # the layers are simplified as one coverage, so that borders they share stay shared
+        simplified = shapely.coverage_simplify(np.concatenate(parts), simplify_in_m / SequenceBuilder.DEG_TO_M)
+        parts = np.split(simplified, np.cumsum([len(x) for x in parts])[:-1])
+
+    parts = [x[~shapely.is_empty(x)] for x in parts]
+    labels = [label for label, x in zip(labels, parts) if len(x) > 0]
+    geometries = np.array([shapely.multipolygons(x) for x in parts if len(x) > 0], dtype=object)
+
+    features = []
+    for label, geometry in zip(labels, _quantize(geometries, decimals)):
+        features.append({
+            'type': 'Feature',
+            'properties': {'label': int(label), 'recorded individuals': int(graduation[label - 1])},
+            'geometry': json.loads(shapely.to_geojson(geometry))
+        })
+
+    return {'type': 'FeatureCollection', 'features': features}
+
+def _quantize(geometries, decimals):
+    """
+    Swaps the coordinates of MultiPolygons to (lon, lat), rounds them and drops every vertex
+    that is collinear with its neighbours afterwards, e.g. along the straight cell borders
+
+    :param geometries: Array of MultiPolygons in (lat, lon)
+    :param decimals: The number of decimals that are kept
+    :returns: Array of MultiPolygons in (lon, lat)
+    """
+    import shapely
+
+    if len(geometries) == 0:
+        return geometries
+
+    _, coords, (ring_offsets, polygon_offsets, multipolygon_offsets) = shapely.to_ragged_array(geometries)
+    coords = np.round(coords[:, ::-1], decimals)
+
+    # the rings are closed, the last coordinate repeats the first one
+    starts = ring_offsets[:-1]
+    lengths = ring_offsets[1:] - starts - 1
+    ring = np.repeat(np.arange(len(starts)), lengths + 1)
+    index = np.arange(len(coords))
+    position = index - starts[ring]
+    closing = position == lengths[ring]
+
+    previous = np.where(position == 0, starts[ring] + lengths[ring] - 1, index - 1)
+    following = np.where(position >= lengths[ring] - 1, starts[ring], index + 1)
+    d_in = coords - coords[previous]
+    d_out = coords[following] - coords
+    keep = ~closing & (d_in[:, 0] * d_out[:, 1] - d_in[:, 1] * d_out[:, 0] != 0)
+
+    # rings that would collapse are kept as they are
+    kept = np.bincount(ring[keep], minlength=len(starts))
+    collapsed = kept < 3
+    keep |= ~closing & collapsed[ring]
+    kept = np.where(collapsed, lengths, kept)
+
+    kept_index = np.flatnonzero(keep)
+    firsts = kept_index[np.cumsum(kept) - kept]
+    kept_index = np.insert(kept_index, np.cumsum(kept), firsts)
+
+    offsets = (np.append(0, np.cumsum(kept + 1)), polygon_offsets, multipolygon_offsets)
+    return shapely.from_ragged_array(shapely.GeometryType.MULTIPOLYGON, coords[kept_index], offsets)
@@ -0,0 +1,149 @@
+import numpy as np
+
+MAX_GRADUATION_SIZE = 12
+
+# 'linear' spaces the borders evenly between the lowest and highest count, 'quantile' puts
+# about as many cells into every bin, 'jenks' minimizes the variance of the counts within
+# the bins (natural breaks) and 'log' spaces the borders evenly on a logarithmic scale
+GRADUATION_MODES = ['linear', 'quantile', 'jenks', 'log']
+
+# Jenks' natural breaks are optimized exactly over at most this many candidate borders,
+# with more distinct counts the candidates are every n-th distinct count
+JENKS_MAX_CANDIDATES = 256
+
+def count_histogram(cell_counts, individual_threshold):
+    """
+    Counts how many cells recorded each number of individuals, cells with fewer
+    individuals than the threshold are left out
+
+    :param cell_counts: The number of individuals recorded per cell
+    :param individual_threshold: Cells with fewer individuals are discarded
+    :returns: Tuple(values, frequencies) - the distinct counts in ascending order and their number of cells
+    """
+    cell_counts = np.asarray(cell_counts, dtype=np.int64)
+    frequencies = np.bincount(cell_counts[cell_counts >= max(individual_threshold, 0)])
+    values = np.flatnonzero(frequencies)
+
+    return values, frequencies[values]
+
+def determine_graduation(cell_counts, individual_threshold, mode = 'linear'):
+    """
+    Determines the borders of each bin, every bin ranges from its border to the next one
+
+    :param cell_counts: The number of individuals recorded per cell
+    :param individual_threshold: Cells with fewer individuals are discarded
+    :param mode: One of GRADUATION_MODES
+    :returns: List[int] - the ascending borders, the first one is the lowest count that is kept
+    """
+    if mode not in GRADUATION_MODES:
+        raise ValueError("Unknown graduation mode '{}'".format(mode))
+
+    max_val = int(np.max(cell_counts))
+    min_val = int(np.min(cell_counts))
+    min_val = min_val if min_val >= individual_threshold else individual_threshold
+    max_val = max_val if max_val > min_val else min_val
+
+    if mode == 'linear':
+        return linear_breaks(min_val, max_val)
+
+    values, frequencies = count_histogram(cell_counts, individual_threshold)
+    if len(values) <= 1:
+        return [min_val]
+
+    if mode == 'quantile':
+        return quantile_breaks(values, frequencies)
+    if mode == 'jenks':
+        return jenks_breaks(values, frequencies)
+
+    return log_breaks(min_val, max_val)
+
+def linear_breaks(min_val, max_val):
+    """
+    Determines the borders of each bin by linear interpolation
+
+    :param min_val: The lowest count that is kept
+    :param max_val: The highest count
+    """
+    grad_size = max_val - min_val + 1
+    grad_size = grad_size if grad_size <= MAX_GRADUATION_SIZE else MAX_GRADUATION_SIZE
+
+    #linear interpolation
+    dif = max_val - min_val
+
+    size_m_one = grad_size - 1
+    increment = dif / (size_m_one if size_m_one > 0 else 1) #number of distinct colors
+
+    return [int(min_val + x * increment) for x in range(grad_size)]
+
+def log_breaks(min_val, max_val):
+    """
+    Determines the borders of each bin by interpolation on a logarithmic scale, so that a
+    few cells with very high counts don't squash all others into the lowest bin
+
+    :param min_val: The lowest count that is kept
+    :param max_val: The highest count
+    """
+    low = max(min_val, 1)
+    grad_size = min(max_val - low + 1, MAX_GRADUATION_SIZE)
+    breaks = np.round(np.geomspace(low, max_val, grad_size)).astype(np.int64)
+
+    return [min_val] + [int(x) for x in np.unique(breaks) if x > min_val]
+
+def quantile_breaks(values, frequencies):
+    """
+    Determines the borders of each bin so that every bin holds about as many cells
+
+    :param values: The distinct counts in ascending order, see count_histogram
+    :param frequencies: The number of cells of every count
+    """
+    grad_size = min(len(values), MAX_GRADUATION_SIZE)
+    cumulative = np.cumsum(frequencies)
+    quantiles = np.arange(grad_size) / grad_size * cumulative[-1]
+
+    # the lowest count whose cells reach the quantile
+    breaks = values[np.searchsorted(cumulative, quantiles, side='right')]
+
+    return [int(x) for x in np.unique(breaks)]
+
+def jenks_breaks(values, frequencies):
+    """
+    Determines the borders of each bin by Jenks' natural breaks: the sum of the squared
+    deviations of the counts from the mean of their bin is minimal.
+
+    The optimization runs over the histogram of the counts, so it only depends on the number
+    of distinct counts. Beyond JENKS_MAX_CANDIDATES distinct counts, only every n-th distinct
+    count is considered as border, the deviations themselves are still exact.
+
+    :param values: The distinct counts in ascending order, see count_histogram
+    :param frequencies: The number of cells of every count
+    """
+    grad_size = min(len(values), MAX_GRADUATION_SIZE)
+
+    candidates = np.unique(np.linspace(0, len(values), min(len(values), JENKS_MAX_CANDIDATES) + 1).astype(np.int64))
+
+    weights = np.concatenate(([0.0], np.cumsum(frequencies, dtype=np.float64)))[candidates]
+    sums = np.concatenate(([0.0], np.cumsum(frequencies * values, dtype=np.float64)))[candidates]
+    squares = np.concatenate(([0.0], np.cumsum(frequencies * values.astype(np.float64) ** 2)))[candidates]
+
+    # cost[i, j] - the squared deviations of the counts between candidate i and candidate j
+    with np.errstate(divide='ignore', invalid='ignore'):
+        w = weights[None, :] - weights[:, None]
+        s = sums[None, :] - sums[:, None]
+        cost = squares[None, :] - squares[:, None] - s * s / w
+    n = len(candidates)
+    cost[np.tril_indices(n)] = np.inf
+
+    # best[j] - the least cost of splitting everything before candidate j into the bins so far
+    best = cost[0].copy()
+    previous = []
+    for _ in range(grad_size - 1):
+        total = best[:, None] + cost
+        previous.append(np.argmin(total, axis=0))
+        best = total[previous[-1], np.arange(n)]
+
+    borders = [n - 1]
+    for origin in reversed(previous):
+        borders.append(origin[borders[-1]])
+
+    breaks = values[candidates[np.array(borders[1:][::-1], dtype=np.int64)]]
+    return [int(values[0])] + [int(x) for x in np.unique(breaks) if x > values[0]]
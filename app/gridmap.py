@@ -1,23 +1,174 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+import numpy as np
+
+def _label_sparse(rows, cols, values, width):
+    """
+    Labels the 8-connected components of every layer on the graph of occupied neighbouring
+    cells, so memory scales with the occupied cells instead of the raster
+
+    :param rows: The row index of every occupied cell
+    :param cols: The column index of every occupied cell
+    :param values: The layer id of every occupied cell
+    :param width: The width of the raster
+    :returns: Tuple(ids, count) - the component id (starting at 0) of every cell and the number of components
+    """
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    keys = rows * width + cols
+    order = np.argsort(keys)
+    keys = keys[order]
+    cols = cols[order]
+    values = values[order]
+
+    sources = []
+    targets = []
+    for dy, dx in GridMap.NEIGHBOURS:
+        neighbour_cols = cols + dx
+        valid = (neighbour_cols >= 0) & (neighbour_cols < width)
+
+        neighbours = keys + dy * width + dx
+        pos = np.minimum(np.searchsorted(keys, neighbours), len(keys) - 1)
+
+        linked = valid & (keys[pos] == neighbours) & (values[pos] == values)
+        sources.append(np.flatnonzero(linked))
+        targets.append(pos[linked])
+
+    sources = np.concatenate(sources)
+    targets = np.concatenate(targets)
+
+    graph = coo_matrix((np.ones(len(sources), dtype=np.int8), (sources, targets)), shape=(len(keys), len(keys)))
+    count, labels = connected_components(graph, directed=False)
+
+    ids = np.empty(len(keys), dtype=np.int64)
+    ids[order] = labels
+    return ids, count
+
+def _label_tiles(tiles, size):
+    """
+    Labels the 8-connected components of every layer of some tiles, used as worker function
+    of the process pool. Tiles with few occupied cells are labeled on the graph of their
+    cells, the others with ndimage on the bounding box of their cells.
+
+    :param tiles: List of Tuple(rows, cols, values) - the occupied cells of every tile, relative
+                    to the tile origin
+    :param size: The edge length of a tile
+    :returns: List of Tuple(ids, count) - the component id (starting at 0) of every cell of a tile
+                and the number of components of the tile
+    """
+    from scipy import ndimage
+
+    res = []
+    for rows, cols, values in tiles:
+        rows = rows - rows.min()
+        cols = cols - cols.min()
+        shape = (int(rows.max()) + 1, int(cols.max()) + 1)
+
+        if len(rows) < GridMap.DENSE_OCCUPANCY * shape[0] * shape[1]:
+            res.append(_label_sparse(rows, cols, values, shape[1]))
+            continue
+
+        tile = np.full(shape, -1, dtype=np.int8)
+        tile[rows, cols] = values
+
+        ids = np.empty(len(rows), dtype=np.int64)
+        count = 0
+        for value in np.unique(values):
+            labels, n = ndimage.label(tile == value, structure=GridMap.CONNECTIVITY)
+
+            mask = values == value
+            ids[mask] = labels[rows[mask], cols[mask]] - 1 + count
+            count += n
+
+        res.append((ids, count))
+
+    return res
+
+class SparseRaster:
+    """
+    Sparse (COO) raster that only stores the occupied cells
+    """
+
+    def __init__(self, rows, cols, values, shape) -> None:
+        """
+        Initializes this instance
+
+        :param rows: The row (y) index of every occupied cell
+        :param cols: The column (x) index of every occupied cell
+        :param values: The layer id of every occupied cell
+        :param shape: Tuple(height, width) of the raster
+        """
+        self.__rows = rows
+        self.__cols = cols
+        self.__values = values
+        self.__shape = shape
+
+    @property
+    def rows(self):
+        return self.__rows
+
+    @property
+    def cols(self):
+        return self.__cols
+
+    @property
+    def values(self):
+        return self.__values
+
+    @property
+    def shape(self):
+        return self.__shape
+
+    def to_dense(self):
+        """
+        Converts this raster to a dense 2d array, empty cells are -1
+        """
+        data = np.full(self.__shape, -1, dtype=np.int8)
+        data[self.__rows, self.__cols] = self.__values
+        return data
+
 class GridMap:
     """
     Raster for individual occurances
     """
 
-    def __init__(self, cells) -> None:
+    # 8-connectivity (moore neighbourhood) used when joining cells to polygons
+    CONNECTIVITY = np.ones((3, 3), dtype=bool)
+
+    # The half of the moore neighbourhood, the other half is covered by symmetry
+    NEIGHBOURS = [(0, 1), (1, -1), (1, 0), (1, 1)]
+
+    # Rasters up to this many cells are always dense, larger ones only if at least
+    # DENSE_OCCUPANCY of their cells are occupied
+    DENSE_CELL_LIMIT = 1 << 22
+    DENSE_OCCUPANCY = 0.05
+
+    # Rasters beyond this many cells are processed in tiles, so that no single allocation
+    # scales with the bounding box. Tiles are labeled and outlined TILE_SIZE cells at a time,
+    # incremental updates store their outlines per tile of the same size
+    TILED_CELL_LIMIT = 1 << 26
+    TILE_SIZE = 1024
+
+    BACKENDS = ['auto', 'dense', 'sparse', 'tiled']
+
+    def __init__(self, cells, backend = 'auto', workers = 1) -> None:
         """
         Initializes this instance
 
-        :param cells: Mapping from Cell to individual count
+        :param cells: CellIndex - the individuals recorded per cell
+        :param backend: 'dense', 'sparse', 'tiled' or 'auto' to choose by the size and occupancy of
+                        the bounding box
+        :param workers: The number of processes labeling tiles in parallel, only used by the tiled backend
         """
+        keys = cells.cells
 
-        x_vals = [x[1] for x in cells.keys()]
-        y_vals = [x[0] for x in cells.keys()]
+        min_x = int(keys[:, 1].min())
+        max_x = int(keys[:, 1].max()) + 1
 
-        min_x = min(x_vals)
-        max_x = max(x_vals) + 1
-
-        min_y = min(y_vals)
-        max_y = max(y_vals) + 1
+        min_y = int(keys[:, 0].min())
+        max_y = int(keys[:, 0].max()) + 1
 
         self.__min_x = min_x
         self.__min_y = min_y
@@ -28,6 +179,21 @@ class GridMap:
         self.__height = max_y - min_y
 
         self.__input = cells
+        self.__keys = keys
+
+        if backend == 'auto':
+            area = self.__width * self.__height
+            dense = area <= GridMap.DENSE_CELL_LIMIT or len(keys) / area >= GridMap.DENSE_OCCUPANCY
+
+            if area > GridMap.TILED_CELL_LIMIT:
+                backend = 'tiled'
+            else:
+                backend = 'dense' if dense else 'sparse'
+        elif backend not in GridMap.BACKENDS:
+            raise ValueError("Unknown raster backend '{}'".format(backend))
+
+        self.__backend = backend
+        self.__workers = workers if workers > 0 else os.cpu_count()
 
     @property
     def height(self):
@@ -43,6 +209,20 @@ class GridMap:
         """
         return self.__width
     
+    @property
+    def backend(self):
+        """
+        Gets the raster backend, either 'dense', 'sparse' or 'tiled'
+        """
+        return self.__backend
+
+    @property
+    def workers(self):
+        """
+        Gets the number of processes tiles are processed with by the tiled backend
+        """
+        return self.__workers
+
     @property
     def lower_left(self):
         return (self.__min_y, self.__min_x)
@@ -63,25 +243,197 @@ class GridMap:
     def fill(self, bins):
         """
         Fills the raster with layer ids which will produce the polygon color later on
+
+        :returns: 2d int8 array of shape (height, width) with empty cells set to -1 for the
+                    dense backend, a SparseRaster for the sparse and tiled backends
         """
-        
-        data = [-1] * (self.__width * self.__height)
-        for cell in self.__input.keys():
+        counts = self.__input.counts
+
+        rows = self.__keys[:, 0] - self.__min_y
+        cols = self.__keys[:, 1] - self.__min_x
+        values = np.searchsorted(bins, counts, side='right').astype(np.int8)
 
-            x_id = cell[1] - self.__min_x
-            y_id = cell[0] - self.__min_y
-            # y_id = self.__height - y_id - 1
+        if self.__backend != 'dense':
+            return SparseRaster(rows, cols, values, (self.__height, self.__width))
 
-            data_id = x_id + (y_id * self.__width)
-            data[data_id] = GridMap.get_bin(len(self.__input[cell]), bins)
+        data = np.full((self.__height, self.__width), -1, dtype=np.int8)
+        data[rows, cols] = values
 
         return data
     
+    def layers(self, data):
+        """
+        Groups the occupied cells by their layer, without splitting them into components
+
+        :param data: the input data - the 2d array or SparseRaster returned by fill
+        :returns: Generator of Tuple(layer, cells) - cells is an (n, 2) array of grid cells
+        """
+        if isinstance(data, SparseRaster):
+            rows, cols, values = data.rows, data.cols, data.values
+        else:
+            data = np.asarray(data).reshape(self.__height, self.__width)
+            rows, cols = np.nonzero(data != -1)
+            values = data[rows, cols]
+
+        for value in np.unique(values):
+            mask = values == value
+            yield int(value), np.stack((rows[mask] + self.__min_y, cols[mask] + self.__min_x), axis=1)
+
     def generate_polygons(self, data):
+        """
+        Converts the input data to a set of polygons by labeling the 8-connected
+        components of every color layer
+
+        :param data: the input data - the 2d array or SparseRaster returned by fill
+        :returns: Generator of Tuple(layer, cells) - cells is an (n, 2) array of the
+                    grid cells of one connected component
+        """
+        if isinstance(data, SparseRaster):
+            if self.__backend == 'tiled':
+                yield from self.generate_polygons_tiled(data)
+            else:
+                yield from self.generate_polygons_sparse(data)
+            return
+
+        from scipy import ndimage
+
+        data = np.asarray(data).reshape(self.__height, self.__width)
+
+        for value in np.unique(data):
+            if value == -1:
+                continue
+
+            labels, count = ndimage.label(data == value, structure=GridMap.CONNECTIVITY)
+
+            rows, cols = np.nonzero(labels)
+            ids = labels[rows, cols]
+            order = np.argsort(ids, kind='stable')
+
+            cells = np.stack((rows[order] + self.__min_y, cols[order] + self.__min_x), axis=1)
+            splits = np.cumsum(np.bincount(ids, minlength=count + 1)[1:])[:-1]
+
+            for component in np.split(cells, splits):
+                yield int(value), component
+
+    def generate_polygons_sparse(self, data):
+        """
+        Converts a SparseRaster to a set of polygons, the 8-connected components are found
+        on the graph of occupied neighbouring cells so memory scales with the occupied cells
+
+        :param data: the SparseRaster returned by fill
+        :returns: Generator of Tuple(layer, cells), see generate_polygons
+        """
+        keys = data.rows * self.__width + data.cols
+        labels, _ = _label_sparse(data.rows, data.cols, data.values, self.__width)
+
+        order = np.lexsort((keys, labels, data.values))
+        cells = np.stack((data.rows[order] + self.__min_y, data.cols[order] + self.__min_x), axis=1)
+        labels = labels[order]
+        values = data.values[order]
+
+        splits = np.flatnonzero(np.diff(labels)) + 1
+        for start, component in zip(np.concatenate(([0], splits)), np.split(cells, splits)):
+            yield int(values[start]), component
+
+    def generate_polygons_tiled(self, data, tile_size = None):
+        """
+        Converts a SparseRaster to a set of polygons tile by tile. Every tile is filled and
+        labeled on its own (in parallel if workers > 1), afterwards the components of
+        8-connected cells on both sides of a tile border are merged.
+
+        :param data: the SparseRaster returned by fill
+        :param tile_size: The edge length of a tile, TILE_SIZE by default
+        :returns: Generator of Tuple(layer, cells), see generate_polygons
+        """
+        size = tile_size if tile_size is not None else GridMap.TILE_SIZE
+        if len(data.rows) == 0:
+            return
+
+        rows = data.rows
+        cols = data.cols
+        values = data.values
+
+        tiles_per_row = self.__width // size + 1
+        tile_ids = (rows // size) * tiles_per_row + cols // size
+
+        order = np.argsort(tile_ids, kind='stable')
+        tile_ids = tile_ids[order]
+        rows = rows[order]
+        cols = cols[order]
+        values = values[order]
+
+        starts = np.flatnonzero(np.concatenate(([True], tile_ids[1:] != tile_ids[:-1])))
+        stops = np.append(starts[1:], len(tile_ids))
+
+        tiles = [(rows[a:b] % size, cols[a:b] % size, values[a:b]) for a, b in zip(starts, stops)]
+
+        if self.__workers > 1 and len(tiles) > 1:
+            # contiguous chunks keep the tiles in order
+            count = min(self.__workers, len(tiles))
+            bounds = np.linspace(0, len(tiles), count + 1).astype(int)
+            chunks = [tiles[bounds[i]:bounds[i + 1]] for i in range(count)]
+
+            with ProcessPoolExecutor(max_workers=count) as executor:
+                labeled = [x for result in executor.map(_label_tiles, chunks, [size] * count) for x in result]
+        else:
+            labeled = _label_tiles(tiles, size)
+
+        # make the component ids unique across all tiles
+        offsets = np.cumsum([0] + [count for _, count in labeled])
+        components = np.concatenate([ids + offsets[i] for i, (ids, _) in enumerate(labeled)])
+
+        # only cells on a tile border can be connected to a cell of another tile
+        local_rows = rows % size
+        local_cols = cols % size
+        border = (local_rows == 0) | (local_rows == size - 1) | (local_cols == 0) | (local_cols == size - 1)
+        border = np.flatnonzero(border)
+
+        keys = rows[border] * self.__width + cols[border]
+        key_order = np.argsort(keys)
+        keys = keys[key_order]
+        border = border[key_order]
+
+        sources = []
+        targets = []
+        for dy, dx in GridMap.NEIGHBOURS:
+            neighbour_cols = cols[border] + dx
+            valid = (neighbour_cols >= 0) & (neighbour_cols < self.__width)
+
+            neighbours = keys + dy * self.__width + dx
+            pos = np.minimum(np.searchsorted(keys, neighbours), len(keys) - 1)
+
+            linked = valid & (keys[pos] == neighbours) & (values[border[pos]] == values[border])
+            linked &= tile_ids[border[pos]] != tile_ids[border]
+
+            sources.append(components[border[linked]])
+            targets.append(components[border[pos[linked]]])
+
+        sources = np.concatenate(sources)
+        targets = np.concatenate(targets)
+
+        from scipy.sparse import coo_matrix
+        from scipy.sparse.csgraph import connected_components
+
+        # the merge works like a union-find over the component ids of all tiles
+        graph = coo_matrix((np.ones(len(sources), dtype=np.int8), (sources, targets)), shape=(offsets[-1], offsets[-1]))
+        _, merged = connected_components(graph, directed=False)
+        labels = merged[components]
+
+        order = np.lexsort((cols, rows, labels, values))
+        cells = np.stack((rows[order] + self.__min_y, cols[order] + self.__min_x), axis=1)
+        labels = labels[order]
+        values = values[order]
+
+        splits = np.flatnonzero(np.diff(labels)) + 1
+        for start, component in zip(np.concatenate(([0], splits)), np.split(cells, splits)):
+            yield int(values[start]), component
+
+    def generate_polygons_reference(self, data):
         """"
-        Converts the input data to a set of polygons
+        Converts the input data to a set of polygons by a breadth first search, 
+        the reference implementation for generate_polygons
 
-        :param data: the input data - a 2d array flattened as 1d that contains
+        :param data: the input data - a 2d array (or flattened as 1d) that contains
                         all color layer information
         """
         def index(x, y):
@@ -90,6 +442,10 @@ class GridMap:
             """
             return x + y * self.__width
 
+        if isinstance(data, SparseRaster):
+            data = data.to_dense()
+
+        data = np.ravel(data).tolist()
         already_used = [False for x in range(len(data))]
 
         height = len(data) // self.__width
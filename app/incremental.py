@@ -0,0 +1,315 @@
+import json
+import os
+
+import numpy as np
+
+from app.cell_index import CellIndex, CellIndexBuilder
+from app.generate_map import render_map, cells_to_degrees
+from app.graduation import determine_graduation
+from app.polygonize import tile_keys, outline_per_tile, merge_tiles
+from app.profiling import StageProfiler
+from app.streaming import trace_stream
+
+class CorridorState:
+    """
+    Everything needed to continue the corridors of a study with new fixes: the cell index,
+    the last fix per individual, the graduation and the outline of every layer per tile.
+
+    The state is only valid for the parameters it was computed with, see matches.
+    """
+
+    VERSION = 1
+
+    def __init__(self, parameters, cell_index, last_timestamps, last_positions, graduation = None, tiles = None) -> None:
+        """
+        Initializes this instance
+
+        :param parameters: Dict - the settings the state was computed with
+        :param cell_index: CellIndex - the individuals recorded per cell
+        :param last_timestamps: Dict[id, datetime64] - the time of the last fix per individual
+        :param last_positions: Dict[id, (lat, lon)] - the last reduced position per individual
+        :param graduation: The graduation of the last map
+        :param tiles: Dict[Tuple(tile key, label), Polygon/MultiPolygon] - the outline per tile and layer
+        """
+        self.__parameters = parameters
+        self.__cell_index = cell_index
+        self.__last_timestamps = last_timestamps
+        self.__last_positions = last_positions
+        self.__graduation = graduation
+        self.__tiles = tiles if tiles is not None else {}
+
+    @property
+    def parameters(self):
+        """
+        Gets the settings the state was computed with
+        """
+        return self.__parameters
+
+    @property
+    def cell_index(self):
+        """
+        Gets the individuals recorded per cell
+        """
+        return self.__cell_index
+
+    @property
+    def last_timestamps(self):
+        """
+        Gets the time of the last fix per individual
+        """
+        return self.__last_timestamps
+
+    @property
+    def last_positions(self):
+        """
+        Gets the last reduced position per individual
+        """
+        return self.__last_positions
+
+    @property
+    def graduation(self):
+        """
+        Gets the graduation of the last map
+        """
+        return self.__graduation
+
+    @property
+    def tiles(self):
+        """
+        Gets the outline per tile and layer
+        """
+        return self.__tiles
+
+    def matches(self, parameters):
+        """
+        Checks if the state was computed with the same settings, only the given settings are compared
+        """
+        return all(key in self.__parameters and self.__parameters[key] == value for key, value in parameters.items())
+
+    def save(self, path):
+        """
+        Writes the state to a .npz file, geometries are stored as WKB
+        """
+        import shapely
+
+        individuals = self.__cell_index.individuals
+        # numpy scalars are stored as their python counterparts, so that they are found again
+        ids = [x.item() if isinstance(x, np.generic) else x for x in individuals]
+        tile_keys = sorted(self.__tiles.keys())
+        wkb = [shapely.to_wkb(self.__tiles[x]) for x in tile_keys]
+
+        header = {
+            'version': CorridorState.VERSION,
+            'parameters': self.__parameters,
+            'individuals': ids,
+            'graduation': self.__graduation
+        }
+
+        # write to a temporary file first, so that a failed run never leaves a truncated state
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(
+            tmp_path,
+            header=np.array(json.dumps(header, default=str)),
+            keys=self.__cell_index.keys,
+            codes=self.__cell_index.codes,
+            last_timestamps=np.array([self.__last_timestamps.get(x, np.datetime64('NaT')) for x in individuals],
+                                     dtype='datetime64[ns]'),
+            last_positions=np.array([self.__last_positions.get(x, (np.nan, np.nan)) for x in individuals],
+                                    dtype=np.float64).reshape(-1, 2),
+            tile_keys=np.array([x[0] for x in tile_keys], dtype=np.int64),
+            tile_labels=np.array([x[1] for x in tile_keys], dtype=np.int64),
+            tile_offsets=np.cumsum([0] + [len(x) for x in wkb]).astype(np.int64),
+            tile_wkb=np.frombuffer(b''.join(wkb), dtype=np.uint8)
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a state written by save
+
+        :returns: CorridorState or None if there is no (readable) state
+        """
+        import shapely
+
+        try:
+            with np.load(path) as data:
+                header = json.loads(str(data['header']))
+                if header['version'] != CorridorState.VERSION:
+                    return None
+
+                individuals = header['individuals']
+                cell_index = CellIndex(data['keys'], data['codes'], individuals)
+
+                last_timestamps = {}
+                last_positions = {}
+                for individual, timestamp, position in zip(individuals, data['last_timestamps'], data['last_positions']):
+                    if not np.isnat(timestamp):
+                        last_timestamps[individual] = timestamp
+                    if not np.any(np.isnan(position)):
+                        last_positions[individual] = position
+
+                buffer = data['tile_wkb'].tobytes()
+                offsets = data['tile_offsets']
+                tiles = {}
+                for i, (key, label) in enumerate(zip(data['tile_keys'].tolist(), data['tile_labels'].tolist())):
+                    tiles[(key, label)] = shapely.from_wkb(buffer[offsets[i]:offsets[i + 1]])
+
+        except (OSError, KeyError, ValueError):
+            return None
+
+        return cls(header['parameters'], cell_index, last_timestamps, last_positions, header['graduation'], tiles)
+
+def new_fixes(source, last_timestamps):
+    """
+    Restricts every trajectory to the fixes after the last stored one of its individual,
+    last_timestamps is updated in place
+
+    :param source: Iterable of Tuple(id, timestamps, coordinates)
+    :param last_timestamps: Dict[id, datetime64] - the time of the last fix per individual
+    :returns: Generator of Tuple(id, timestamps, coordinates), individuals without new fixes are skipped
+    """
+    for individual, timestamps, coordinates in source:
+        if individual in last_timestamps:
+            mask = timestamps > last_timestamps[individual]
+            if not np.any(mask):
+                continue
+
+            timestamps = timestamps[mask]
+            coordinates = coordinates[mask]
+
+        if len(timestamps) > 0:
+            last_timestamps[individual] = timestamps.max()
+
+        yield (individual, timestamps, coordinates)
+
+def update_index(source, reduce, resolution_in_m, state = None, record = None, projection = None):
+    """
+    Traces only the new fixes of every individual, joined to its last stored position
+
+    :param source: Iterable of Tuple(id, timestamps, coordinates), the full history or only the new fixes
+    :param reduce: The Reduce instance
+    :param resolution_in_m: The resolution of the raster in meters
+    :param state: The CorridorState of the previous run, None to start from scratch
+    :param record: Optional profiler record the item counts are added to
+    :param projection: Optional GridProjection, has to be the one the state was traced in
+    :returns: Tuple(CellIndex, last_timestamps, last_positions)
+    """
+    if state is None:
+        builder = CellIndexBuilder()
+        last_timestamps = {}
+        last_positions = {}
+    else:
+        builder = CellIndexBuilder.from_index(state.cell_index)
+        last_timestamps = dict(state.last_timestamps)
+        last_positions = dict(state.last_positions)
+
+    cell_index = trace_stream(new_fixes(source, last_timestamps), reduce, resolution_in_m, record,
+                              builder, last_positions, projection)
+
+    return cell_index, last_timestamps, last_positions
+
+def changed_cells(previous, current):
+    """
+    Finds the cells whose individual count differs between two indices
+
+    :param previous: The CellIndex of the previous run
+    :param current: The updated CellIndex
+    :returns: The packed keys of the changed cells
+    """
+    position = np.searchsorted(previous.cell_keys, current.cell_keys)
+    position = np.minimum(position, max(len(previous.cell_keys) - 1, 0))
+
+    known = np.zeros(len(current.cell_keys), dtype=bool)
+    previous_counts = np.zeros(len(current.cell_keys), dtype=np.int64)
+    if len(previous.cell_keys) > 0:
+        known = previous.cell_keys[position] == current.cell_keys
+        previous_counts = previous.counts[position]
+
+    return current.cell_keys[~known | (previous_counts != current.counts)]
+
+def outline_tiles(cell_index, graduation, tiles = None):
+    """
+    Traces the outline of every layer per tile, the outline of a layer is stored per tile so
+    that an update only has to trace the outlines of the tiles that contain changed cells
+
+    :param cell_index: CellIndex - the individuals recorded per cell
+    :param graduation: The borders of each bin
+    :param tiles: Optional packed keys of the tiles to trace, all tiles if None
+    :returns: Dict[Tuple(tile key, label), Polygon/MultiPolygon] in grid cell coordinates
+    """
+    cells = cell_index.cells
+    labels = np.searchsorted(graduation, cell_index.counts, side='right')
+    keys = tile_keys(cells)
+
+    mask = labels != 0
+    if tiles is not None:
+        mask &= np.isin(keys, tiles)
+
+    return outline_per_tile(cells[mask], labels[mask])
+
+def update_tiles(state, cell_index, graduation):
+    """
+    Updates the tile outlines of the previous run, only tiles with changed cells are traced
+    again, all of them if the graduation changed or the previous run stored no outlines
+
+    :param state: The CorridorState of the previous run or None
+    :param cell_index: The updated CellIndex
+    :param graduation: The graduation of the updated index
+    :returns: Tuple(tiles, number of traced tiles or None if all were traced)
+    """
+    if state is None or state.graduation is None or list(state.graduation) != list(graduation) or not state.tiles:
+        return outline_tiles(cell_index, graduation), None
+
+    dirty = np.unique(tile_keys(CellIndex.unpack(changed_cells(state.cell_index, cell_index))))
+
+    dirty_set = set(dirty.tolist())
+    tiles = {k: v for k, v in state.tiles.items() if k[0] not in dirty_set}
+    tiles.update(outline_tiles(cell_index, graduation, dirty))
+
+    return tiles, len(dirty)
+
+def build_map_incremental(state, cell_index, resolution_in_m = 1000, individual_threshold = 2, profiler = None,
+                          projection = None, renderer = 'folium', simplify_in_m = 0, graduation_mode = 'linear'):
+    """
+    Counterpart of build_map for outlines that reuses the tile outlines of the previous run
+
+    :param state: The CorridorState of the previous run or None
+    :param cell_index: The updated CellIndex
+    :param resolution_in_m: The resolution of the raster in meters
+    :param individual_threshold: Cells with fewer individuals are discarded
+    :param profiler: Optional StageProfiler that records every stage
+    :param projection: The GridProjection the cells were traced in, None if they were traced in degrees
+    :param renderer: How the map is drawn, see render_map
+    :param simplify_in_m: The simplification tolerance of the 'geojson' renderer
+    :param graduation_mode: How the borders of the bins are chosen, see determine_graduation
+    :returns: Tuple(map, polygons per label, graduation, tiles)
+    """
+    import shapely
+
+    profiler = profiler if profiler is not None else StageProfiler()
+
+    with profiler.stage('graduation', mode=graduation_mode) as record:
+        graduation = determine_graduation(cell_index.counts, individual_threshold, graduation_mode)
+        record['layers'] = len(graduation)
+
+    with profiler.stage('outline') as record:
+        tiles, traced = update_tiles(state, cell_index, graduation)
+        record['tiles'] = len(set(x[0] for x in tiles.keys()))
+        record['traced_tiles'] = traced if traced is not None else record['tiles']
+
+    with profiler.stage('union') as record:
+        plg_per_label = merge_tiles(tiles)
+        record['polygon_vertices'] = int(sum(shapely.get_num_coordinates(x) for x in plg_per_label.values()))
+
+    plg_per_label_processed = {}
+    for label, geometry in plg_per_label.items():
+        plg_per_label_processed[label] = cells_to_degrees(geometry, resolution_in_m, projection)
+
+    cells = cell_index.cells
+    bounds = cells_to_degrees(shapely.box(*cells.min(axis=0), *(cells.max(axis=0) + 1)), resolution_in_m, projection).bounds
+    m = render_map(plg_per_label_processed, graduation, bounds[:2], bounds[2:], profiler, renderer, resolution_in_m,
+                   simplify_in_m)
+
+    return m, plg_per_label_processed, graduation, tiles
+
@@ -0,0 +1,249 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from app.cell_index import CellIndex
+from app.gridmap import GridMap
+from app.profiling import StageProfiler
+
+POLYGONIZATION_MODES = ['outline', 'convex_hull']
+
+# the corners of a grid cell relative to its lower left corner
+CELL_CORNERS = np.array([[0, 0], [0, 1], [1, 1], [1, 0]])
+
+def row_boxes(cells):
+    """
+    Merges horizontally adjacent cells into one box per run
+
+    :param cells: Array (n, 2) - the grid cells
+    :returns: Array of box polygons in grid cell coordinates
+    """
+    import shapely
+
+    cells = np.asarray(cells, dtype=np.int64).reshape(-1, 2)
+    cells = cells[np.lexsort((cells[:, 1], cells[:, 0]))]
+
+    new_run = np.ones(len(cells), dtype=bool)
+    new_run[1:] = (cells[1:, 0] != cells[:-1, 0]) | (cells[1:, 1] != cells[:-1, 1] + 1)
+
+    starts = np.flatnonzero(new_run)
+    ends = np.append(starts[1:], len(cells)) - 1
+
+    return shapely.box(cells[starts, 0], cells[starts, 1], cells[starts, 0] + 1, cells[ends, 1] + 1)
+
+def outline(cells):
+    """
+    Traces the exact outline (including holes) of a set of grid cells
+
+    Horizontally adjacent cells are merged into one box per run first, so the
+    union only has to dissolve one box per run instead of one per cell.
+
+    :param cells: Array (n, 2) - the grid cells
+    :returns: Polygon/MultiPolygon in grid cell coordinates
+    """
+    import shapely
+
+    return shapely.union_all(row_boxes(cells))
+
+def convex_hull(cells):
+    """
+    Computes the convex hull of the corners of a set of grid cells
+
+    :param cells: Array (n, 2) - the grid cells
+    :returns: Polygon in grid cell coordinates
+    """
+    import shapely
+
+    cells = np.asarray(cells, dtype=np.int64).reshape(-1, 2)
+    corners = (cells[:, None, :] + CELL_CORNERS).reshape(-1, 2)
+    return shapely.convex_hull(shapely.multipoints(corners))
+
+def tile_keys(cells):
+    """
+    Gets the packed key of the tile of every cell, tiles are GridMap.TILE_SIZE cells wide
+    like those of the tiled raster backend
+
+    :param cells: Array (n, 2) - the grid cells
+    """
+    tiles = np.floor_divide(np.asarray(cells, dtype=np.int64).reshape(-1, 2), GridMap.TILE_SIZE)
+    return CellIndex.pack(tiles[:, 0], tiles[:, 1])
+
+def _outline_groups(groups):
+    """
+    Traces the outline of some groups of cells, used as worker function of the process pool
+
+    :param groups: List of Array (n, 2) - the grid cells of every group
+    :returns: List of Polygon/MultiPolygon in grid cell coordinates
+    """
+    return [outline(x) for x in groups]
+
+def outline_per_tile(cells, labels, workers = 1):
+    """
+    Traces the outline of the cells of every layer within every tile
+
+    :param cells: Array (n, 2) - the grid cells
+    :param labels: Array (n,) - the layer of every cell
+    :param workers: The number of processes tracing tiles in parallel, 1 runs serially
+    :returns: Dict[Tuple(tile key, label), Polygon/MultiPolygon] in grid cell coordinates
+    """
+    cells = np.asarray(cells, dtype=np.int64).reshape(-1, 2)
+    labels = np.asarray(labels)
+    keys = tile_keys(cells)
+
+    order = np.lexsort((labels, keys))
+    cells = cells[order]
+    labels = labels[order]
+    keys = keys[order]
+
+    first = np.ones(len(keys), dtype=bool)
+    first[1:] = (keys[1:] != keys[:-1]) | (labels[1:] != labels[:-1])
+    starts = np.flatnonzero(first)
+    stops = np.append(starts[1:], len(keys))
+
+    groups = [cells[a:b] for a, b in zip(starts, stops)]
+    if workers > 1 and len(groups) > 1:
+        # contiguous chunks keep the tiles in order
+        count = min(workers, len(groups))
+        bounds = np.linspace(0, len(groups), count + 1).astype(int)
+        chunks = [groups[bounds[i]:bounds[i + 1]] for i in range(count)]
+
+        with ProcessPoolExecutor(max_workers=count) as executor:
+            outlines = [x for result in executor.map(_outline_groups, chunks) for x in result]
+    else:
+        outlines = _outline_groups(groups)
+
+    return {(int(keys[a]), int(labels[a])): x for a, x in zip(starts, outlines)}
+
+def merge_tiles(tiles):
+    """
+    Unifies the tile outlines of every layer
+
+    :param tiles: Dict[Tuple(tile key, label), Polygon/MultiPolygon]
+    :returns: Dict[int, Polygon/MultiPolygon] - the geometry per layer in grid cell coordinates
+    """
+    import shapely
+
+    pieces = {}
+    for (_, label), geometry in tiles.items():
+        if label not in pieces:
+            pieces[label] = []
+
+        pieces[label].append(geometry)
+
+    return {label: shapely.union_all(pieces[label]) for label in sorted(pieces.keys())}
+
+def polygonize(grid, data, mode = 'outline', profiler = None):
+    """
+    Converts the filled raster to one geometry per layer
+
+    :param grid: The GridMap
+    :param data: The raster returned by GridMap.fill
+    :param mode: 'outline' traces the exact outline of the cells of each layer, 'convex_hull' 
+                    unifies the convex hulls of the connected components of each layer. With the
+                    tiled backend outlines are traced per tile (in parallel if the grid has several
+                    workers) and the tiles are merged afterwards
+    :param profiler: Optional StageProfiler that records the label, hull/outline and union stages
+    :returns: Dict[int, Polygon/MultiPolygon] - the geometry per layer in grid cell coordinates,
+                layer 0 (below the capture threshold) is omitted
+    """
+    import shapely
+
+    if mode not in POLYGONIZATION_MODES:
+        raise ValueError("Unknown polygonization '{}'".format(mode))
+
+    profiler = profiler if profiler is not None else StageProfiler()
+    pieces = {}
+
+    if mode == 'outline':
+        with profiler.stage('label') as record:
+            layers = [(label, cells) for label, cells in grid.layers(data) if label != 0]
+            record['layers'] = len(layers)
+
+        if grid.backend == 'tiled':
+            # a union over the row boxes of a whole continent is one huge operation, the
+            # outline of every tile only dissolves the boxes within it
+            with profiler.stage('outline') as record:
+                cells = np.concatenate([x for _, x in layers] + [np.empty((0, 2), dtype=np.int64)])
+                labels = np.concatenate([np.full(len(x), label) for label, x in layers] + [np.empty(0, dtype=np.int64)])
+                tiles = outline_per_tile(cells, labels, grid.workers)
+
+                record['tiles'] = len(tiles)
+
+            with profiler.stage('union') as record:
+                res = merge_tiles(tiles)
+                record['polygon_vertices'] = int(sum(shapely.get_num_coordinates(x) for x in res.values()))
+
+            return res
+
+        with profiler.stage('outline') as record:
+            for label, cells in layers:
+                pieces[label] = row_boxes(cells)
+
+            record['boxes'] = sum(len(x) for x in pieces.values())
+
+    else:
+        with profiler.stage('label') as record:
+            components = [(label, cells) for label, cells in grid.generate_polygons(data) if label != 0]
+            record['components'] = len(components)
+
+        with profiler.stage('hull') as record:
+            for label, cells in components:
+                if label not in pieces:
+                    pieces[label] = []
+
+                pieces[label].append(convex_hull(cells))
+
+            record['hulls'] = len(components)
+
+    # unify all polygons per layer, the convex hulls of one layer may be nested 
+    # inside each other and the outline boxes of one layer touch each other
+    with profiler.stage('union') as record:
+        res = {}
+        for label in sorted(pieces.keys()):
+            res[label] = shapely.union_all(pieces[label])
+
+        record['polygon_vertices'] = int(sum(shapely.get_num_coordinates(x) for x in res.values()))
+
+    return res
+
+def subtract_higher_layers(geometries):
+    """
+    Cuts the area of all higher layers out of every layer, so that e.g. a dark gray
+    polygon does not extend below an overlapping black one
+
+    The higher layers are unified cumulatively from the top down, and every polygon is
+    only subtracted by the parts of that union an STRtree reports as intersecting.
+
+    :param geometries: Dict[int, Polygon/MultiPolygon] - the geometry per layer
+    :returns: Dict[int, Polygon/MultiPolygon] - the disjoint geometry per layer
+    """
+    import shapely
+
+    res = {}
+    higher = None
+    for label in sorted(geometries.keys(), reverse=True):
+        geometry = geometries[label]
+
+        if higher is None:
+            res[label] = geometry
+            higher = geometry
+            continue
+
+        higher_parts = shapely.get_parts(higher)
+        tree = shapely.STRtree(higher_parts)
+
+        parts = shapely.get_parts(geometry)
+        part_ids, higher_ids = tree.query(parts, predicate='intersects')
+
+        polygons = []
+        for i, part in enumerate(parts):
+            candidates = higher_ids[part_ids == i]
+            if len(candidates) > 0:
+                part = part.difference(shapely.union_all(higher_parts[candidates]))
+
+            polygons.extend(x for x in shapely.get_parts(part) if x.geom_type == 'Polygon' and not x.is_empty)
+
+        res[label] = polygons[0] if len(polygons) == 1 else shapely.MultiPolygon(polygons)
+        higher = shapely.union_all([higher, geometry])
+
+    return {label: res[label] for label in sorted(res.keys())}
@@ -0,0 +1,86 @@
+import json
+import logging
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # not available on windows, peak memory is not recorded there
+    resource = None
+
+def peak_rss_mb():
+    """
+    Gets the peak resident set size of this process and its (worker) children in MB,
+    None if the platform does not provide it
+    """
+    if resource is None:
+        return None
+
+    usage = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+    # linux reports kilobytes, macOS bytes
+    return usage / (1024 * 1024) if sys.platform == 'darwin' else usage / 1024
+
+class StageProfiler:
+    """
+    Records wall time, peak memory and item counts for every stage of a run
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes this instance
+        """
+        self.__stages = []
+
+    @property
+    def stages(self):
+        """
+        Gets the records of all finished stages, in order
+        """
+        return self.__stages
+
+    @contextmanager
+    def stage(self, name, **counts):
+        """
+        Times the enclosed block as stage
+
+            with profiler.stage('trace', segments=n) as record:
+                ...
+                record['cells'] = len(index)
+
+        :param name: The name of the stage
+        :param counts: Item counts known up front, more can be added to the yielded record
+        :returns: The record of the stage (dict)
+        """
+        record = {'stage': name}
+        record.update(counts)
+
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['wall_time_s'] = time.perf_counter() - start
+            # the peak is the high-water mark of the whole run up to the end of this stage
+            record['peak_rss_mb'] = peak_rss_mb()
+            self.__stages.append(record)
+
+            details = ", ".join("{}={}".format(k, v) for k, v in record.items() if k not in ('stage', 'wall_time_s'))
+            logging.info("Stage {} took {:.3f}s ({})".format(name, record['wall_time_s'], details))
+
+    def to_json(self):
+        """
+        Serializes all stage records as JSON
+        """
+        return json.dumps({'stages': self.__stages}, indent=2, default=str)
+
+    def write(self, path):
+        """
+        Writes all stage records as JSON file
+
+        :param path: The path of the JSON file
+        """
+        with open(path, 'w') as f:
+            f.write(self.to_json())
@@ -0,0 +1,97 @@
+import numpy as np
+
+from app.sequence import SequenceBuilder
+
+GRID_PROJECTIONS = ['none', 'equal_area', 'utm']
+
+class GridProjection:
+    """
+    Projects (lat, lon) positions to a local metric CRS before tracing, so that grid cells
+    are squares of the configured size at every latitude.
+
+    The projected positions are stored as (northing, easting) / DEG_TO_M, i.e. in the same
+    units SequenceBuilder expects degrees in, so tracing and rasterizing work unchanged and
+    a cell is exactly resolution_in_m wide. Only the final polygons are projected back.
+    """
+
+    # Long polygon edges are split into pieces of at most this length before projecting
+    # them back, so that they follow the curvature of the projection
+    SEGMENT_M = 10_000
+
+    def __init__(self, crs) -> None:
+        """
+        Initializes this instance
+
+        :param crs: The projected CRS, anything pyproj understands
+        """
+        from pyproj import CRS, Transformer
+
+        self.__crs = CRS.from_user_input(crs)
+        self.__forward = Transformer.from_crs('EPSG:4326', self.__crs, always_xy=True)
+        self.__inverse = Transformer.from_crs(self.__crs, 'EPSG:4326', always_xy=True)
+
+    @property
+    def crs(self):
+        """
+        Gets the projected CRS as string
+        """
+        return self.__crs.to_string()
+
+    @classmethod
+    def for_points(cls, points, mode = 'equal_area'):
+        """
+        Chooses a projection centered on the positions, the center is rounded to whole
+        degrees so that slightly different data leads to the same projection
+
+        :param points: Array (n, 2) of (lat, lon)
+        :param mode: 'equal_area' for a Lambert azimuthal equal-area projection, 'utm' for the
+                        UTM zone of the center
+        :returns: GridProjection or None for mode 'none'
+        """
+        if mode == 'none':
+            return None
+        if mode not in GRID_PROJECTIONS:
+            raise ValueError("Unknown grid projection '{}'".format(mode))
+
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        lat, lon = np.round(np.median(points, axis=0)) if len(points) > 0 else (0.0, 0.0)
+
+        if mode == 'utm':
+            zone = int((lon + 180) // 6) % 60 + 1
+            return cls('EPSG:{}'.format((32600 if lat >= 0 else 32700) + zone))
+
+        return cls('+proj=laea +lat_0={} +lon_0={} +x_0=0 +y_0=0 +datum=WGS84 +units=m +no_defs'.format(lat, lon))
+
+    def forward(self, points):
+        """
+        Projects (lat, lon) positions
+
+        :param points: Array (n, 2) of (lat, lon)
+        :returns: Array (n, 2) of (northing, easting) / DEG_TO_M
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        x, y = self.__forward.transform(points[:, 1], points[:, 0])
+        return np.stack((y, x), axis=1) / SequenceBuilder.DEG_TO_M
+
+    def inverse(self, coords):
+        """
+        Projects positions returned by forward back, can be used with shapely.transform
+
+        :param coords: Array (n, 2) of (northing, easting) / DEG_TO_M
+        :returns: Array (n, 2) of (lat, lon)
+        """
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2) * SequenceBuilder.DEG_TO_M
+        lon, lat = self.__inverse.transform(coords[:, 1], coords[:, 0])
+        return np.stack((lat, lon), axis=1)
+
+    def inverse_geometry(self, geometry):
+        """
+        Projects a geometry back, long edges are split first
+
+        :param geometry: Geometry in the units of forward
+        :returns: Geometry in (lat, lon)
+        """
+        import shapely
+
+        geometry = shapely.segmentize(geometry, GridProjection.SEGMENT_M / SequenceBuilder.DEG_TO_M)
+        return shapely.transform(geometry, self.inverse)
@@ -1,37 +1,129 @@
-from typing import Dict, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+import os
 import numpy as np
-from rdp import rdp
+
+from app.simplify import SIMPLIFIERS
+from app.reduce_cache import ReduceCache
+
+TO_METERS = 1 / 110_000
+
+def _reduce_chunk(chunk: List[Tuple[int, np.ndarray]], epsilon: float, simplifier: str) -> List[Tuple[int, np.ndarray]]:
+    """
+    Simplifies every trajectory of a chunk, used as worker function of the process pool
+
+    :param chunk: The (individual, points) pairs to reduce
+    :param epsilon: The epsilon parameter of RDP in degrees
+    :param simplifier: The name of the simplification algorithm, see app.simplify.SIMPLIFIERS
+    :returns: The (individual, indices of the kept points) pairs
+    """
+    simplify = SIMPLIFIERS[simplifier]
+    return [(key, simplify(data, epsilon)) for key, data in chunk]
 
 class Reduce:
     """
     Class performs RDP-Algorithm (segmentreduction on line) on trajectories
     """
-    def __init__(self, rdp_scale: int = 350):
+
+    # Trajectories are packed into chunks of at least this many points before being
+    # sent to a worker process, so that small trajectories don't pay for IPC one by one
+    CHUNK_POINTS = 20_000
+
+    def __init__(self, rdp_scale: int = 350, workers: int = 1, simplifier: str = 'douglas_peucker',
+                 cache: Optional[ReduceCache] = None):
         """
         Creates an instance
 
-        :param rdp_scale: The epsilon parameter of RDP algorithm, higher values will lead to more segments being 
-                            discarded, smaller values will leave more segments in place 
+        :param rdp_scale: The epsilon parameter of RDP algorithm, higher values will lead to more segments being
+                            discarded, smaller values will leave more segments in place
+        :param workers: The number of worker processes, 1 runs serially, 0 uses all available cores
+        :param simplifier: The name of the simplification algorithm, see app.simplify.SIMPLIFIERS
+        :param cache: Optional ReduceCache, trajectories found in it are not simplified again
         """
+        if simplifier not in SIMPLIFIERS:
+            raise ValueError("Unknown simplifier '{}'".format(simplifier))
+
         self.__rdp_resolution = rdp_scale
+        self.__simplifier = simplifier
+        self.__workers = workers if workers > 0 else os.cpu_count()
+        self.__cache = cache
+
+    @property
+    def cache(self) -> Optional[ReduceCache]:
+        """
+        Gets the cache of simplified trajectories, None if caching is disabled
+        """
+        return self.__cache
 
-    def __call__(self, data: Dict[int, Tuple[np.datetime64, float, float]]) -> Dict[int, Tuple[np.datetime64, float, float]]:
+    @staticmethod
+    def chunk(items: List[Tuple[int, np.ndarray]], chunk_points: int) -> List[List[Tuple[int, np.ndarray]]]:
+        """
+        Groups trajectories into chunks of roughly chunk_points points
+
+        :param items: The (individual, points) pairs
+        :param chunk_points: The minimum number of points per chunk
+        """
+        chunks = []
+        current = []
+        current_points = 0
+        for key, data in items:
+            current.append((key, data))
+            current_points += len(data)
+
+            if current_points >= chunk_points:
+                chunks.append(current)
+                current = []
+                current_points = 0
+
+        if len(current) > 0:
+            chunks.append(current)
+
+        return chunks
+
+    def __call__(self, data: Iterable[Tuple[int, np.ndarray, np.ndarray]], timestamps: bool = False) -> Dict[int, np.ndarray]:
         """
         Performs the RDP algorithm on  data
 
-        :param data: The input data for the algorithm
+        :param data: The input data for the algorithm, as extracted by DataExtractor
+        :param timestamps: If True, the timestamps of the kept points are returned as well
+        :returns: Mapping of individual to its reduced (lat, lon) points, or to
+                    Tuple(timestamps, points) if timestamps is True
         """
-        parsed_data = {}
-        for key, value in data:
-            lat = [x[2] for x in value]
-            lon = [x[1] for x in value]
+        data = list(data)
+        # (x, y) -> (lat, lon)
+        items = [(key, np.ascontiguousarray(coordinates[:, ::-1])) for key, _, coordinates in data]
+        epsilon = self.__rdp_resolution * TO_METERS
+
+        indices = {}
+        todo = items
+        if self.__cache is not None:
+            keys = [ReduceCache.key(data, epsilon, self.__simplifier) for _, data in items]
+            for (key, _), cache_key in zip(items, keys):
+                cached = self.__cache.get(cache_key)
+                if cached is not None:
+                    indices[key] = cached
 
-            data = np.array((list(zip(lat, lon))))
+            todo = [x for x in items if x[0] not in indices]
 
-            TO_METERS = 1 / 110_000
-            data2 = rdp(data, self.__rdp_resolution * TO_METERS)
-            print("Reduced from {} to {}".format(len(data), len(data2)))
+        if self.__workers > 1 and len(todo) > 1:
+            chunks = Reduce.chunk(todo, Reduce.CHUNK_POINTS)
+            with ProcessPoolExecutor(max_workers=min(self.__workers, len(chunks))) as executor:
+                reduced = executor.map(_reduce_chunk, chunks, [epsilon] * len(chunks), [self.__simplifier] * len(chunks))
+                results = [x for result in reduced for x in result]
+        else:
+            results = _reduce_chunk(todo, epsilon, self.__simplifier)
 
-            parsed_data[key] = data2
+        indices.update(results)
+
+        if self.__cache is not None and len(results) > 0:
+            cache_keys = dict(zip((x[0] for x in items), keys))
+            for key, kept in results:
+                self.__cache.put(cache_keys[key], kept)
+            self.__cache.evict()
+
+        parsed_data = {}
+        for (key, points), (_, times, _) in zip(items, data):
+            data2 = points[indices[key]]
+            parsed_data[key] = (times[indices[key]], data2) if timestamps else data2
 
-        return parsed_data
\ No newline at end of file
+        return parsed_data
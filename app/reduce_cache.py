@@ -0,0 +1,136 @@
+import hashlib
+import os
+import uuid
+
+import numpy as np
+
+class ReduceCache:
+    """
+    On-disk cache of simplified trajectories.
+
+    Every entry holds the indices of the positions a simplifier kept, as compact .npy file
+    named by a hash of the raw coordinates, the epsilon and the simplifier. So a repeated
+    run over unchanged data only has to hash the coordinates. Reading an entry refreshes its
+    modification time; when the cache grows beyond max_bytes, the least recently used
+    entries are removed.
+    """
+
+    SUFFIX = '.npy'
+
+    def __init__(self, directory, max_bytes = 512 * 1024 * 1024) -> None:
+        """
+        Initializes this instance, the directory is created if missing
+
+        :param directory: The directory of the cache files
+        :param max_bytes: The maximum size of all cache files together
+        """
+        os.makedirs(directory, exist_ok=True)
+
+        self.__directory = directory
+        self.__max_bytes = max_bytes
+        self.__hits = 0
+        self.__misses = 0
+        # the size of all entries, known after the first scan of the directory
+        self.__size = None
+
+    @property
+    def directory(self):
+        """
+        Gets the directory of the cache files
+        """
+        return self.__directory
+
+    @property
+    def hits(self):
+        """
+        Gets the number of lookups that found an entry
+        """
+        return self.__hits
+
+    @property
+    def misses(self):
+        """
+        Gets the number of lookups that found no entry
+        """
+        return self.__misses
+
+    @staticmethod
+    def key(coordinates, epsilon, simplifier):
+        """
+        Calculates the key of a trajectory
+
+        :param coordinates: The raw positions of the trajectory
+        :param epsilon: The epsilon of the simplifier
+        :param simplifier: The name of the simplifier
+        :returns: Hex digest
+        """
+        coordinates = np.ascontiguousarray(coordinates, dtype=np.float64)
+
+        h = hashlib.blake2b(digest_size=20)
+        h.update("{}|{!r}|{}|".format(simplifier, float(epsilon), coordinates.shape).encode())
+        h.update(coordinates.tobytes())
+        return h.hexdigest()
+
+    def __path(self, key):
+        return os.path.join(self.__directory, key + ReduceCache.SUFFIX)
+
+    def get(self, key):
+        """
+        Looks up the kept indices of a trajectory
+
+        :returns: Array of indices or None if there is no entry
+        """
+        path = self.__path(key)
+        try:
+            indices = np.load(path)
+            os.utime(path)
+        except (OSError, ValueError):
+            # missing, evicted in the meantime or truncated
+            self.__misses += 1
+            return None
+
+        self.__hits += 1
+        return indices
+
+    def put(self, key, indices):
+        """
+        Stores the kept indices of a trajectory, call evict once all entries of a run are stored
+        """
+        indices = np.asarray(indices)
+        dtype = np.uint32 if len(indices) == 0 or indices.max() <= np.iinfo(np.uint32).max else np.int64
+
+        # write to a temporary file first, so that concurrent runs never read half written entries
+        path = self.__path(key)
+        tmp_path = "{}.{}.tmp".format(path, uuid.uuid4().hex)
+        with open(tmp_path, 'wb') as f:
+            np.save(f, indices.astype(dtype))
+        os.replace(tmp_path, path)
+
+        if self.__size is not None:
+            self.__size += os.path.getsize(path)
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits into max_bytes
+        """
+        if self.__size is not None and self.__size <= self.__max_bytes:
+            return
+
+        entries = []
+        for entry in os.scandir(self.__directory):
+            if entry.name.endswith(ReduceCache.SUFFIX):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        size = sum(x[1] for x in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.__max_bytes:
+                break
+
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size -= entry_size
+
+        self.__size = size
@@ -1,5 +1,7 @@
 import math
 
+import numpy as np
+
 class SequenceBuilder:
     """
     Builder class used to create multiple "Sequences"
@@ -27,6 +29,13 @@ class SequenceBuilder:
         """
         return [pt[0] / self.__resolution_in_ms, pt[1] / self.__resolution_in_ms]
     
+    def convert_cells_back_to_deg(self, coords):
+        """
+        Converts an (n, 2) array of sequence coordinates back to GPS coordinates, can be
+        used with shapely.transform
+        """
+        return np.asarray(coords, dtype=np.float64) / self.__resolution_in_ms
+
     def get_edges_from_cell(self, pt):
         """
         Retrieves the edges from a crid cell coordinate and converts them back to GPS coordinates
@@ -0,0 +1,198 @@
+import heapq
+
+import numpy as np
+
+def _distances(points, start, end):
+    """
+    Computes the perpendicular distance of every point to the line through start and end,
+    equal to the point line distance of the rdp package
+
+    :param points: Array (n, 2) - the points to measure
+    :param start: the first point of the line
+    :param end: the second point of the line
+    """
+    direction = end - start
+    norm = np.hypot(direction[0], direction[1])
+
+    if norm == 0:
+        return np.hypot(points[:, 0] - start[0], points[:, 1] - start[1])
+
+    return np.abs(direction[0] * (start[1] - points[:, 1]) - direction[1] * (start[0] - points[:, 0])) / norm
+
+def douglas_peucker(points, epsilon):
+    """
+    Stack based Ramer-Douglas-Peucker simplification
+
+    Keeps the same points as the recursive rdp package, but without recursion and with the
+    distances of each range computed in one vectorized pass.
+
+    :param points: Array (n, 2) - the trajectory
+    :param epsilon: Points closer than epsilon to the simplified line are discarded
+    :returns: The sorted indices of the points to keep
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) < 3:
+        return np.arange(len(points))
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = True
+    keep[-1] = True
+
+    stack = [(0, len(points) - 1)]
+    while len(stack) > 0:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+
+        distances = _distances(points[start + 1:end], points[start], points[end])
+        index = int(np.argmax(distances))
+
+        if distances[index] > epsilon:
+            split = start + 1 + index
+            keep[split] = True
+            stack.append((split, end))
+            stack.append((start, split))
+
+    return np.flatnonzero(keep)
+
+def radial_distance(points, tolerance):
+    """
+    Discards consecutive points that are closer than tolerance to the last kept point
+
+    :param points: Array (n, 2) - the trajectory
+    :param tolerance: The minimal distance between two kept points
+    :returns: The sorted indices of the points to keep, always including first and last point
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) < 3:
+        return np.arange(len(points))
+
+    kept = [0]
+    last = len(points) - 1
+    while True:
+        # search the next point outside the tolerance in growing windows
+        current = kept[-1]
+        start = current + 1
+        window = 64
+        found = None
+        while start < last:
+            stop = min(start + window, last)
+            candidates = points[start:stop]
+            far = np.hypot(candidates[:, 0] - points[current, 0], candidates[:, 1] - points[current, 1]) >= tolerance
+
+            if far.any():
+                found = start + int(np.argmax(far))
+                break
+
+            start = stop
+            window *= 2
+
+        if found is None:
+            break
+
+        kept.append(found)
+
+    kept.append(last)
+
+    return np.asarray(kept)
+
+def visvalingam_whyatt(points, min_area):
+    """
+    Visvalingam-Whyatt simplification, repeatedly discards the point spanning the smallest
+    triangle with its neighbours until every remaining triangle is at least min_area
+
+    :param points: Array (n, 2) - the trajectory
+    :param min_area: The minimal effective area of a kept point
+    :returns: The sorted indices of the points to keep, always including first and last point
+    """
+    points = np.asarray(points, dtype=np.float64)
+    n = len(points)
+    if n < 3:
+        return np.arange(n)
+
+    areas = np.abs((points[1:-1, 0] - points[:-2, 0]) * (points[2:, 1] - points[:-2, 1]) -
+                   (points[2:, 0] - points[:-2, 0]) * (points[1:-1, 1] - points[:-2, 1])) / 2
+
+    # the heap loop is inherently sequential, plain lists are much faster than scalar array access
+    xs = points[:, 0].tolist()
+    ys = points[:, 1].tolist()
+
+    def area(a, b, c):
+        return abs((xs[b] - xs[a]) * (ys[c] - ys[a]) - (xs[c] - xs[a]) * (ys[b] - ys[a])) / 2
+
+    prev = list(range(-1, n - 1))
+    next = list(range(1, n + 1))
+    removed = [False] * n
+
+    current = [np.inf] + areas.tolist() + [np.inf]
+
+    heap = [(a, i) for i, a in enumerate(current[1:-1], 1)]
+    heapq.heapify(heap)
+
+    while len(heap) > 0:
+        a, i = heapq.heappop(heap)
+        if removed[i] or a != current[i]:
+            continue
+
+        if a >= min_area:
+            break
+
+        removed[i] = True
+        p = prev[i]
+        q = next[i]
+        next[p] = q
+        prev[q] = p
+
+        # the effective area of a neighbour never drops below the one of the removed point
+        if p > 0:
+            current[p] = max(area(prev[p], p, q), a)
+            heapq.heappush(heap, (current[p], p))
+
+        if q < n - 1:
+            current[q] = max(area(p, q, next[q]), a)
+            heapq.heappush(heap, (current[q], q))
+
+    return np.flatnonzero(~np.asarray(removed))
+
+def rdp_package(points, epsilon):
+    """
+    Ramer-Douglas-Peucker simplification by the rdp package
+
+    :param points: Array (n, 2) - the trajectory
+    :param epsilon: Points closer than epsilon to the simplified line are discarded
+    :returns: The sorted indices of the points to keep
+    """
+    from rdp import rdp
+
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) < 3:
+        return np.arange(len(points))
+
+    return np.flatnonzero(rdp(points, epsilon, algo='iter', return_mask=True))
+
+def radial_douglas_peucker(points, epsilon):
+    """
+    Radial distance pre-pass followed by Douglas-Peucker, both using epsilon
+
+    :returns: The sorted indices of the points to keep
+    """
+    pre = radial_distance(points, epsilon)
+    return pre[douglas_peucker(np.asarray(points)[pre], epsilon)]
+
+def visvalingam_douglas_peucker(points, epsilon):
+    """
+    Visvalingam-Whyatt pre-pass followed by Douglas-Peucker. The pre-pass discards points
+    whose effective area is below that of a triangle with base and height epsilon
+
+    :returns: The sorted indices of the points to keep
+    """
+    pre = visvalingam_whyatt(points, epsilon * epsilon / 2)
+    return pre[douglas_peucker(np.asarray(points)[pre], epsilon)]
+
+SIMPLIFIERS = {
+    'douglas_peucker': douglas_peucker,
+    'radial_douglas_peucker': radial_douglas_peucker,
+    'visvalingam_douglas_peucker': visvalingam_douglas_peucker,
+    'rdp': rdp_package
+}
+"""Simplification algorithms selectable via the 'simplifier' setting, each maps (points, epsilon) to kept indices"""
@@ -0,0 +1,281 @@
+import json
+import os
+
+import numpy as np
+
+from app.cell_index import CellIndexBuilder
+from app.traversal import BatchTraversal
+
+class TrajectorySource:
+    """
+    Reads the positions of a file chunk by chunk and yields the trajectory of one
+    individual at a time, in the same shape as DataExtractor does.
+
+    The rows are expected to be grouped by individual and sorted by time, as Movebank
+    exports are. Only the rows of the current individual are buffered, so memory is
+    bounded by the largest individual instead of the whole study. An individual whose
+    rows reappear later in the file is yielded once more with the remaining rows.
+    """
+
+    # The number of rows read at once
+    CHUNK_ROWS = 100_000
+
+    def __init__(self, path, crs, chunk_rows = CHUNK_ROWS) -> None:
+        """
+        Initializes this instance
+
+        :param path: The path of the file
+        :param crs: The coordinate reference system of the positions
+        :param chunk_rows: The number of rows read at once
+        """
+        self.__path = path
+        self.__crs = crs
+        self.__chunk_rows = chunk_rows
+
+    @property
+    def path(self):
+        """
+        Gets the path of the file
+        """
+        return self.__path
+
+    @property
+    def crs(self):
+        """
+        Gets the coordinate reference system of the positions
+        """
+        return self.__crs
+
+    @property
+    def chunk_rows(self):
+        """
+        Gets the number of rows read at once
+        """
+        return self.__chunk_rows
+
+    def chunks(self):
+        """
+        Reads the file chunk by chunk, implemented by every source
+
+        :returns: Generator of Tuple(ids, timestamps, coordinates) - the rows of one chunk,
+                    coordinates is an (n, 2) float64 array of (x, y)
+        """
+        raise NotImplementedError()
+
+    def __iter__(self):
+        """
+        Groups the rows of all chunks by individual
+
+        :returns: Generator of Tuple(id, timestamps, coordinates)
+        """
+        current = None
+        timestamps = []
+        coordinates = []
+
+        for ids, chunk_timestamps, chunk_coordinates in self.chunks():
+            if len(ids) == 0:
+                continue
+
+            borders = np.flatnonzero(ids[1:] != ids[:-1]) + 1
+            starts = np.concatenate(([0], borders))
+            stops = np.append(borders, len(ids))
+
+            for start, stop in zip(starts, stops):
+                if ids[start] != current:
+                    if current is not None:
+                        yield (current, np.concatenate(timestamps), np.concatenate(coordinates))
+
+                    current = ids[start]
+                    timestamps = []
+                    coordinates = []
+
+                timestamps.append(chunk_timestamps[start:stop])
+                coordinates.append(chunk_coordinates[start:stop])
+
+        if current is not None:
+            yield (current, np.concatenate(timestamps), np.concatenate(coordinates))
+
+class CsvTrajectorySource(TrajectorySource):
+    """
+    Streams a Movebank CSV export as consumed by utils/input_converter.py
+    """
+
+    def __init__(self, path, individual_column = 'trackId', timestamp_column = 'timestamps',
+                 x_column = 'location.long', y_column = 'location.lat', crs = None, timezone = None,
+                 chunk_rows = TrajectorySource.CHUNK_ROWS) -> None:
+        """
+        Initializes this instance, crs and timezone default to the ones of a meta.csv next
+        to the file, or to EPSG:4326 and UTC if there is none
+
+        :param path: The path of the CSV file
+        :param individual_column: The column of the individual id
+        :param timestamp_column: The column of the timestamps
+        :param x_column: The column of the x coordinate (longitude)
+        :param y_column: The column of the y coordinate (latitude)
+        :param crs: The coordinate reference system of the positions
+        :param timezone: The timezone of timestamps without one
+        :param chunk_rows: The number of rows read at once
+        """
+        import pandas as pd
+
+        meta_path = os.path.join(os.path.dirname(path), 'meta.csv')
+        if (crs is None or timezone is None) and os.path.exists(meta_path):
+            meta = pd.read_csv(meta_path)
+            crs = crs if crs is not None or 'crs' not in meta else meta['crs'][0]
+            timezone = timezone if timezone is not None or 'tzone' not in meta else meta['tzone'][0]
+
+        super().__init__(path, crs if crs is not None else 'EPSG:4326', chunk_rows)
+
+        self.__columns = (individual_column, timestamp_column, x_column, y_column)
+        self.__timezone = timezone if timezone is not None else 'UTC'
+
+    def chunks(self):
+        import pandas as pd
+
+        individual_column, timestamp_column, x_column, y_column = self.__columns
+
+        reader = pd.read_csv(self.path, usecols=list(self.__columns), chunksize=self.chunk_rows)
+        for df in reader:
+            timestamps = pd.to_datetime(df[timestamp_column])
+            if timestamps.dt.tz is None:
+                timestamps = timestamps.dt.tz_localize(self.__timezone)
+
+            yield (df[individual_column].to_numpy(),
+                   timestamps.dt.tz_convert(None).to_numpy(dtype='datetime64[ns]'),
+                   np.ascontiguousarray(df[[x_column, y_column]].to_numpy(dtype=np.float64)))
+
+class ParquetTrajectorySource(TrajectorySource):
+    """
+    Streams a Parquet or GeoParquet file row group by row group, requires pyarrow
+    """
+
+    def __init__(self, path, individual_column = 'individual_local_identifier', timestamp_column = 'timestamp',
+                 x_column = None, y_column = None, geometry_column = 'geometry', crs = None,
+                 chunk_rows = TrajectorySource.CHUNK_ROWS) -> None:
+        """
+        Initializes this instance, the positions are read from x_column and y_column if both
+        are given, otherwise from the WKB points of geometry_column (GeoParquet). The crs
+        defaults to the one of the GeoParquet metadata, or to EPSG:4326 if there is none
+
+        :param path: The path of the Parquet file
+        :param individual_column: The column of the individual id
+        :param timestamp_column: The column of the timestamps
+        :param x_column: The column of the x coordinate (longitude)
+        :param y_column: The column of the y coordinate (latitude)
+        :param geometry_column: The column of the WKB encoded points
+        :param crs: The coordinate reference system of the positions
+        :param chunk_rows: The number of rows read at once
+        """
+        import pyarrow.parquet as pq
+
+        self.__use_geometry = x_column is None or y_column is None
+        if self.__use_geometry:
+            self.__columns = (individual_column, timestamp_column, geometry_column)
+        else:
+            self.__columns = (individual_column, timestamp_column, x_column, y_column)
+
+        if crs is None and self.__use_geometry:
+            metadata = pq.ParquetFile(path).schema_arrow.metadata or {}
+            if b'geo' in metadata:
+                column = json.loads(metadata[b'geo']).get('columns', {}).get(geometry_column, {})
+                if column.get('crs') is not None:
+                    from pyproj import CRS
+                    crs = CRS.from_user_input(column['crs']).to_string()
+
+        super().__init__(path, crs if crs is not None else 'EPSG:4326', chunk_rows)
+
+    def chunks(self):
+        import pandas as pd
+        import pyarrow.parquet as pq
+        import shapely
+
+        individual_column, timestamp_column = self.__columns[:2]
+
+        parquet_file = pq.ParquetFile(self.path)
+        for batch in parquet_file.iter_batches(batch_size=self.chunk_rows, columns=list(self.__columns)):
+            df = batch.to_pandas()
+
+            timestamps = pd.to_datetime(df[timestamp_column])
+            if timestamps.dt.tz is not None:
+                timestamps = timestamps.dt.tz_convert(None)
+
+            if self.__use_geometry:
+                geometries = shapely.from_wkb(df[self.__columns[2]].to_numpy())
+                coordinates = shapely.get_coordinates(geometries)
+            else:
+                coordinates = df[list(self.__columns[2:])].to_numpy(dtype=np.float64)
+
+            yield (df[individual_column].to_numpy(),
+                   timestamps.to_numpy(dtype='datetime64[ns]'),
+                   np.ascontiguousarray(coordinates, dtype=np.float64))
+
+SOURCES = {
+    '.csv': CsvTrajectorySource,
+    '.parquet': ParquetTrajectorySource,
+    '.geoparquet': ParquetTrajectorySource
+}
+
+def open_source(path):
+    """
+    Opens a streaming source by the file extension of path
+
+    :returns: TrajectorySource or None if the file type can't be streamed
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in SOURCES:
+        return None
+
+    return SOURCES[extension](path)
+
+def trace_stream(source, reduce, resolution_in_m, record = None, builder = None, last_positions = None, projection = None):
+    """
+    Runs extract, reduce and trace individual by individual and only keeps the traced
+    cells. A trajectory that continues in a later part of the source is joined to the
+    last position of its previous part, so that no segment is lost.
+
+    :param source: Iterable of Tuple(id, timestamps, coordinates), e.g. a TrajectorySource
+    :param reduce: The Reduce instance
+    :param resolution_in_m: The resolution of the raster in meters
+    :param record: Optional profiler record the item counts are added to
+    :param builder: Optional CellIndexBuilder to continue, e.g. with the cells of a previous run
+    :param last_positions: Optional Dict[id, (lat, lon)] of the last position of every individual
+                            traced so far, updated in place
+    :param projection: Optional GridProjection the positions are traced in, last_positions are projected as well
+    :returns: CellIndex - the individuals recorded per cell
+    """
+    traversal = BatchTraversal(resolution_in_m)
+    builder = builder if builder is not None else CellIndexBuilder()
+
+    # the last reduced position of every individual, simplification always keeps it
+    last_positions = last_positions if last_positions is not None else {}
+    points = 0
+    points_out = 0
+    segments = 0
+
+    for individual, timestamps, coordinates in source:
+        points += len(coordinates)
+
+        reduced = reduce([(individual, timestamps, coordinates)])[individual]
+        points_out += len(reduced)
+        if projection is not None:
+            reduced = projection.forward(reduced)
+
+        if individual in last_positions:
+            reduced = np.concatenate((last_positions[individual][None, :], reduced))
+        last_positions[individual] = reduced[-1]
+
+        cell_x, cell_y, _, _ = traversal({individual: reduced})
+        builder.add(cell_x, cell_y, individual)
+        segments += max(len(reduced) - 1, 0)
+
+    cell_index = builder.build()
+
+    if record is not None:
+        record['individuals'] = len(builder.individuals)
+        record['points'] = points
+        record['points_out'] = points_out
+        record['segments'] = segments
+        record['cell_individual_pairs'] = len(cell_index.keys)
+        record['cells'] = len(cell_index)
+
+    return cell_index
@@ -0,0 +1,139 @@
+import numpy as np
+
+from app.cell_index import CellIndex
+from app.traversal import BatchTraversal
+
+# 'year' maps every calendar year on its own, 'season' and 'month' pool the same season or
+# month of all years, e.g. to compare spring and autumn migration
+TIME_WINDOWS = ['none', 'year', 'season', 'month']
+
+# meteorological seasons, winter is December to February
+SEASONS = ['winter', 'spring', 'summer', 'autumn']
+
+MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+
+def window_keys(timestamps, mode):
+    """
+    Gets the window of every timestamp
+
+    :param timestamps: Array of datetime64
+    :param mode: One of TIME_WINDOWS except 'none'
+    :returns: Array of int - the year, the index into SEASONS or the index into MONTHS
+    """
+    if mode not in TIME_WINDOWS or mode == 'none':
+        raise ValueError("Unknown time window '{}'".format(mode))
+
+    timestamps = np.asarray(timestamps, dtype='datetime64[ns]')
+    if mode == 'year':
+        return timestamps.astype('datetime64[Y]').astype(np.int64) + 1970
+
+    month = timestamps.astype('datetime64[M]').astype(np.int64) % 12
+    if mode == 'month':
+        return month
+
+    return (month + 1) % 12 // 3
+
+def window_label(key, mode):
+    """
+    Gets the name of a window, used as suffix of the artifacts
+
+    :param key: The window as returned by window_keys
+    :param mode: One of TIME_WINDOWS except 'none'
+    """
+    if mode == 'season':
+        return SEASONS[key]
+    if mode == 'month':
+        return MONTHS[key]
+
+    return str(key)
+
+def split_windows(extracted, mode):
+    """
+    Splits every trajectory where its window changes, so that the simplification keeps the
+    first fix of every window and no simplified segment reaches into a later window. Every
+    piece ends with the first fix of the next one, so the segment between two windows is kept.
+
+    :param extracted: List[Tuple(id, timestamps, coordinates)] - see DataExtractor
+    :param mode: One of TIME_WINDOWS except 'none'
+    :returns: List[Tuple(Tuple(id, piece), timestamps, coordinates)] - the pieces, numbered per individual
+    """
+    pieces = []
+    for individual, timestamps, coordinates in extracted:
+        keys = window_keys(timestamps, mode)
+        borders = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+        starts = np.concatenate(([0], borders))
+        stops = np.append(borders + 1, len(keys))
+
+        for piece, (start, stop) in enumerate(zip(starts.tolist(), stops.tolist())):
+            pieces.append(((individual, piece), timestamps[start:stop], coordinates[start:stop]))
+
+    return pieces
+
+def join_windows(reduced):
+    """
+    Joins the simplified pieces of split_windows to one trajectory per individual again
+
+    :param reduced: Dict[Tuple(id, piece), Tuple(timestamps, points)] - as returned by Reduce with timestamps
+    :returns: Dict[id, Tuple(timestamps, points)]
+    """
+    pieces = {}
+    for (individual, piece), (timestamps, points) in reduced.items():
+        if individual not in pieces:
+            pieces[individual] = []
+
+        pieces[individual].append((piece, timestamps, points))
+
+    res = {}
+    for individual, parts in pieces.items():
+        parts.sort(key=lambda x: x[0])
+
+        # every piece but the last ends with the first fix of the next one
+        res[individual] = (np.concatenate([x[1][:-1] for x in parts[:-1]] + [parts[-1][1]]),
+                           np.concatenate([x[2][:-1] for x in parts[:-1]] + [parts[-1][2]]))
+
+    return res
+
+def trace_windows(individual_and_timed_data, resolution_in_m, mode):
+    """
+    Traces all trajectories at once and splits the cells by time window. Every segment belongs
+    to the window of its start, the (cell, individual) pairs are traced with the window as part
+    of the individual code, so a single traversal serves all windows.
+
+    :param individual_and_timed_data: Dict[id, Tuple(timestamps, points)] - the reduced trajectories
+    :param resolution_in_m: The resolution of the raster in meters
+    :param mode: One of TIME_WINDOWS except 'none'
+    :returns: Dict[str, CellIndex] - the individuals recorded per cell for every window with
+                segments, in the order of the windows
+    """
+    individuals = list(individual_and_timed_data.keys())
+
+    starts = []
+    stops = []
+    codes = []
+    windows = []
+    for code, individual in enumerate(individuals):
+        timestamps, data = individual_and_timed_data[individual]
+        data = np.asarray(data, dtype=np.float64).reshape(-1, 2)
+        if len(data) < 2:
+            continue
+
+        starts.append(data[:-1])
+        stops.append(data[1:])
+        codes.append(np.full(len(data) - 1, code, dtype=np.int64))
+        windows.append(window_keys(timestamps[:-1], mode))
+
+    if len(starts) == 0:
+        return {}
+
+    distinct, windows = np.unique(np.concatenate(windows), return_inverse=True)
+
+    cell_x, cell_y, segment = BatchTraversal(resolution_in_m).trace(np.concatenate(starts), np.concatenate(stops))
+    combined = np.concatenate(codes)[segment] * len(distinct) + windows[segment]
+
+    # sorted by cell and combined code, so the individuals of a window stay sorted within every cell
+    keys, combined = CellIndex.deduplicate(CellIndex.pack(cell_x, cell_y), combined)
+    window = combined % len(distinct)
+    code = combined // len(distinct)
+
+    return {window_label(key, mode): CellIndex(keys[window == w], code[window == w], individuals)
+            for w, key in enumerate(distinct.tolist())}
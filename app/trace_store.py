@@ -0,0 +1,106 @@
+import numpy as np
+
+from app.cell_index import CellIndex
+from app.generate_map import trace_cells
+
+class TraceStore:
+    """
+    Memoizes the traced cells per (individual, resolution), so that a sweep over several
+    grid resolutions traces every segment only once.
+
+    A resolution that is an integer multiple of an already traced one is derived by
+    aggregating the finer cells instead of tracing again, so sweeps should go from the
+    finest to the coarsest resolution. The store assumes that the trajectory of an
+    individual doesn't change during its lifetime.
+    """
+
+    def __init__(self, engine = 'batch', workers = 1) -> None:
+        """
+        Initializes an empty store
+
+        :param engine: The tracing engine, see trace_cells
+        :param workers: The number of processes tracing in parallel, see trace_cells
+        """
+        self.__engine = engine
+        self.__workers = workers
+        # individual -> resolution -> sorted, distinct packed cell keys
+        self.__cells = {}
+        self.__traced = 0
+        self.__derived = 0
+
+    @property
+    def traced(self):
+        """
+        Gets the number of individuals traced so far, over all resolutions
+        """
+        return self.__traced
+
+    @property
+    def derived(self):
+        """
+        Gets the number of individuals derived from a finer resolution so far
+        """
+        return self.__derived
+
+    def resolutions(self, individual):
+        """
+        Gets the resolutions an individual has been traced at
+        """
+        return sorted(self.__cells.get(individual, {}).keys())
+
+    def __derive(self, individual, resolution_in_m):
+        """
+        Aggregates the cells of the coarsest traced resolution that divides resolution_in_m
+
+        :returns: Packed cell keys or None if there is no such resolution
+        """
+        finer = [r for r in self.resolutions(individual) if r < resolution_in_m and resolution_in_m % r == 0]
+        if len(finer) == 0:
+            return None
+
+        source = max(finer)
+        cells = np.floor_divide(CellIndex.unpack(self.__cells[individual][source]), resolution_in_m // source)
+        return np.unique(CellIndex.pack(cells[:, 0], cells[:, 1]))
+
+    def trace(self, individual_and_data, resolution_in_m):
+        """
+        Gets the cells of all individuals at a resolution, tracing only what is not known yet
+
+        :param individual_and_data: A map that contains the trajectory for every individual
+        :param resolution_in_m: The resolution of the raster in meters
+        :returns: CellIndex - the individuals recorded per cell
+        """
+        individuals = list(individual_and_data.keys())
+
+        missing = []
+        for individual in individuals:
+            if individual not in self.__cells:
+                self.__cells[individual] = {}
+            elif resolution_in_m in self.__cells[individual]:
+                continue
+
+            derived = self.__derive(individual, resolution_in_m)
+            if derived is None:
+                missing.append(individual)
+            else:
+                self.__cells[individual][resolution_in_m] = derived
+                self.__derived += 1
+
+        if len(missing) > 0:
+            traced = trace_cells({x: individual_and_data[x] for x in missing}, resolution_in_m, self.__engine,
+                                 self.__workers)
+
+            # the pairs are sorted by cell, a stable sort by code keeps the cells of every individual sorted
+            order = np.argsort(traced.codes, kind='stable')
+            borders = np.searchsorted(traced.codes[order], np.arange(len(missing) + 1))
+            keys = traced.keys[order]
+
+            for code, individual in enumerate(missing):
+                self.__cells[individual][resolution_in_m] = keys[borders[code]:borders[code + 1]]
+            self.__traced += len(missing)
+
+        keys = [np.empty(0, dtype=np.int64)] + [self.__cells[x][resolution_in_m] for x in individuals]
+        codes = [np.empty(0, dtype=np.int32)] + [np.full(len(x), code, dtype=np.int32) for code, x in enumerate(keys[1:])]
+
+        keys, codes = CellIndex.deduplicate(np.concatenate(keys), np.concatenate(codes))
+        return CellIndex(keys, codes, individuals)
@@ -0,0 +1,166 @@
+import numpy as np
+
+from app.sequence import SequenceBuilder
+
+
+class BatchTraversal:
+    """
+    Traces all line segments of all individuals at once.
+
+    This is a vectorized Amanatides-Woo style grid traversal: for every segment the
+    parameters at which it crosses a vertical or horizontal grid line are computed,
+    sorted and accumulated, so that the visited cells of all segments are emitted
+    as flat NumPy arrays instead of walking each cell in Python.
+    """
+
+    def __init__(self, resolution_in_m) -> None:
+        """
+        Inits this instance
+
+        :param resolution_in_m: The square length of a grid cell (bin) in meters
+        """
+        self.__resolution = SequenceBuilder.DEG_TO_M / resolution_in_m
+
+    @staticmethod
+    def convert_to_cell(pts):
+        """
+        Vectorized counterpart of Sequence.convert_to_cell
+
+        :param pts: Array of scaled coordinates
+        """
+        return np.trunc(pts).astype(np.int64) - (pts < 0)
+
+    def cells(self, points):
+        """
+        Gets the grid cell of every point
+
+        :param points: Array (n, 2) - the points
+        :returns: Array (n, 2) of int - the cells
+        """
+        return BatchTraversal.convert_to_cell(np.asarray(points, dtype=np.float64).reshape(-1, 2) * self.__resolution)
+
+    def trace(self, starts, stops):
+        """
+        Traces the line segments from starts to stops and emits all grid cell coordinates
+        each segment is intersecting with
+
+        :param starts: Array (n, 2) - the start points of the segments
+        :param stops: Array (n, 2) - the stop points of the segments
+        :returns: Tuple(cell_x, cell_y, segment) - three arrays of identical length, segment
+                    refers to the row in starts/stops the cell was emitted for
+        """
+        scaled_start = np.asarray(starts, dtype=np.float64).reshape(-1, 2) * self.__resolution
+        scaled_end = np.asarray(stops, dtype=np.float64).reshape(-1, 2) * self.__resolution
+
+        cell_start = BatchTraversal.convert_to_cell(scaled_start)
+        cell_end = BatchTraversal.convert_to_cell(scaled_end)
+
+        distance = np.abs(cell_end - cell_start).sum(axis=1)
+
+        # most segments stay in their cell or move into an adjacent one, these are emitted
+        # directly, only segments crossing several grid lines are traversed
+        adjacent = np.flatnonzero(distance == 1)
+        multi = np.flatnonzero(distance > 1)
+        crossed_x, crossed_y, crossed_segment = BatchTraversal.traverse(scaled_start[multi], scaled_end[multi],
+                                                                        cell_start[multi], cell_end[multi])
+
+        cell_x = np.concatenate((cell_start[:, 0], cell_end[adjacent, 0], crossed_x))
+        cell_y = np.concatenate((cell_start[:, 1], cell_end[adjacent, 1], crossed_y))
+        segment = np.concatenate((np.arange(len(cell_start)), adjacent, multi[crossed_segment]))
+
+        return cell_x, cell_y, segment
+
+    @staticmethod
+    def traverse(scaled_start, scaled_end, cell_start, cell_end):
+        """
+        Walks the segments through the grid, cell by cell
+
+        :param scaled_start: Array (n, 2) - the start points of the segments in grid units
+        :param scaled_end: Array (n, 2) - the stop points of the segments in grid units
+        :param cell_start: Array (n, 2) - the cells of the start points
+        :param cell_end: Array (n, 2) - the cells of the stop points
+        :returns: Tuple(cell_x, cell_y, segment) - every cell entered after the start cell
+        """
+        step = np.sign(cell_end - cell_start)
+        crossings = np.abs(cell_end - cell_start)
+
+        # every crossing of a grid line along one axis moves the segment into the next cell
+        segment_ids = []
+        crossing_t = []
+        crossing_axis = []
+        for axis in range(2):
+            count = crossings[:, axis]
+            total = int(count.sum())
+
+            segment = np.repeat(np.arange(len(count)), count)
+            offsets = np.cumsum(count) - count
+            k = np.arange(total) - np.repeat(offsets, count) + 1
+
+            axis_step = step[segment, axis]
+            boundary = cell_start[segment, axis] + np.where(axis_step > 0, k, 1 - k)
+
+            origin = scaled_start[segment, axis]
+            t = (boundary - origin) / (scaled_end[segment, axis] - origin)
+
+            segment_ids.append(segment)
+            crossing_t.append(t)
+            crossing_axis.append(np.full(total, axis, dtype=np.int8))
+
+        segment = np.concatenate(segment_ids)
+        t = np.concatenate(crossing_t)
+        axis = np.concatenate(crossing_axis)
+
+        order = np.lexsort((axis, t, segment))
+        segment = segment[order]
+        axis = axis[order]
+
+        # accumulate the steps taken along each axis within every segment
+        count = crossings.sum(axis=1)
+        group_start = np.cumsum(count) - count
+
+        cells = []
+        for a in range(2):
+            moves = np.where(axis == a, step[segment, a], 0)
+            summed = np.cumsum(moves)
+            before = np.concatenate(([0], summed))[group_start]
+            cells.append(cell_start[segment, a] + summed - np.repeat(before, count))
+
+        return cells[0], cells[1], segment
+
+    def __call__(self, individual_and_data):
+        """
+        Traces the trajectories of all individuals
+
+        :param individual_and_data: A map that contains the trajectory for every individual
+        :returns: Tuple(cell_x, cell_y, individual, individuals) - the traced (cell, individual)
+                    triples as arrays, individual is the index into the list of individuals. A triple
+                    may still occur multiple times
+        """
+        individuals = list(individual_and_data.keys())
+
+        starts = []
+        stops = []
+        codes = []
+        for code, individual in enumerate(individuals):
+            data = np.asarray(individual_and_data[individual], dtype=np.float64).reshape(-1, 2)
+            if len(data) < 2:
+                continue
+
+            starts.append(data[:-1])
+            stops.append(data[1:])
+            codes.append(np.full(len(data) - 1, code, dtype=np.int64))
+
+        if len(starts) == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, empty, individuals
+
+        cell_x, cell_y, segment = self.trace(np.concatenate(starts), np.concatenate(stops))
+        individual = np.concatenate(codes)[segment]
+
+        # consecutive segments within the same cell emit the same triple, dropping these
+        # repetitions early keeps the later deduplication small
+        repeated = np.zeros(len(cell_x), dtype=bool)
+        repeated[1:] = (cell_x[1:] == cell_x[:-1]) & (cell_y[1:] == cell_y[:-1]) & (individual[1:] == individual[:-1])
+        keep = ~repeated
+
+        return cell_x[keep], cell_y[keep], individual[keep], individuals
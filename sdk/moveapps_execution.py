@@ -1,4 +1,3 @@
-import pandas as pd
 import json
 import os
 import logging
@@ -6,6 +5,8 @@ import pluggy
 from dotenv import load_dotenv
 from dataclasses import dataclass
 
+DEFAULT_ERROR_FILE = 'resources/output/error.txt'
+
 
 @dataclass
 class Environment:
@@ -36,7 +37,7 @@ class MoveAppsExecutor:
         self.env = Environment(
             source_file=os.environ.get('SOURCE_FILE', 'resources/samples/input1.pickle'),
             output_file=os.environ.get('OUTPUT_FILE', 'resources/output/output.pickle'),
-            error_file=os.environ.get('ERROR_FILE', 'resources/output/error.txt'),
+            error_file=os.environ.get('ERROR_FILE', DEFAULT_ERROR_FILE),
             app_configuration=self.__load_config()
         )
 
@@ -49,6 +50,12 @@ class MoveAppsExecutor:
         )
 
     def __load_input(self):
+        # an app may open the input itself, e.g. to stream files that don't fit into memory
+        data = self._pm.hook.load_input(source_file=self.env.source_file)
+        if data is not None:
+            return data
+
+        import pandas as pd
         return pd.read_pickle(self.env.source_file)
 
     @staticmethod
@@ -64,12 +71,19 @@ class MoveAppsExecutor:
         return parsed
 
     def __store_output(self, data):
+        if data is None:
+            logging.info('app returned no output, nothing to store')
+            return
+
         logging.info(f'storing output: {data}')
+        import pandas as pd
         pd.to_pickle(data, self.env.output_file)
 
     def __store_error(self, error: Exception):
-        logging.info(f'storing error to {self.env.error_file}')
-        with open(self.env.error_file, 'w') as error_file:
+        # the environment is not set yet if the configuration could not be parsed
+        path = self.env.error_file if hasattr(self, 'env') else os.environ.get('ERROR_FILE', DEFAULT_ERROR_FILE)
+        logging.info(f'storing error to {path}')
+        with open(path, 'w') as error_file:
             error_file.write(error.__str__())
 
     def __call_app(self, data):
@@ -1,5 +1,8 @@
 import pluggy
-from movingpandas import TrajectoryCollection
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from movingpandas import TrajectoryCollection
 
 HOOK_NAMESPACE = "co-pilot-python"
 hook_spec = pluggy.HookspecMarker(HOOK_NAMESPACE)
@@ -8,11 +11,20 @@ hook_impl = pluggy.HookimplMarker(HOOK_NAMESPACE)
 
 class MoveAppsSpec(object):
     @hook_spec
-    def execute(self, data: TrajectoryCollection, config: dict) -> TrajectoryCollection:
+    def execute(self, data: 'TrajectoryCollection', config: dict) -> 'TrajectoryCollection':
         """Invokes your main business logic
 
         :param data: the input data for this app. It is the output of the predecessor app in a MoveApps workflow.
         :param config: the configuration of your app. Values are set by the MoveApps workflow user.
-        :return: data for any next app in the workflow
+        :return: data for any next app in the workflow, None if there is none to store
+        """
+        pass
+
+    @hook_spec(firstresult=True)
+    def load_input(self, source_file: str):
+        """Opens the input data of this app, e.g. to read it in parts instead of unpickling it at once
+
+        :param source_file: the path of the input data
+        :return: the input data passed to execute, None to unpickle source_file
         """
         pass
@@ -0,0 +1,73 @@
+import unittest
+
+import numpy as np
+
+from app.advisor import ParameterAdvisor, sample_trajectories
+from app.app import App
+from app.reduce import Reduce
+
+
+class ParameterAdvisorTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # random walks of about 500 m per fix
+        rng = np.random.default_rng(5)
+        timestamps = np.arange(2000).astype('datetime64[h]').astype('datetime64[ns]')
+        self.extracted = [(str(i), timestamps, np.array([8.0, 48.0]) + np.cumsum(rng.normal(0, 0.005, size=(2000, 2)), axis=0))
+                          for i in range(6)]
+        self.sut = ParameterAdvisor(self.extracted, Reduce(50), sample_individuals=3, sample_points=3000)
+
+    def test_sample_trajectories(self):
+        # execute
+        actual = sample_trajectories(self.extracted, 3, 3000)
+
+        # verif
+        self.assertListEqual(['0', '2', '5'], [x[0] for x in actual])
+        for individual, timestamps, coordinates in actual:
+            self.assertEqual(1000, len(coordinates))
+            self.assertEqual(1000, len(timestamps))
+        np.testing.assert_array_equal(self.extracted[0][2][500:1500], actual[0][2])
+
+    def test_estimate_scales_with_resolution(self):
+        # execute
+        fine = self.sut.estimate([500])
+        coarse = self.sut.estimate([2000])
+        sweep = self.sut.estimate([2000, 500])
+
+        # verif
+        self.assertListEqual([500, 2000], sweep.resolutions)
+        self.assertGreater(fine.triples, coarse.triples)
+        self.assertGreater(fine.cells, 4 * coarse.cells)
+        self.assertEqual(fine.triples, sweep.triples)
+        self.assertEqual(fine.cells + coarse.cells, sweep.cells)
+        self.assertAlmostEqual(16, fine.raster_cells / coarse.raster_cells, delta=2)
+        self.assertLessEqual(fine.cells, fine.raster_cells)
+        self.assertGreater(fine.points, 0)
+
+    def test_advise_coarsens_to_fit(self):
+        # prepare
+        fine = self.sut.estimate([500])
+        coarse = self.sut.estimate([1000])
+        budget = (fine.seconds + coarse.seconds) / 2
+
+        # execute
+        actual = self.sut.advise([500, 1500], runtime_budget_s=budget, action='coarsen')
+
+        # verif
+        self.assertListEqual([1000, 3000], actual.resolutions)
+        self.assertListEqual([500], self.sut.advise([500], runtime_budget_s=budget, action='log').resolutions)
+
+    def test_advise_enforces_budget(self):
+        with self.assertRaises(ValueError):
+            self.sut.advise([500], runtime_budget_s=1e-9, action='enforce')
+        with self.assertRaises(ValueError):
+            self.sut.advise([500], runtime_budget_s=1e-9, action='coarsen')
+
+        self.assertListEqual([500], self.sut.advise([500], action='enforce').resolutions)
+
+    def test_check_config_rejects_unknown_budget_action(self):
+        config = App.check_config({})
+        self.assertEqual('log', config['budget_action'])
+        self.assertEqual(0, config['runtime_budget_s'])
+        with self.assertRaises(ValueError):
+            App.check_config({'budget_action': 'abort'})
@@ -1,8 +1,11 @@
 import unittest
 import os
+import tempfile
+from unittest import mock
 from tests.config.definitions import ROOT_DIR
 from app.app import App
 from sdk.moveapps_io import MoveAppsIo
+import numpy as np
 import pandas as pd
 import movingpandas as mpd
 
@@ -26,4 +29,76 @@ class MyTestCase(unittest.TestCase):
         actual = self.sut.execute(data=expected, config=config)
 
         # verif
-        self.assertEqual(expected, actual)
\ No newline at end of file
+        self.assertEqual(expected, actual)
+
+    @staticmethod
+    def write_csv(path):
+        track = np.array([8.0, 48.0]) + np.cumsum(np.full((20, 2), 0.01), axis=0)
+        pd.DataFrame({
+            'trackId': ['a'] * 10 + ['b'] * 10,
+            'timestamps': pd.date_range('2020-01-01', periods=20, freq='1h'),
+            'location.long': track[:, 0],
+            'location.lat': track[:, 1]
+        }).to_csv(path, index=False)
+
+    def test_app_returns_nothing_for_streamed_input(self):
+        # prepare
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'link.csv')
+            MyTestCase.write_csv(path)
+            config: dict = {
+                "rdp_resolution": 350,
+                "grid_resolution": 2000,
+                "minimum_individuals_per_cell": 0
+            }
+
+            # execute
+            data = self.sut.load_input(source_file=path)
+            actual = self.sut.execute(data=data, config=config)
+
+        # verif
+        self.assertIsNone(self.sut.load_input(source_file='input1.pickle'))
+        self.assertIsNone(actual)
+
+    def test_reduce_cache_requires_directory(self):
+        # prepare
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'link.csv')
+            MyTestCase.write_csv(path)
+            config: dict = {
+                "rdp_resolution": 350,
+                "grid_resolution": 2000,
+                "minimum_individuals_per_cell": 0,
+                "reduce_cache": True
+            }
+
+            # execute
+            with mock.patch.dict(os.environ):
+                os.environ.pop('REDUCE_CACHE_DIR', None)
+                with self.assertLogs(level='WARNING') as logs:
+                    self.sut.execute(data=self.sut.load_input(source_file=path), config=config)
+
+        # verif
+        self.assertTrue(any('REDUCE_CACHE_DIR' in x for x in logs.output))
+
+    def test_incremental_requires_state_file(self):
+        # prepare
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'link.csv')
+            MyTestCase.write_csv(path)
+            config: dict = {
+                "rdp_resolution": 350,
+                "grid_resolution": 2000,
+                "minimum_individuals_per_cell": 0,
+                "incremental": True
+            }
+
+            # execute
+            with mock.patch.dict(os.environ):
+                os.environ.pop('CORRIDOR_STATE_FILE', None)
+                with self.assertLogs(level='WARNING') as logs:
+                    self.sut.execute(data=self.sut.load_input(source_file=path), config=config)
+
+        # verif
+        self.assertTrue(any('CORRIDOR_STATE_FILE' in x for x in logs.output))
+        self.assertFalse(config['incremental'])
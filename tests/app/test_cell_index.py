@@ -0,0 +1,41 @@
+import unittest
+
+import numpy as np
+
+from app.cell_index import CellIndex
+
+
+class CellIndexTests(unittest.TestCase):
+
+    def test_pack_roundtrip(self):
+        # prepare
+        cells = np.array([[0, 0], [-1, 5], [123456, -654321], [-(1 << 31), (1 << 31) - 1]])
+
+        # execute
+        actual = CellIndex.unpack(CellIndex.pack(cells[:, 0], cells[:, 1]))
+
+        # verif
+        np.testing.assert_array_equal(cells, actual)
+
+    def test_from_triples_counts_distinct_individuals(self):
+        # prepare
+        cell_a = [0, 0, 0, 1, 1, -3]
+        cell_b = [2, 2, 2, 2, 2, 7]
+        codes = [0, 1, 0, 1, 1, 2]
+
+        # execute
+        actual = CellIndex.from_triples(cell_a, cell_b, codes, ['a', 'b', 'c'])
+
+        # verif
+        self.assertEqual(3, len(actual))
+        np.testing.assert_array_equal([[-3, 7], [0, 2], [1, 2]], actual.cells)
+        np.testing.assert_array_equal([1, 2, 1], actual.counts)
+        self.assertDictEqual({(-3, 7): {'c'}, (0, 2): {'a', 'b'}, (1, 2): {'b'}}, actual.to_dict())
+
+    def test_empty_index(self):
+        # execute
+        actual = CellIndex.from_triples([], [], [], [])
+
+        # verif
+        self.assertEqual(0, len(actual))
+        self.assertEqual(0, len(actual.counts))
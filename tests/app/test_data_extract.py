@@ -1,7 +1,9 @@
 import unittest
 import os
 
+import numpy as np
 import pandas as pd
+import geopandas as gpd
 import movingpandas as mpd
 
 from app.app import App
@@ -15,6 +17,23 @@ class DataExtractTests(unittest.TestCase):
         os.environ['APP_ARTIFACTS_DIR'] = os.path.join(ROOT_DIR, 'tests/resources/output')
         self.sut = App(moveapps_io=MoveAppsIo())
 
+    @staticmethod
+    def create_collection(individuals):
+        frames = []
+        for i, individual in enumerate(individuals):
+            ts = pd.date_range('2020-01-01', periods=5, freq='1h', tz='UTC')
+            frames.append(pd.DataFrame({
+                'timestamp': ts,
+                'individual_local_identifier': individual,
+                'x': np.arange(5) + i * 10.0,
+                'y': np.arange(5) * 2.0
+            }))
+
+        df = pd.concat(frames)
+        gdf = gpd.GeoDataFrame(df, geometry=gpd.points_from_xy(df.x, df.y), crs='EPSG:4326')
+        gdf = gdf.set_index(pd.DatetimeIndex(gdf.timestamp).rename('t'))
+        return mpd.TrajectoryCollection(gdf, traj_id_col='individual_local_identifier')
+
     def data_extract_keeps_individuals(self):
         # prepare
         input = pd.read_pickle(os.path.join(ROOT_DIR, 'tests/resources/app/input2.pickle'))
@@ -25,4 +44,30 @@ class DataExtractTests(unittest.TestCase):
         actual = extractor(input)
 
         # verif
-        self.assertListEqual(ids, actual.keys())
\ No newline at end of file
+        self.assertSetEqual(ids, set(x[0] for x in actual))
+
+    def test_data_extract_yields_columns(self):
+        # prepare
+        input = DataExtractTests.create_collection(['a', 'b'])
+
+        # execute
+        actual = list(DataExtractor()(input))
+
+        # verif
+        self.assertListEqual(['a', 'b'], [x[0] for x in actual])
+
+        _, timestamps, coordinates = actual[1]
+        self.assertEqual(np.dtype('datetime64[ns]'), timestamps.dtype)
+        self.assertEqual((5, 2), coordinates.shape)
+        self.assertTrue(coordinates.flags['C_CONTIGUOUS'])
+        np.testing.assert_array_equal([10.0, 0.0], coordinates[0])
+        np.testing.assert_array_equal([14.0, 8.0], coordinates[-1])
+
+    def test_data_extract_rejects_mixed_individuals(self):
+        # prepare
+        input = DataExtractTests.create_collection(['a'])
+        input.trajectories[0].df['individual_local_identifier'] = ['a', 'a', 'b', 'a', 'a']
+
+        # execute / verif
+        with self.assertRaises(ValueError):
+            list(DataExtractor()(input))
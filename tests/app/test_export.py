@@ -0,0 +1,74 @@
+import unittest
+import os
+import tempfile
+import zipfile
+
+import geopandas as gpd
+import shapely
+
+from app.app import App
+from app.export import polygons_to_frame, write_polygons
+
+
+class ExportTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+
+        # the layers are in (lat, lon)
+        self.layers = {
+            0: shapely.box(47.0, 7.0, 47.1, 7.1),
+            1: shapely.box(48.0, 8.0, 48.1, 8.1),
+            2: shapely.MultiPolygon([shapely.box(48.2, 8.2, 48.3, 8.3), shapely.box(48.4, 8.4, 48.5, 8.5)])
+        }
+        self.graduation = [2, 5]
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_polygons_to_frame(self):
+        # execute
+        actual = polygons_to_frame(self.layers, self.graduation, 'EPSG:4326')
+
+        # verif
+        self.assertListEqual([2, 5, 5], actual['recorded individuals'].tolist())
+        self.assertTrue(all(x.geom_type == 'Polygon' for x in actual.geometry))
+        self.assertTrue(shapely.equals(shapely.box(8.0, 48.0, 8.1, 48.1), actual.geometry[0]))
+
+    def test_write_polygons(self):
+        frame = polygons_to_frame(self.layers, self.graduation, 'EPSG:4326')
+
+        for output_format, suffix in (('geopackage', '.gpkg'), ('flatgeobuf', '.fgb'), ('shapefile', '.shp.zip')):
+            # prepare
+            path = os.path.join(self.directory.name, 'corridors' + suffix)
+
+            # execute
+            write_polygons(frame, path, output_format)
+            # a second export replaces the first one
+            write_polygons(frame, path, output_format)
+
+            # verif
+            actual = gpd.read_file(path)
+            self.assertEqual(3, len(actual), output_format)
+            self.assertListEqual([2, 5, 5], sorted(actual.iloc[:, 0].tolist()), output_format)
+            # FlatGeobuf orders the features by its spatial index
+            self.assertTrue(shapely.equals(shapely.union_all(frame.geometry), shapely.union_all(actual.geometry)),
+                            output_format)
+
+        with zipfile.ZipFile(os.path.join(self.directory.name, 'corridors.shp.zip')) as archive:
+            self.assertIn('corridors.shp', archive.namelist())
+
+    def test_write_empty(self):
+        # prepare
+        path = os.path.join(self.directory.name, 'corridors.gpkg')
+
+        # execute
+        write_polygons(polygons_to_frame({}, self.graduation, 'EPSG:4326'), path, 'geopackage')
+
+        # verif
+        self.assertEqual(0, len(gpd.read_file(path)))
+
+    def test_check_config_rejects_unknown_format(self):
+        self.assertEqual('shapefile', App.check_config({})['output_format'])
+        with self.assertRaises(ValueError):
+            App.check_config({'output_format': 'kml'})
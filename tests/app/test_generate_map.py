@@ -0,0 +1,75 @@
+import unittest
+
+import folium
+import shapely
+
+from app.app import App
+from app.generate_map import layers_to_geojson, render_map
+
+
+class RenderTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # two layers in (lat, lon), the first one with a hole and collinear vertices
+        outer = shapely.Polygon([(48.0, 8.0), (48.0, 8.05), (48.0, 8.1), (48.1, 8.1), (48.1, 8.0)],
+                                [[(48.02, 8.02), (48.02, 8.04), (48.04, 8.04), (48.04, 8.02)]])
+        inner = shapely.MultiPolygon([shapely.box(48.2, 8.2, 48.3, 8.3), shapely.box(48.4, 8.4, 48.5, 8.5)])
+        self.layers = {1: outer, 2: inner}
+        self.graduation = [2, 5]
+
+    def test_layers_to_geojson(self):
+        # execute
+        actual = layers_to_geojson(self.layers, self.graduation, 1000)
+
+        # verif
+        self.assertEqual(2, len(actual['features']))
+        self.assertListEqual([2, 5], [x['properties']['recorded individuals'] for x in actual['features']])
+        for feature, (label, expected) in zip(actual['features'], self.layers.items()):
+            geometry = shapely.transform(shapely.geometry.shape(feature['geometry']), lambda x: x[:, ::-1])
+            self.assertEqual(label, feature['properties']['label'])
+            self.assertTrue(shapely.equals(expected, geometry))
+
+        # the collinear vertex is dropped
+        self.assertEqual(10, shapely.get_num_coordinates(shapely.geometry.shape(actual['features'][0]['geometry'])))
+
+    def test_layers_to_geojson_quantizes(self):
+        # prepare
+        layers = {1: shapely.box(48.123456789, 8.123456789, 48.2, 8.2)}
+
+        # execute
+        actual = layers_to_geojson(layers, [2], 1000)
+
+        # verif
+        coordinates = shapely.get_coordinates(shapely.geometry.shape(actual['features'][0]['geometry']))
+        self.assertIn([8.1235, 48.1235], coordinates.tolist())
+
+    def test_layers_to_geojson_simplifies_shared_borders(self):
+        # prepare
+        # two layers that share a staircase border
+        steps = [(48.0 + 0.01 * i, 8.0 + 0.01 * (i + 1)) for i in range(10)]
+        border = [x for step in steps for x in ((step[0], step[1] - 0.01), step)] + [(48.1, 8.1)]
+        lower = shapely.Polygon(border + [(48.1, 8.0)])
+        upper = shapely.Polygon(border[1:] + [(48.1, 8.2), (48.0, 8.2)])
+
+        # execute
+        actual = layers_to_geojson({1: lower, 2: upper}, [2, 5], 100, 2000)
+
+        # verif
+        lower, upper = [shapely.geometry.shape(x['geometry']) for x in actual['features']]
+        self.assertLess(shapely.get_num_coordinates(lower), 10)
+        self.assertAlmostEqual(0, shapely.intersection(lower, upper).area)
+        self.assertTrue(shapely.equals(shapely.union_all([lower, upper]).envelope, shapely.box(8.0, 48.0, 8.2, 48.1)))
+
+    def test_render_map_single_layer(self):
+        # execute
+        actual = render_map(self.layers, self.graduation, (48.0, 8.0), (48.5, 8.5), renderer='geojson')
+
+        # verif
+        children = list(actual._children.values())
+        self.assertEqual(1, sum(isinstance(x, folium.GeoJson) for x in children))
+        self.assertFalse(any(isinstance(x, folium.Polygon) for x in children))
+
+    def test_check_config_rejects_unknown_renderer(self):
+        self.assertEqual('folium', App.check_config({})['map_renderer'])
+        with self.assertRaises(ValueError):
+            App.check_config({'map_renderer': 'svg'})
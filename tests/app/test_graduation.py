@@ -0,0 +1,93 @@
+import unittest
+import itertools
+
+import numpy as np
+
+from app.app import App
+from app.graduation import determine_graduation, count_histogram, MAX_GRADUATION_SIZE
+
+
+class GraduationTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # many cells with few individuals and a single outlier
+        rng = np.random.default_rng(5)
+        self.counts = np.concatenate((rng.integers(1, 8, size=10_000), [500]))
+
+    def squared_deviations(self, values, frequencies, breaks):
+        labels = np.searchsorted(breaks, values, side='right')
+        total = 0.0
+        for label in np.unique(labels):
+            v = values[labels == label]
+            f = frequencies[labels == label]
+            total += np.sum(f * (v - np.average(v, weights=f)) ** 2)
+        return total
+
+    def test_count_histogram(self):
+        values, frequencies = count_histogram([1, 2, 2, 5, 5, 5], 2)
+
+        self.assertListEqual([2, 5], values.tolist())
+        self.assertListEqual([2, 3], frequencies.tolist())
+
+    def test_linear(self):
+        self.assertListEqual([2, 6, 11, 15, 20, 24, 29, 33, 38, 42, 47, 52],
+                             determine_graduation(np.arange(1, 53), 2))
+        self.assertListEqual([3], determine_graduation([1, 1, 2], 3))
+
+    def test_outlier_is_not_squashed(self):
+        # the linear graduation puts every cell but the outlier into the lowest bin
+        linear = determine_graduation(self.counts, 2)
+        self.assertEqual(1, np.sum(np.searchsorted(linear, self.counts, side='right') > 1))
+
+        for mode in ('quantile', 'jenks', 'log'):
+            # execute
+            actual = determine_graduation(self.counts, 2, mode)
+
+            # verif
+            self.assertEqual(2, actual[0], mode)
+            self.assertListEqual(sorted(set(actual)), actual, mode)
+            self.assertLessEqual(len(actual), MAX_GRADUATION_SIZE, mode)
+            self.assertGreaterEqual(np.sum(np.array(actual) < 8), 3, mode)
+
+    def test_quantile_balances_cells(self):
+        # prepare
+        counts = np.repeat(np.arange(2, 12), 100)
+
+        # execute
+        actual = determine_graduation(counts, 2, 'quantile')
+
+        # verif
+        self.assertListEqual(list(range(2, 12)), actual)
+
+    def test_jenks_is_optimal(self):
+        # prepare
+        rng = np.random.default_rng(3)
+        values = np.unique(rng.integers(2, 200, size=14))
+        frequencies = rng.integers(1, 50, size=len(values))
+        counts = np.repeat(values, frequencies)
+
+        # execute
+        actual = determine_graduation(counts, 2, 'jenks')
+
+        # verif
+        k = min(len(values), MAX_GRADUATION_SIZE)
+        expected = min(self.squared_deviations(values, frequencies, [values[0]] + list(x))
+                       for x in itertools.combinations(values[1:], k - 1))
+        self.assertAlmostEqual(expected, self.squared_deviations(values, frequencies, actual))
+
+    def test_jenks_many_distinct_counts(self):
+        # prepare
+        counts = np.random.default_rng(7).integers(2, 5000, size=100_000)
+
+        # execute
+        actual = determine_graduation(counts, 2, 'jenks')
+
+        # verif
+        self.assertEqual(MAX_GRADUATION_SIZE, len(actual))
+        self.assertEqual(int(counts.min()), actual[0])
+        self.assertListEqual(sorted(set(actual)), actual)
+
+    def test_check_config_rejects_unknown_mode(self):
+        self.assertEqual('linear', App.check_config({})['graduation_mode'])
+        with self.assertRaises(ValueError):
+            App.check_config({'graduation_mode': 'equal'})
@@ -0,0 +1,130 @@
+import unittest
+
+import numpy as np
+
+from app.cell_index import CellIndex
+from app.gridmap import GridMap
+
+
+class GridMapTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        rng = np.random.default_rng(5)
+        self.cells = {}
+        for y, x in rng.integers(-20, 20, size=(600, 2)).tolist():
+            self.cells[(y, x)] = set(range(rng.integers(1, 6)))
+
+        self.sut = GridMap(GridMapTests.create_index(self.cells))
+
+    @staticmethod
+    def create_index(cells):
+        triples = [(a, b, i) for (a, b), individuals in cells.items() for i in individuals]
+        a, b, codes = zip(*triples)
+        return CellIndex.from_triples(a, b, codes, range(max(codes) + 1))
+
+    @staticmethod
+    def as_groups(polygons):
+        return sorted((label, tuple(sorted(map(tuple, np.asarray(cells).tolist())))) for label, cells in polygons)
+
+    def test_fill_bins_cells(self):
+        # execute
+        data = self.sut.fill([2, 4])
+
+        # verif
+        self.assertEqual((self.sut.height, self.sut.width), data.shape)
+        lower_y, lower_x = self.sut.lower_left
+        for (y, x), individuals in self.cells.items():
+            self.assertEqual(GridMap.get_bin(len(individuals), [2, 4]), data[y - lower_y, x - lower_x])
+
+        self.assertEqual(self.sut.width * self.sut.height - len(self.cells), np.count_nonzero(data == -1))
+
+    def test_generate_polygons_matches_reference(self):
+        # prepare
+        data = self.sut.fill([2, 3, 4])
+
+        # execute
+        expected = GridMapTests.as_groups(self.sut.generate_polygons_reference(data))
+        actual = GridMapTests.as_groups(self.sut.generate_polygons(data))
+
+        # verif
+        self.assertListEqual(expected, actual)
+
+    def test_generate_polygons_joins_diagonal_neighbours(self):
+        # prepare
+        sut = GridMap(GridMapTests.create_index({(0, 0): {1}, (1, 1): {1}, (3, 3): {1}}))
+
+        # execute
+        actual = GridMapTests.as_groups(sut.generate_polygons(sut.fill([1])))
+
+        # verif
+        self.assertListEqual([(1, ((0, 0), (1, 1))), (1, ((3, 3),))], actual)
+
+    def test_sparse_backend_matches_dense(self):
+        # prepare
+        sparse = GridMap(GridMapTests.create_index(self.cells), backend='sparse')
+        dense = GridMap(GridMapTests.create_index(self.cells), backend='dense')
+
+        # execute
+        expected = GridMapTests.as_groups(dense.generate_polygons(dense.fill([2, 3, 4])))
+        actual = GridMapTests.as_groups(sparse.generate_polygons(sparse.fill([2, 3, 4])))
+
+        # verif
+        self.assertListEqual(expected, actual)
+        np.testing.assert_array_equal(dense.fill([2, 3, 4]), sparse.fill([2, 3, 4]).to_dense())
+
+    def test_auto_backend_uses_occupancy(self):
+        # prepare
+        corridor = {(i, i): {1} for i in range(5000)}
+
+        # execute / verif
+        self.assertEqual('dense', self.sut.backend)
+        self.assertEqual('sparse', GridMap(GridMapTests.create_index(corridor)).backend)
+
+    def test_tiled_backend_matches_dense(self):
+        # prepare
+        tiled = GridMap(GridMapTests.create_index(self.cells), backend='tiled')
+        dense = GridMap(GridMapTests.create_index(self.cells), backend='dense')
+        expected = GridMapTests.as_groups(dense.generate_polygons(dense.fill([2, 3, 4])))
+
+        # execute
+        actual = [GridMapTests.as_groups(tiled.generate_polygons_tiled(tiled.fill([2, 3, 4]), tile_size=x)) for x in [1, 7, 64]]
+
+        # verif
+        for groups in actual:
+            self.assertListEqual(expected, groups)
+
+    def test_tiled_backend_in_parallel(self):
+        # prepare
+        sut = GridMap(GridMapTests.create_index(self.cells), backend='tiled', workers=2)
+        data = sut.fill([2, 3])
+
+        # execute
+        actual = GridMapTests.as_groups(sut.generate_polygons_tiled(data, tile_size=8))
+
+        # verif
+        self.assertListEqual(GridMapTests.as_groups(sut.generate_polygons_sparse(data)), actual)
+
+    def test_auto_backend_tiles_large_extents(self):
+        # prepare
+        extent = {(0, 0): {1}, (10000, 10000): {1}}
+
+        # execute
+        sut = GridMap(GridMapTests.create_index(extent))
+
+        # verif
+        self.assertEqual('tiled', sut.backend)
+        self.assertEqual(2, len(list(sut.generate_polygons(sut.fill([1])))))
+
+    def test_tiled_backend_labels_sparse_tiles(self):
+        # prepare
+        corridor = {(i, i + offset): {1, 2} if offset == 0 else {1} for i in range(300) for offset in (0, 40)}
+        tiled = GridMap(GridMapTests.create_index(corridor), backend='tiled')
+        sparse = GridMap(GridMapTests.create_index(corridor), backend='sparse')
+
+        # execute
+        actual = GridMapTests.as_groups(tiled.generate_polygons_tiled(tiled.fill([1, 2]), tile_size=128))
+
+        # verif
+        expected = GridMapTests.as_groups(sparse.generate_polygons(sparse.fill([1, 2])))
+        self.assertListEqual(expected, actual)
+        self.assertEqual(2, len(actual))
@@ -0,0 +1,123 @@
+import unittest
+import os
+import tempfile
+
+import numpy as np
+import shapely
+
+from app.generate_map import trace_cells, determine_graduation
+from app.gridmap import GridMap
+from app.incremental import CorridorState, update_index, outline_tiles, update_tiles, merge_tiles, changed_cells
+from app.polygonize import polygonize
+from app.reduce import Reduce
+
+
+class IncrementalTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+
+        rng = np.random.default_rng(21)
+        timestamps = np.arange(400).astype('datetime64[h]').astype('datetime64[ns]')
+        self.data = [
+            ('a', timestamps, np.array([8.0, 48.0]) + np.cumsum(rng.normal(0, 0.01, size=(400, 2)), axis=0)),
+            (7, timestamps[:300], np.array([8.1, 48.1]) + np.cumsum(rng.normal(0, 0.01, size=(300, 2)), axis=0))
+        ]
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def until(self, timestamp):
+        return [(k, t[t <= timestamp], c[t <= timestamp]) for k, t, c in self.data]
+
+    def test_update_matches_full_history(self):
+        # prepare
+        reduce = Reduce(0)
+        expected = trace_cells({k: c[:, ::-1] for k, _, c in self.data}, 1000)
+        first, last_timestamps, last_positions = update_index(self.until(self.data[0][1][150]), reduce, 1000)
+        state = CorridorState({}, first, last_timestamps, last_positions)
+
+        # execute
+        actual, last_timestamps, _ = update_index(self.data, reduce, 1000, state)
+
+        # verif
+        self.assertDictEqual(expected.to_dict(), actual.to_dict())
+        self.assertEqual(self.data[0][1][-1], last_timestamps['a'])
+        self.assertEqual(self.data[1][1][-1], last_timestamps[7])
+
+    def test_state_roundtrip(self):
+        # prepare
+        cell_index, last_timestamps, last_positions = update_index(self.data, Reduce(100), 1000)
+        graduation = determine_graduation(cell_index.counts, 1)
+        tiles = outline_tiles(cell_index, graduation)
+        path = os.path.join(self.directory.name, 'state.npz')
+
+        # execute
+        CorridorState({'grid_resolution': 1000}, cell_index, last_timestamps, last_positions, graduation, tiles).save(path)
+        actual = CorridorState.load(path)
+
+        # verif
+        self.assertTrue(actual.matches({'grid_resolution': 1000}))
+        self.assertFalse(actual.matches({'grid_resolution': 2000}))
+        self.assertListEqual(['a', 7], actual.cell_index.individuals)
+        np.testing.assert_array_equal(cell_index.keys, actual.cell_index.keys)
+        np.testing.assert_array_equal(cell_index.codes, actual.cell_index.codes)
+        self.assertEqual(last_timestamps[7], actual.last_timestamps[7])
+        np.testing.assert_array_equal(last_positions['a'], actual.last_positions['a'])
+        self.assertListEqual(graduation, actual.graduation)
+        self.assertSetEqual(set(tiles.keys()), set(actual.tiles.keys()))
+        for key, geometry in tiles.items():
+            self.assertTrue(shapely.equals(geometry, actual.tiles[key]))
+
+    def test_load_missing_state(self):
+        self.assertIsNone(CorridorState.load(os.path.join(self.directory.name, 'missing.npz')))
+
+    def test_merged_tiles_match_outline(self):
+        # prepare
+        cell_index = trace_cells({k: c[:, ::-1] for k, _, c in self.data}, 100)
+        graduation = determine_graduation(cell_index.counts, 1)
+        grid = GridMap(cell_index)
+        expected = polygonize(grid, grid.fill(graduation), 'outline')
+
+        # execute
+        actual = merge_tiles(outline_tiles(cell_index, graduation))
+
+        # verif
+        self.assertListEqual(sorted(expected.keys()), sorted(actual.keys()))
+        for label, geometry in expected.items():
+            self.assertTrue(shapely.equals(geometry, actual[label]))
+
+    def test_update_tiles_traces_changed_tiles(self):
+        # prepare
+        reduce = Reduce(0)
+        first, last_timestamps, last_positions = update_index(self.until(self.data[0][1][350]), reduce, 100)
+        graduation = determine_graduation(first.counts, 1)
+        state = CorridorState({}, first, last_timestamps, last_positions, graduation, outline_tiles(first, graduation))
+        updated, _, _ = update_index(self.data, reduce, 100, state)
+
+        # execute
+        tiles, traced = update_tiles(state, updated, graduation)
+
+        # verif
+        self.assertGreater(len(changed_cells(first, updated)), 0)
+        self.assertLess(traced, len(set(x[0] for x in tiles.keys())))
+        expected = merge_tiles(outline_tiles(updated, graduation))
+        actual = merge_tiles(tiles)
+        for label, geometry in expected.items():
+            self.assertTrue(shapely.equals(geometry, actual[label]))
+
+    def test_update_tiles_retraces_state_without_tiles(self):
+        # prepare
+        reduce = Reduce(0)
+        first, last_timestamps, last_positions = update_index(self.until(self.data[0][1][350]), reduce, 100)
+        graduation = determine_graduation(first.counts, 1)
+        # e.g. stored by a convex_hull run
+        state = CorridorState({}, first, last_timestamps, last_positions, graduation, {})
+        updated, _, _ = update_index(self.data, reduce, 100, state)
+
+        # execute
+        tiles, traced = update_tiles(state, updated, graduation)
+
+        # verif
+        self.assertIsNone(traced)
+        self.assertSetEqual(set(outline_tiles(updated, graduation).keys()), set(tiles.keys()))
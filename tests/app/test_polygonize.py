@@ -0,0 +1,106 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+import shapely
+
+from app.cell_index import CellIndex
+from app.gridmap import GridMap
+from app.polygonize import outline, convex_hull, polygonize, subtract_higher_layers
+
+
+class PolygonizeTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # a ring of 8 cells around (1, 1)
+        self.ring = np.array([[0, 0], [0, 1], [0, 2], [1, 0], [1, 2], [2, 0], [2, 1], [2, 2]])
+
+    def test_outline_is_exact(self):
+        # execute
+        actual = outline(self.ring)
+
+        # verif
+        self.assertEqual('Polygon', actual.geom_type)
+        self.assertEqual(8, actual.area)
+        self.assertEqual(1, len(actual.interiors))
+
+    def test_convex_hull_covers_corners(self):
+        # execute
+        actual = convex_hull(np.array([[0, 0], [2, 2]]))
+
+        # verif
+        self.assertEqual(9 - 2 - 2, actual.area)
+
+    def test_polygonize_per_layer(self):
+        # prepare
+        # the ring is recorded by one individual, (1, 1) and (5, 5) by two
+        cells = np.concatenate((self.ring, [[1, 1], [5, 5], [1, 1], [5, 5]]))
+        codes = [0] * len(self.ring) + [0, 0, 1, 1]
+        index = CellIndex.from_triples(cells[:, 0], cells[:, 1], codes, [0, 1])
+        grid = GridMap(index)
+        data = grid.fill([1, 2])
+
+        # execute
+        outlines = polygonize(grid, data, 'outline')
+        hulls = polygonize(grid, data, 'convex_hull')
+
+        # verif
+        self.assertListEqual([1, 2], sorted(outlines.keys()))
+        self.assertEqual(8, outlines[1].area)
+        self.assertEqual(2, outlines[2].area)
+        self.assertEqual(9, hulls[1].area)
+        self.assertEqual(2, hulls[2].area)
+
+    def test_polygonize_tiled_outline_matches_sparse(self):
+        # prepare
+        # connected cells crossing several tile borders, with more individuals in the middle
+        rng = np.random.default_rng(7)
+        cells = np.unique(rng.integers(-16, 32, size=(1500, 2)), axis=0)
+        codes = [0] * len(cells)
+        middle = cells[np.abs(cells).max(axis=1) < 8]
+        index = CellIndex.from_triples(np.concatenate((cells[:, 0], middle[:, 0])), np.concatenate((cells[:, 1], middle[:, 1])),
+                                       codes + [1] * len(middle), [0, 1])
+
+        expected_grid = GridMap(index, backend='sparse')
+        actual_grid = GridMap(index, backend='tiled', workers=2)
+
+        # execute
+        expected = polygonize(expected_grid, expected_grid.fill([1, 2]))
+        with mock.patch.object(GridMap, 'TILE_SIZE', 16):
+            actual = polygonize(actual_grid, actual_grid.fill([1, 2]))
+
+        # verif
+        self.assertListEqual(list(expected.keys()), list(actual.keys()))
+        for label in expected.keys():
+            self.assertTrue(shapely.equals(expected[label], actual[label]))
+
+    def test_polygonize_rejects_unknown_mode(self):
+        # prepare
+        grid = GridMap(CellIndex.from_triples([0], [0], [0], [0]))
+
+        # execute / verif
+        with self.assertRaises(ValueError):
+            polygonize(grid, grid.fill([1]), 'unknown')
+
+    def test_subtract_higher_layers_matches_pairwise_difference(self):
+        # prepare
+        rng = np.random.default_rng(9)
+        geometries = {}
+        for label in range(1, 6):
+            hulls = [convex_hull(rng.integers(0, 40, size=(5, 2))) for _ in range(8)]
+            geometries[label] = shapely.union_all(hulls)
+
+        expected = dict(geometries)
+        keys = sorted(expected.keys())
+        for i in range(1, len(keys) + 1):
+            for j in range(0, len(keys) - i):
+                expected[keys[j]] = expected[keys[j]].difference(expected[keys[-i]])
+
+        # execute
+        actual = subtract_higher_layers(geometries)
+
+        # verif
+        self.assertListEqual(keys, list(actual.keys()))
+        for label in keys:
+            self.assertAlmostEqual(expected[label].area, actual[label].area)
+            self.assertAlmostEqual(0, expected[label].symmetric_difference(actual[label]).area)
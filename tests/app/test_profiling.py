@@ -0,0 +1,50 @@
+import json
+import os
+import unittest
+
+from app.profiling import StageProfiler
+from tests.config.definitions import ROOT_DIR
+
+
+class StageProfilerTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.sut = StageProfiler()
+
+    def test_stage_records_counts_and_time(self):
+        # execute
+        with self.sut.stage('trace', segments=3) as record:
+            record['cells'] = 7
+
+        # verif
+        self.assertEqual(1, len(self.sut.stages))
+        actual = self.sut.stages[0]
+        self.assertEqual('trace', actual['stage'])
+        self.assertEqual(3, actual['segments'])
+        self.assertEqual(7, actual['cells'])
+        self.assertGreaterEqual(actual['wall_time_s'], 0)
+        self.assertIn('peak_rss_mb', actual)
+
+    def test_stage_is_recorded_on_error(self):
+        # execute
+        with self.assertRaises(ValueError):
+            with self.sut.stage('fill'):
+                raise ValueError()
+
+        # verif
+        self.assertEqual('fill', self.sut.stages[0]['stage'])
+
+    def test_write_json(self):
+        # prepare
+        path = os.path.join(ROOT_DIR, 'tests/resources/output/profiling.json')
+        with self.sut.stage('extract', points=10):
+            pass
+
+        # execute
+        self.sut.write(path)
+
+        # verif
+        with open(path) as f:
+            actual = json.load(f)
+
+        self.assertEqual(10, actual['stages'][0]['points'])
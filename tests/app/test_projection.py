@@ -0,0 +1,64 @@
+import unittest
+
+import numpy as np
+import shapely
+from pyproj import Geod
+
+from app.app import App
+from app.generate_map import trace_cells, build_map
+from app.projection import GridProjection
+
+
+class GridProjectionTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # an east-west line of 100 km at 70 degrees north
+        lon, lat, _ = Geod(ellps='WGS84').fwd(20.0, 70.0, 90, 100_000)
+        self.line = np.array([[70.0, 20.0], [lat, lon]])
+
+    def test_forward_inverse_roundtrip(self):
+        # prepare
+        rng = np.random.default_rng(1)
+        points = np.stack((rng.uniform(60, 80, 100), rng.uniform(0, 40, 100)), axis=1)
+        sut = GridProjection.for_points(points)
+
+        # execute
+        actual = sut.inverse(sut.forward(points))
+
+        # verif
+        np.testing.assert_array_almost_equal(points, actual, decimal=9)
+
+    def test_for_points_chooses_utm_zone(self):
+        self.assertEqual('EPSG:32632', GridProjection.for_points([[48.2, 8.4]], 'utm').crs)
+        self.assertEqual('EPSG:32719', GridProjection.for_points([[-33.4, -70.6]], 'utm').crs)
+        self.assertIsNone(GridProjection.for_points([[48.2, 8.4]], 'none'))
+
+    def test_projected_cells_match_resolution(self):
+        # prepare
+        sut = GridProjection.for_points(self.line)
+
+        # execute
+        projected = trace_cells({'a': sut.forward(self.line)}, 1000)
+        unprojected = trace_cells({'a': self.line}, 1000)
+
+        # verif
+        self.assertAlmostEqual(100, len(projected), delta=5)
+        self.assertGreater(len(unprojected), 2.5 * len(projected))
+
+    def test_build_map_projects_back(self):
+        # prepare
+        sut = GridProjection.for_points(self.line, 'utm')
+        cell_index = trace_cells({'a': sut.forward(self.line), 'b': sut.forward(self.line + 0.001)}, 1000)
+
+        # execute
+        _, polygons, _ = build_map(cell_index, 1000, 1, projection=sut)
+
+        # verif
+        union = shapely.union_all(list(polygons.values()))
+        self.assertTrue(union.buffer(1e-9).contains(shapely.multipoints(self.line)))
+        self.assertLess(union.area, 0.5)
+
+    def test_check_config_rejects_unknown_projection(self):
+        self.assertEqual('none', App.check_config({})['grid_projection'])
+        with self.assertRaises(ValueError):
+            App.check_config({'grid_projection': 'mercator'})
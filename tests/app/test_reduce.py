@@ -1,6 +1,7 @@
 import unittest
 import os
 
+import numpy as np
 import pandas as pd
 
 from app.app import App
@@ -23,8 +24,51 @@ class DataExtractTests(unittest.TestCase):
         actual = extractor(input)
 
         # verif
-        pts = min(actual, key=lambda x: len(x[1]))
+        pts = min(actual, key=lambda x: len(x[2]))
         red = Reduce()
-        reduced = red(('id', pts))
+        reduced = red([pts])
 
-        self.assertGreater(len(pts[1]), len(reduced[1]))        
\ No newline at end of file
+        self.assertGreater(len(pts[2]), len(reduced[pts[0]]))
+
+
+class ReduceTests(unittest.TestCase):
+
+    @staticmethod
+    def create_data(count):
+        rng = np.random.default_rng(3)
+        timestamps = np.arange(400).astype('datetime64[h]').astype('datetime64[ns]')
+        return [(i, timestamps, 8 + np.cumsum(rng.normal(0, 0.01, size=(400, 2)), axis=0)) for i in range(count)]
+
+    def test_reduce_removes_points(self):
+        # prepare
+        data = ReduceTests.create_data(1)
+
+        # execute
+        actual = Reduce(350)(data)
+
+        # verif
+        self.assertGreater(len(data[0][2]), len(actual[0]))
+        np.testing.assert_array_equal(data[0][2][0, ::-1], actual[0][0])
+
+    def test_parallel_reduce_matches_serial(self):
+        # prepare
+        data = ReduceTests.create_data(6)
+
+        # execute
+        expected = Reduce(350, workers=1)(data)
+        actual = Reduce(350, workers=2)(data)
+
+        # verif
+        self.assertListEqual(list(expected.keys()), list(actual.keys()))
+        for key in expected.keys():
+            np.testing.assert_array_equal(expected[key], actual[key])
+
+    def test_chunk_groups_small_trajectories(self):
+        # prepare
+        items = [(i, np.zeros((n, 2))) for i, n in enumerate([5, 5, 20, 3, 1])]
+
+        # execute
+        chunks = Reduce.chunk(items, 10)
+
+        # verif
+        self.assertListEqual([[0, 1], [2], [3, 4]], [[key for key, _ in chunk] for chunk in chunks])
@@ -0,0 +1,90 @@
+import unittest
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.reduce import Reduce
+from app.reduce_cache import ReduceCache
+
+
+class ReduceCacheTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    @staticmethod
+    def create_data(count):
+        rng = np.random.default_rng(5)
+        timestamps = np.arange(300).astype('datetime64[h]').astype('datetime64[ns]')
+        return [(i, timestamps, 8 + np.cumsum(rng.normal(0, 0.01, size=(300, 2)), axis=0)) for i in range(count)]
+
+    def test_key_depends_on_data_epsilon_and_simplifier(self):
+        # prepare
+        data = np.arange(10, dtype=np.float64).reshape(5, 2)
+        other = data.copy()
+        other[2, 1] += 1e-9
+
+        # execute
+        key = ReduceCache.key(data, 0.1, 'douglas_peucker')
+
+        # verif
+        self.assertEqual(key, ReduceCache.key(data.copy(), 0.1, 'douglas_peucker'))
+        self.assertNotEqual(key, ReduceCache.key(other, 0.1, 'douglas_peucker'))
+        self.assertNotEqual(key, ReduceCache.key(data, 0.2, 'douglas_peucker'))
+        self.assertNotEqual(key, ReduceCache.key(data, 0.1, 'rdp'))
+
+    def test_get_returns_stored_indices(self):
+        # prepare
+        sut = ReduceCache(self.directory.name)
+
+        # execute
+        missing = sut.get('abc')
+        sut.put('abc', np.array([0, 4, 9]))
+        actual = sut.get('abc')
+
+        # verif
+        self.assertIsNone(missing)
+        np.testing.assert_array_equal([0, 4, 9], actual)
+        self.assertEqual(1, sut.hits)
+        self.assertEqual(1, sut.misses)
+
+    def test_evict_removes_least_recently_used(self):
+        # prepare
+        sut = ReduceCache(self.directory.name, max_bytes=1)
+        indices = np.arange(100)
+        for key in ['a', 'b', 'c']:
+            sut.put(key, indices)
+        entry_size = os.path.getsize(os.path.join(self.directory.name, 'a.npy'))
+
+        past = time.time() - 100
+        for i, key in enumerate(['b', 'a', 'c']):
+            os.utime(os.path.join(self.directory.name, key + '.npy'), (past + i, past + i))
+        sut.get('b')
+
+        # execute
+        ReduceCache(self.directory.name, max_bytes=2 * entry_size).evict()
+
+        # verif
+        self.assertListEqual(['b.npy', 'c.npy'], sorted(os.listdir(self.directory.name)))
+
+    def test_reduce_uses_cache(self):
+        # prepare
+        data = self.create_data(4)
+        expected = Reduce(300)(data)
+        cache = ReduceCache(self.directory.name)
+        Reduce(300, cache=cache)(data)
+
+        # execute
+        cache = ReduceCache(self.directory.name)
+        actual = Reduce(300, cache=cache)(data)
+
+        # verif
+        self.assertEqual(4, cache.hits)
+        self.assertEqual(0, cache.misses)
+        for key in expected:
+            np.testing.assert_array_equal(expected[key], actual[key])
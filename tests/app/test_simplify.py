@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+from rdp import rdp
+
+from app.app import App
+from app.simplify import douglas_peucker, radial_distance, visvalingam_whyatt, SIMPLIFIERS
+
+
+class SimplifyTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        rng = np.random.default_rng(11)
+        self.points = 48 + np.cumsum(rng.normal(0, 0.01, size=(2000, 2)), axis=0)
+
+    def test_douglas_peucker_matches_rdp_package(self):
+        for epsilon in [0.001, 0.01, 0.05]:
+            # execute
+            actual = self.points[douglas_peucker(self.points, epsilon)]
+
+            # verif
+            np.testing.assert_array_equal(rdp(self.points, epsilon), actual)
+
+    def test_radial_distance_keeps_spacing(self):
+        # execute
+        actual = radial_distance(self.points, 0.02)
+
+        # verif
+        self.assertEqual(0, actual[0])
+        self.assertEqual(len(self.points) - 1, actual[-1])
+
+        kept = self.points[actual[:-1]]
+        self.assertTrue(np.all(np.hypot(*np.diff(kept, axis=0).T) >= 0.02))
+
+    def test_visvalingam_whyatt_removes_collinear_points(self):
+        # prepare
+        line = np.stack((np.linspace(0, 1, 50), np.linspace(0, 2, 50)), axis=1)
+
+        # execute
+        actual = visvalingam_whyatt(line, 1e-9)
+
+        # verif
+        np.testing.assert_array_equal([0, 49], actual)
+
+    def test_all_simplifiers_keep_endpoints(self):
+        for name, simplify in SIMPLIFIERS.items():
+            # execute
+            actual = simplify(self.points, 0.01)
+
+            # verif
+            self.assertEqual(0, actual[0], name)
+            self.assertEqual(len(self.points) - 1, actual[-1], name)
+            self.assertTrue(np.all(np.diff(actual) > 0), name)
+
+    def test_check_config_rejects_unknown_simplifier(self):
+        # execute / verif
+        self.assertEqual('douglas_peucker', App.check_config({})['simplifier'])
+        with self.assertRaises(ValueError):
+            App.check_config({'simplifier': 'unknown'})
@@ -0,0 +1,151 @@
+import unittest
+import os
+import tempfile
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from app.cell_index import CellIndex, CellIndexBuilder
+from app.generate_map import trace_cells
+from app.reduce import Reduce
+from app.streaming import CsvTrajectorySource, ParquetTrajectorySource, open_source, trace_stream
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+class StreamingTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'link.csv')
+
+        rng = np.random.default_rng(3)
+        self.tracks = {
+            'a': np.array([8.0, 48.0]) + np.cumsum(rng.normal(0, 0.01, size=(120, 2)), axis=0),
+            'b': np.array([8.1, 48.1]) + np.cumsum(rng.normal(0, 0.01, size=(80, 2)), axis=0),
+            'c': np.array([[8.2, 48.2]])
+        }
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def write_csv(self, rows):
+        frames = []
+        for individual, start, stop in rows:
+            track = self.tracks[individual][start:stop]
+            frames.append(pd.DataFrame({
+                'trackId': individual,
+                'timestamps': pd.date_range('2020-01-01', periods=len(self.tracks[individual]), freq='1h')[start:stop],
+                'location.long': track[:, 0],
+                'location.lat': track[:, 1]
+            }))
+
+        pd.concat(frames).to_csv(self.path, index=False)
+
+    def test_csv_source_groups_rows_across_chunks(self):
+        # prepare
+        self.write_csv([('a', 0, 120), ('b', 0, 80), ('c', 0, 1)])
+        sut = CsvTrajectorySource(self.path, chunk_rows=7)
+
+        # execute
+        actual = list(sut)
+
+        # verif
+        self.assertListEqual(['a', 'b', 'c'], [x[0] for x in actual])
+        for individual, timestamps, coordinates in actual:
+            np.testing.assert_array_almost_equal(self.tracks[individual], coordinates)
+            self.assertEqual(np.dtype('datetime64[ns]'), timestamps.dtype)
+        self.assertEqual('EPSG:4326', sut.crs)
+
+    def test_csv_source_reads_meta(self):
+        # prepare
+        self.write_csv([('c', 0, 1)])
+        pd.DataFrame({'crs': ['EPSG:3035'], 'tzone': ['Europe/Berlin']}).to_csv(
+            os.path.join(self.directory.name, 'meta.csv'), index=False)
+
+        # execute
+        sut = open_source(self.path)
+        _, timestamps, _ = next(iter(sut))
+
+        # verif
+        self.assertEqual('EPSG:3035', sut.crs)
+        self.assertEqual(np.datetime64('2019-12-31T23:00:00'), timestamps[0])
+
+    @unittest.skipIf(pyarrow is None, 'requires pyarrow')
+    def test_parquet_source_reads_geometry_and_columns(self):
+        # prepare
+        import geopandas as gpd
+
+        path = os.path.join(self.directory.name, 'link.parquet')
+        frames = [gpd.GeoDataFrame({
+            'individual_local_identifier': individual,
+            'timestamp': pd.date_range('2020-01-01', periods=len(track), freq='1h', tz='UTC'),
+            'x': track[:, 0],
+            'y': track[:, 1]
+        }, geometry=gpd.points_from_xy(track[:, 0], track[:, 1]), crs='EPSG:4326') for individual, track in self.tracks.items()]
+        pd.concat(frames).to_parquet(path)
+
+        # execute
+        from_geometry = list(ParquetTrajectorySource(path, chunk_rows=11))
+        from_columns = list(ParquetTrajectorySource(path, x_column='x', y_column='y', chunk_rows=11))
+
+        # verif
+        for actual in (from_geometry, from_columns):
+            self.assertListEqual(['a', 'b', 'c'], [x[0] for x in actual])
+            for individual, timestamps, coordinates in actual:
+                np.testing.assert_array_almost_equal(self.tracks[individual], coordinates)
+                self.assertEqual(np.datetime64('2020-01-01T00:00:00'), timestamps[0])
+        self.assertEqual('EPSG:4326', ParquetTrajectorySource(path).crs)
+
+    def test_open_source_ignores_pickles(self):
+        self.assertIsNone(open_source('input1.pickle'))
+
+    def test_trace_stream_matches_trace_cells(self):
+        # prepare
+        self.write_csv([('a', 0, 120), ('b', 0, 80), ('c', 0, 1)])
+        reduce = Reduce(100)
+        extracted = [(k, None, v) for k, v in self.tracks.items()]
+        expected = trace_cells(reduce(extracted), 500)
+
+        # execute
+        record = {}
+        actual = trace_stream(CsvTrajectorySource(self.path, chunk_rows=13), reduce, 500, record)
+
+        # verif
+        self.assertDictEqual(expected.to_dict(), actual.to_dict())
+        self.assertEqual(3, record['individuals'])
+        self.assertEqual(201, record['points'])
+
+    def test_trace_stream_joins_interleaved_individuals(self):
+        # prepare
+        self.write_csv([('a', 0, 60), ('b', 0, 80), ('a', 60, 120)])
+        reduce = Reduce(0)
+        expected = trace_cells({k: v[:, ::-1] for k, v in self.tracks.items() if k != 'c'}, 500)
+
+        # execute
+        actual = trace_stream(CsvTrajectorySource(self.path, chunk_rows=50), reduce, 500)
+
+        # verif
+        self.assertDictEqual(expected.to_dict(), actual.to_dict())
+
+    def test_builder_compacts_buffer(self):
+        # prepare
+        sut = CellIndexBuilder()
+
+        # execute
+        with mock.patch.object(CellIndexBuilder, 'COMPACT_PAIRS', 4):
+            sut.add([0, 0, 1], [0, 0, 1], 'a')
+            sut.add([0, 1, 1], [0, 1, 1], 'b')
+            sut.add([2], [2], 'a')
+            sut.add([], [], 'c')
+        actual = sut.build()
+
+        # verif
+        expected = CellIndex.from_triples([0, 0, 1, 0, 1, 1, 2], [0, 0, 1, 0, 1, 1, 2], [0, 0, 0, 1, 1, 1, 0], ['a', 'b', 'c'])
+        np.testing.assert_array_equal(expected.keys, actual.keys)
+        np.testing.assert_array_equal(expected.codes, actual.codes)
+        self.assertListEqual(['a', 'b', 'c'], actual.individuals)
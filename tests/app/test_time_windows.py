@@ -0,0 +1,98 @@
+import unittest
+
+import numpy as np
+
+from app.app import App
+from app.generate_map import trace_cells
+from app.reduce import Reduce
+from app.time_windows import window_keys, split_windows, join_windows, trace_windows
+
+
+class TimeWindowTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        rng = np.random.default_rng(13)
+        # 'a' moves in January and in July, 'b' only in July
+        self.timestamps = {
+            'a': np.concatenate((np.datetime64('2021-01-01') + np.arange(100) * np.timedelta64(6, 'h'),
+                                 np.datetime64('2021-07-01') + np.arange(100) * np.timedelta64(6, 'h'))),
+            'b': np.datetime64('2022-07-01') + np.arange(150) * np.timedelta64(6, 'h')
+        }
+        self.points = {
+            'a': 48 + np.cumsum(rng.normal(0, 0.02, size=(200, 2)), axis=0),
+            'b': 48 + np.cumsum(rng.normal(0, 0.02, size=(150, 2)), axis=0)
+        }
+
+    def test_window_keys(self):
+        timestamps = np.array(['2020-12-31T23:00', '2021-02-28', '2021-03-01', '2021-11-30'], dtype='datetime64[ns]')
+
+        self.assertListEqual([2020, 2021, 2021, 2021], window_keys(timestamps, 'year').tolist())
+        self.assertListEqual([11, 1, 2, 10], window_keys(timestamps, 'month').tolist())
+        self.assertListEqual([0, 0, 1, 3], window_keys(timestamps, 'season').tolist())
+
+    def test_trace_windows(self):
+        # execute
+        actual = trace_windows({x: (self.timestamps[x], self.points[x]) for x in self.points}, 1000, 'season')
+
+        # verif
+        self.assertListEqual(['winter', 'summer'], list(actual.keys()))
+
+        # a segment belongs to the window of its start
+        expected = trace_cells({'a': self.points['a'][:101], 'b': np.empty((0, 2))}, 1000)
+        self.assertDictEqual(expected.to_dict(), actual['winter'].to_dict())
+
+        expected = trace_cells({'a': self.points['a'][100:], 'b': self.points['b']}, 1000)
+        self.assertDictEqual(expected.to_dict(), actual['summer'].to_dict())
+        np.testing.assert_array_equal(expected.codes, actual['summer'].codes)
+
+    def test_trace_windows_by_year(self):
+        # execute
+        actual = trace_windows({x: (self.timestamps[x], self.points[x]) for x in self.points}, 1000, 'year')
+
+        # verif
+        self.assertListEqual(['2021', '2022'], list(actual.keys()))
+        self.assertListEqual([0], np.unique(actual['2021'].codes).tolist())
+        self.assertListEqual([1], np.unique(actual['2022'].codes).tolist())
+
+    def test_split_windows_keeps_first_fix_of_every_window(self):
+        # prepare
+        # a straight migration from February 15th to March 16th, simplified to its end points as a whole
+        timestamps = np.datetime64('2021-02-15') + np.arange(30) * np.timedelta64(1, 'D')
+        coordinates = np.stack((np.linspace(8, 10, 30), np.linspace(48, 53, 30)), axis=1)
+        extracted = [('a', timestamps, coordinates)]
+
+        # execute
+        pieces = split_windows(extracted, 'season')
+        actual = join_windows(Reduce(350)(pieces, timestamps=True))
+
+        # verif
+        self.assertListEqual([('a', 0), ('a', 1)], [x[0] for x in pieces])
+        self.assertEqual(2, len(Reduce(350)(extracted)['a']))
+        times, points = actual['a']
+        np.testing.assert_array_equal(timestamps[[0, 14, 29]], times)
+        np.testing.assert_array_equal(coordinates[[0, 14, 29], ::-1], points)
+
+        windows = trace_windows(actual, 1000, 'season')
+        self.assertListEqual(['winter', 'spring'], list(windows.keys()))
+        self.assertGreater(len(windows['spring']), len(windows['winter']))
+
+    def test_reduce_keeps_timestamps(self):
+        # prepare
+        data = [(x, self.timestamps[x], self.points[x][:, ::-1]) for x in self.points]
+
+        # execute
+        actual = Reduce(5000)(data, timestamps=True)
+
+        # verif
+        for key, (timestamps, points) in actual.items():
+            self.assertLess(len(points), len(self.points[key]))
+            self.assertEqual(len(timestamps), len(points))
+            index = np.searchsorted(self.timestamps[key], timestamps)
+            np.testing.assert_array_equal(self.points[key][index], points)
+
+    def test_check_config(self):
+        self.assertEqual('none', App.check_config({})['time_windows'])
+        with self.assertRaises(ValueError):
+            App.check_config({'time_windows': 'week'})
+        with self.assertRaises(ValueError):
+            App.check_config({'time_windows': 'month', 'incremental': True})
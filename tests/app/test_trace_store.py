@@ -0,0 +1,66 @@
+import unittest
+
+import numpy as np
+
+from app.app import App
+from app.generate_map import trace_cells
+from app.trace_store import TraceStore
+
+
+class TraceStoreTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        rng = np.random.default_rng(11)
+        self.data = {
+            'a': 48 + np.cumsum(rng.normal(0, 0.02, size=(300, 2)), axis=0),
+            'b': 48 + np.cumsum(rng.normal(0, 0.02, size=(200, 2)), axis=0),
+            'c': np.array([[48.0, 8.0]])
+        }
+
+    def test_coarsen_matches_tracing(self):
+        # prepare
+        fine = trace_cells(self.data, 250)
+
+        # execute
+        actual = fine.coarsen(8)
+
+        # verif
+        expected = trace_cells(self.data, 2000)
+        self.assertDictEqual(expected.to_dict(), actual.to_dict())
+        np.testing.assert_array_equal(expected.counts, actual.counts)
+
+    def test_sweep_traces_once(self):
+        # prepare
+        sut = TraceStore()
+
+        # execute
+        actual = {x: sut.trace(self.data, x) for x in [500, 1000, 2000, 3000, 500]}
+
+        # verif
+        for resolution, cell_index in actual.items():
+            self.assertDictEqual(trace_cells(self.data, resolution).to_dict(), cell_index.to_dict())
+        self.assertEqual(3, sut.traced)
+        self.assertEqual(9, sut.derived)
+        self.assertListEqual([500, 1000, 2000, 3000], sut.resolutions('a'))
+
+    def test_trace_only_new_individuals(self):
+        # prepare
+        sut = TraceStore()
+        sut.trace({'a': self.data['a']}, 1000)
+
+        # execute
+        actual = sut.trace(self.data, 1000)
+
+        # verif
+        self.assertEqual(3, sut.traced)
+        self.assertListEqual(['a', 'b', 'c'], actual.individuals)
+        self.assertDictEqual(trace_cells(self.data, 1000).to_dict(), actual.to_dict())
+
+    def test_check_config_parses_sweep(self):
+        self.assertListEqual([], App.check_config({})['grid_resolution_sweep'])
+        self.assertListEqual([1000, 4000], App.check_config({'grid_resolution_sweep': '1000, 4000'})['grid_resolution_sweep'])
+        self.assertListEqual([500], App.check_config({'grid_resolution_sweep': [500]})['grid_resolution_sweep'])
+        with self.assertRaises(ValueError):
+            App.check_config({'grid_resolution_sweep': '1000, abc'})
+        with self.assertRaises(ValueError):
+            App.check_config({'grid_resolution_sweep': '0'})
@@ -0,0 +1,119 @@
+import unittest
+
+import numpy as np
+
+from app.generate_map import trace_cells, trace_cells_parallel, shard_trajectories
+from app.sequence import SequenceBuilder
+from app.traversal import BatchTraversal
+
+
+class BatchTraversalTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.resolution = 500
+        self.sut = BatchTraversal(self.resolution)
+
+    def test_trace_matches_sequence(self):
+        # prepare
+        rng = np.random.default_rng(42)
+        starts = rng.uniform(10, 12, size=(500, 2))
+        stops = starts + rng.normal(0, 0.05, size=(500, 2))
+        builder = SequenceBuilder(self.resolution)
+
+        # execute
+        cell_x, cell_y, segment = self.sut.trace(starts, stops)
+
+        # verif
+        for i in range(len(starts)):
+            expected = set(builder.create(starts[i], stops[i]).calculate_cells())
+            mask = segment == i
+            actual = set(zip(cell_x[mask].tolist(), cell_y[mask].tolist()))
+            self.assertSetEqual(expected, actual)
+
+    def test_trace_cells_engines_agree(self):
+        # prepare
+        rng = np.random.default_rng(7)
+        data = {
+            'a': 48 + np.cumsum(rng.normal(0, 0.02, size=(200, 2)), axis=0),
+            'b': 48 + np.cumsum(rng.normal(0, 0.02, size=(150, 2)), axis=0),
+            'c': np.array([[48.0, 8.0]])
+        }
+
+        # execute
+        expected = trace_cells(data, self.resolution, engine='sequence')
+        actual = trace_cells(data, self.resolution, engine='batch')
+
+        # verif
+        self.assertDictEqual(expected.to_dict(), actual.to_dict())
+        np.testing.assert_array_equal(expected.counts, actual.counts)
+
+    def test_short_segments_match_sequence(self):
+        # prepare
+        # steps of a few hundred meters mostly stay in their cell or enter an adjacent one
+        rng = np.random.default_rng(3)
+        points = 48 + np.cumsum(rng.normal(0, 0.002, size=(1000, 2)), axis=0)
+        data = {'a': points, 'b': points[::-1].copy()}
+        builder = SequenceBuilder(self.resolution)
+
+        # execute
+        cell_x, cell_y, segment = self.sut.trace(points[:-1], points[1:])
+        expected = trace_cells(data, self.resolution, engine='sequence')
+        actual = trace_cells(data, self.resolution, engine='batch')
+
+        # verif
+        for i in range(len(points) - 1):
+            expected_cells = set(builder.create(points[i], points[i + 1]).calculate_cells())
+            mask = segment == i
+            self.assertSetEqual(expected_cells, set(zip(cell_x[mask].tolist(), cell_y[mask].tolist())))
+        self.assertDictEqual(expected.to_dict(), actual.to_dict())
+
+    def test_call_drops_repeated_cells(self):
+        # prepare
+        data = {'a': np.array([[48.0, 8.0], [48.0001, 8.0001], [48.0002, 8.0002], [48.0, 8.0]])}
+
+        # execute
+        cell_x, cell_y, individual, _ = self.sut(data)
+
+        # verif
+        self.assertEqual(1, len(cell_x))
+
+    def test_call_without_segments(self):
+        # execute
+        cell_x, cell_y, individual, individuals = self.sut({'a': np.array([[1.0, 2.0]])})
+
+        # verif
+        self.assertEqual(0, len(cell_x))
+        self.assertListEqual(['a'], individuals)
+
+    def test_shard_trajectories_keeps_every_segment(self):
+        # prepare
+        data = {'a': np.arange(22.0).reshape(-1, 2), 'b': np.arange(6.0).reshape(-1, 2), 'c': np.array([[1.0, 2.0]])}
+
+        # execute
+        actual = shard_trajectories(data, 4)
+
+        # verif
+        self.assertListEqual([4, 4, 4], [sum(len(x) - 1 for _, x in shard) for shard in actual])
+        for code, key in enumerate(data.keys()):
+            pieces = [x for shard in actual for c, x in shard if c == code]
+            segments = set(tuple(map(tuple, x[i:i + 2])) for x in pieces for i in range(len(x) - 1))
+            expected = set(tuple(map(tuple, data[key][i:i + 2])) for i in range(len(data[key]) - 1))
+            self.assertSetEqual(expected, segments)
+
+    def test_trace_cells_parallel(self):
+        # prepare
+        rng = np.random.default_rng(11)
+        data = {
+            'a': 48 + np.cumsum(rng.normal(0, 0.02, size=(500, 2)), axis=0),
+            'b': 48 + np.cumsum(rng.normal(0, 0.02, size=(30, 2)), axis=0),
+            'c': np.array([[48.0, 8.0]])
+        }
+        expected = trace_cells(data, self.resolution)
+
+        # execute
+        actual = trace_cells_parallel(data, self.resolution, workers=2, shard_segments=100)
+
+        # verif
+        self.assertListEqual(expected.individuals, actual.individuals)
+        np.testing.assert_array_equal(expected.keys, actual.keys)
+        np.testing.assert_array_equal(expected.codes, actual.codes)
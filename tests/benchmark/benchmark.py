@@ -0,0 +1,179 @@
+"""
+Benchmark of the corridor detection stages on synthetic data
+
+    python -m tests.benchmark.benchmark --individuals 50 --fixes 5000 --grid 500 2000 --rdp 100 350
+    python -m tests.benchmark.benchmark --compare tests/resources/output/benchmark-old.json
+
+Results are stored as JSON, so that runs of different versions can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from app.app import App
+from app.data_extract import DataExtractor
+from app.generate_map import generate_map
+from app.profiling import StageProfiler
+from app.reduce import Reduce
+from sdk.moveapps_io import MoveAppsIo
+from tests.benchmark.synthetic import create_collection, SHAPES
+from tests.config.definitions import ROOT_DIR
+
+def timed(function, *args, **kwargs):
+    """
+    Calls function and measures its wall time
+
+    :returns: Tuple(result, seconds)
+    """
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+
+    return result, time.perf_counter() - start
+
+def run(dataset, grid_resolutions, rdp_resolutions, individual_threshold = 1, repeat = 1):
+    """
+    Times extraction, reduction, the generate_map stages and App.save_polygon for every
+    combination of grid and rdp resolution, the fastest of repeat runs is kept per stage
+
+    :param dataset: Dict - the keyword arguments of create_collection
+    :param grid_resolutions: The grid resolutions in meters
+    :param rdp_resolutions: The rdp epsilons in meters
+    :param individual_threshold: The capture threshold
+    :param repeat: The number of runs per combination
+    :returns: Dict - the benchmark results
+    """
+    collection = create_collection(**dataset)
+    results = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'dataset': dataset,
+        'runs': []
+    }
+
+    artifacts_dir = os.environ.get('APP_ARTIFACTS_DIR')
+    with tempfile.TemporaryDirectory() as artifacts:
+        os.environ['APP_ARTIFACTS_DIR'] = artifacts
+        app = App(moveapps_io=MoveAppsIo())
+
+        for rdp_resolution in rdp_resolutions:
+            for grid_resolution in grid_resolutions:
+                timings = {}
+                counts = {}
+
+                for _ in range(repeat):
+                    extracted, seconds = timed(lambda: list(DataExtractor()(collection)))
+                    stages = {'extract': seconds}
+
+                    reduced, seconds = timed(Reduce(rdp_resolution), extracted)
+                    stages['reduce'] = seconds
+
+                    profiler = StageProfiler()
+                    (_, polygons, graduation), _ = timed(generate_map, reduced, resolution_in_m=grid_resolution,
+                                                         individual_threshold=individual_threshold, profiler=profiler)
+                    for record in profiler.stages:
+                        stages[record['stage']] = record['wall_time_s']
+                        counts.update({k: v for k, v in record.items() if k not in ('stage', 'wall_time_s', 'peak_rss_mb')})
+
+                    _, seconds = timed(app.save_polygon, polygons, collection.trajectories[0].crs, graduation)
+                    stages['save_polygon'] = seconds
+
+                    for stage, seconds in stages.items():
+                        timings[stage] = min(timings.get(stage, seconds), seconds)
+
+                counts['points_in'] = sum(len(x[2]) for x in extracted)
+                counts['points_out'] = sum(len(x) for x in reduced.values())
+
+                results['runs'].append({
+                    'grid_resolution': grid_resolution,
+                    'rdp_resolution': rdp_resolution,
+                    'timings_s': timings,
+                    'total_s': sum(timings.values()),
+                    'counts': counts
+                })
+
+    if artifacts_dir is None:
+        del os.environ['APP_ARTIFACTS_DIR']
+    else:
+        os.environ['APP_ARTIFACTS_DIR'] = artifacts_dir
+
+    return results
+
+def compare(current, previous):
+    """
+    Compares the timings of two benchmark results run by run and stage by stage
+
+    :returns: List of Tuple(grid_resolution, rdp_resolution, stage, previous_s, current_s, ratio)
+    """
+    def key(run):
+        return (run['grid_resolution'], run['rdp_resolution'])
+
+    previous_runs = {key(x): x for x in previous['runs']}
+
+    res = []
+    for run in current['runs']:
+        if key(run) not in previous_runs:
+            continue
+
+        before = previous_runs[key(run)]['timings_s']
+        for stage, seconds in run['timings_s'].items():
+            if stage in before and before[stage] > 0:
+                res.append((*key(run), stage, before[stage], seconds, seconds / before[stage]))
+
+    return res
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the corridor detection on synthetic trajectories')
+    parser.add_argument('--individuals', type=int, default=20)
+    parser.add_argument('--fixes', type=int, default=2000, help='positions per individual')
+    parser.add_argument('--extent', type=float, nargs=4, default=[7.0, 47.0, 9.0, 49.0],
+                        metavar=('MIN_LON', 'MIN_LAT', 'MAX_LON', 'MAX_LAT'))
+    parser.add_argument('--shape', choices=SHAPES, default='random_walk')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--grid', type=int, nargs='+', default=[500, 2000], help='grid resolutions in meters')
+    parser.add_argument('--rdp', type=int, nargs='+', default=[100, 350], help='rdp epsilons in meters')
+    parser.add_argument('--threshold', type=int, default=1, help='capture threshold')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--output', default=None, help='path of the JSON result')
+    parser.add_argument('--compare', default=None, help='path of a previous JSON result')
+    args = parser.parse_args()
+
+    dataset = {
+        'individuals': args.individuals,
+        'fixes': args.fixes,
+        'extent': tuple(args.extent),
+        'shape': args.shape,
+        'seed': args.seed
+    }
+    results = run(dataset, args.grid, args.rdp, args.threshold, args.repeat)
+
+    output = args.output
+    if output is None:
+        name = 'benchmark-{}.json'.format(datetime.now().strftime('%Y%m%d-%H%M%S'))
+        output = os.path.join(ROOT_DIR, 'tests/resources/output', name)
+
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    for run_result in results['runs']:
+        print('grid {grid_resolution:>6} m  rdp {rdp_resolution:>5} m  total {total_s:8.3f} s'.format(**run_result))
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            previous = json.load(f)
+
+        if previous['dataset'] != json.loads(json.dumps(results['dataset'])):
+            print('Warning: the datasets of both results differ')
+
+        for grid, rdp, stage, before, after, ratio in compare(results, previous):
+            print('grid {:>6} m  rdp {:>5} m  {:<12} {:8.3f} s -> {:8.3f} s  ({:.2f}x)'.format(
+                grid, rdp, stage, before, after, ratio))
+
+    print('Results written to {}'.format(output))
+
+if __name__ == '__main__':
+    main()
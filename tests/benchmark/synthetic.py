@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import movingpandas as mpd
+
+from app.sequence import SequenceBuilder
+
+SHAPES = ['random_walk', 'migratory']
+
+def correlated_random_walk(rng, fixes, start, step_m = 500, turn_sd = 0.5):
+    """
+    Creates a correlated random walk, every step keeps the heading of the previous one
+    up to a normally distributed turning angle
+
+    :param rng: numpy random Generator
+    :param fixes: The number of positions
+    :param start: (lon, lat) of the first position
+    :param step_m: The mean step length in meters
+    :param turn_sd: The standard deviation of the turning angle in radians
+    :returns: Array (fixes, 2) of (lon, lat)
+    """
+    headings = rng.uniform(0, 2 * np.pi) + np.cumsum(rng.normal(0, turn_sd, fixes - 1))
+    lengths = rng.exponential(step_m, fixes - 1) / SequenceBuilder.DEG_TO_M
+
+    steps = np.stack((np.cos(headings) * lengths, np.sin(headings) * lengths), axis=1)
+    return np.asarray(start) + np.concatenate(([[0.0, 0.0]], np.cumsum(steps, axis=0)))
+
+def migratory_track(rng, fixes, start, end, seasons = 4, noise_m = 2000):
+    """
+    Creates a track that migrates back and forth between two areas, resting in
+    each area for half a season
+
+    :param rng: numpy random Generator
+    :param fixes: The number of positions
+    :param start: (lon, lat) of the first area
+    :param end: (lon, lat) of the second area
+    :param seasons: The number of one way migrations
+    :param noise_m: The standard deviation of the position noise in meters
+    :returns: Array (fixes, 2) of (lon, lat)
+    """
+    phase = np.linspace(0, seasons, fixes)
+    # triangle wave 0 -> 1 -> 0 per two seasons, flattened so that the individual
+    # rests in both areas (progress 0 and 1) and smoothly migrates in between
+    triangle = 1 - np.abs((phase % 2) - 1)
+    progress = np.clip(triangle * 2 - 0.5, 0, 1)
+    progress = progress * progress * (3 - 2 * progress)
+
+    route_offset = np.sin(progress * np.pi)[:, None] * rng.normal(0, 0.5, 2)
+    track = np.asarray(start) + progress[:, None] * (np.asarray(end) - np.asarray(start)) + route_offset
+
+    return track + rng.normal(0, noise_m / SequenceBuilder.DEG_TO_M, size=(fixes, 2))
+
+def create_collection(individuals = 10, fixes = 1000, extent = (7.0, 47.0, 9.0, 49.0), shape = 'random_walk',
+                      interval = '1h', seed = 0):
+    """
+    Creates a synthetic TrajectoryCollection with the columns the app expects
+
+    :param individuals: The number of individuals
+    :param fixes: The number of positions per individual
+    :param extent: (min_lon, min_lat, max_lon, max_lat) - the area the tracks start in,
+                    migratory tracks migrate from its south west to its north east part
+    :param shape: 'random_walk' or 'migratory'
+    :param interval: The time between two positions, as pandas frequency
+    :param seed: The seed of the random generator
+    """
+    if shape not in SHAPES:
+        raise ValueError("Unknown shape '{}'".format(shape))
+
+    rng = np.random.default_rng(seed)
+    min_lon, min_lat, max_lon, max_lat = extent
+    width = max_lon - min_lon
+    height = max_lat - min_lat
+
+    frames = []
+    for i in range(individuals):
+        if shape == 'random_walk':
+            start = (rng.uniform(min_lon, max_lon), rng.uniform(min_lat, max_lat))
+            track = correlated_random_walk(rng, fixes, start)
+        else:
+            start = (min_lon + rng.uniform(0, 0.25) * width, min_lat + rng.uniform(0, 0.25) * height)
+            end = (max_lon - rng.uniform(0, 0.25) * width, max_lat - rng.uniform(0, 0.25) * height)
+            track = migratory_track(rng, fixes, start, end)
+
+        frames.append(pd.DataFrame({
+            'timestamp': pd.date_range('2020-01-01', periods=fixes, freq=interval, tz='UTC'),
+            'individual_local_identifier': 'individual-{}'.format(i),
+            'x': track[:, 0],
+            'y': track[:, 1]
+        }))
+
+    df = pd.concat(frames, ignore_index=True)
+    gdf = gpd.GeoDataFrame(df, geometry=gpd.points_from_xy(df.x, df.y), crs='EPSG:4326')
+    gdf = gdf.set_index(pd.DatetimeIndex(gdf.timestamp).rename('t'))
+
+    return mpd.TrajectoryCollection(gdf, traj_id_col='individual_local_identifier')
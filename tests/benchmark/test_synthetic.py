@@ -0,0 +1,45 @@
+import unittest
+
+import numpy as np
+
+from app.data_extract import DataExtractor
+from tests.benchmark.benchmark import compare
+from tests.benchmark.synthetic import create_collection
+
+
+class SyntheticTests(unittest.TestCase):
+
+    def test_create_collection(self):
+        for shape in ['random_walk', 'migratory']:
+            # execute
+            actual = list(DataExtractor()(create_collection(individuals=3, fixes=50, shape=shape)))
+
+            # verif
+            self.assertEqual(3, len(actual), shape)
+            for _, timestamps, coordinates in actual:
+                self.assertEqual(50, len(timestamps))
+                self.assertTrue(np.all(np.diff(timestamps) > np.timedelta64(0)))
+                self.assertTrue(np.all(np.abs(coordinates - [8, 48]) < 3))
+
+    def test_create_collection_is_reproducible(self):
+        # execute
+        first = list(DataExtractor()(create_collection(individuals=2, fixes=20, seed=4)))
+        second = list(DataExtractor()(create_collection(individuals=2, fixes=20, seed=4)))
+
+        # verif
+        for a, b in zip(first, second):
+            np.testing.assert_array_equal(a[2], b[2])
+
+    def test_compare_matches_runs(self):
+        # prepare
+        previous = {'runs': [{'grid_resolution': 500, 'rdp_resolution': 100, 'timings_s': {'trace': 2.0}}]}
+        current = {'runs': [
+            {'grid_resolution': 500, 'rdp_resolution': 100, 'timings_s': {'trace': 1.0, 'fill': 1.0}},
+            {'grid_resolution': 2000, 'rdp_resolution': 100, 'timings_s': {'trace': 1.0}}
+        ]}
+
+        # execute
+        actual = compare(current, previous)
+
+        # verif
+        self.assertListEqual([(500, 100, 'trace', 2.0, 1.0, 0.5)], actual)
@@ -0,0 +1,71 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+from tests.config.definitions import ROOT_DIR
+
+# modules that take long to import and are only needed by some stages
+HEAVY_MODULES = ['pandas', 'movingpandas', 'folium', 'branca', 'geopandas', 'fiona', 'pyogrio', 'scipy', 'pyproj', 'shapely']
+
+# measured in a fresh interpreter, the heavy modules alone take several seconds on a cold container
+MAX_STARTUP_S = 1.5
+
+
+class TestStartup(TestCase):
+
+    def run_python(self, code, env=None):
+        result = subprocess.run([sys.executable, '-c', code], cwd=ROOT_DIR, env=env,
+                                capture_output=True, text=True, timeout=60)
+        self.assertEqual(0, result.returncode, result.stderr)
+        return result.stdout
+
+    def test_import_is_fast_and_light(self):
+        # prepare
+        code = """
+import json, sys, time
+start = time.perf_counter()
+import sdk
+from sdk.moveapps_execution import MoveAppsExecutor
+from sdk.moveapps_io import MoveAppsIo
+from app.app import App
+print(json.dumps({'seconds': time.perf_counter() - start, 'modules': sorted(sys.modules)}))
+"""
+
+        # execute
+        actual = json.loads(self.run_python(code))
+
+        # verify
+        self.assertListEqual([], [x for x in HEAVY_MODULES if x in actual['modules']])
+        self.assertLess(actual['seconds'], MAX_STARTUP_S)
+
+    def test_error_path_without_heavy_imports(self):
+        # prepare
+        code = """
+import json, sys
+from sdk.moveapps_spec import MoveAppsSpec, HOOK_NAMESPACE
+from sdk.moveapps_execution import MoveAppsExecutor
+import pluggy
+
+pm = pluggy.PluginManager(HOOK_NAMESPACE)
+pm.add_hookspecs(MoveAppsSpec)
+try:
+    MoveAppsExecutor(plugin_manager=pm).execute()
+except ValueError:
+    pass
+print(json.dumps(sorted(sys.modules)))
+"""
+        with tempfile.TemporaryDirectory() as folder:
+            config_file = os.path.join(folder, 'app-configuration.json')
+            with open(config_file, 'w') as f:
+                f.write('{not json')
+            error_file = os.path.join(folder, 'error.txt')
+            env = dict(os.environ, CONFIGURATION_FILE=config_file, ERROR_FILE=error_file)
+
+            # execute
+            modules = json.loads(self.run_python(code, env))
+
+            # verify
+            self.assertTrue(os.path.exists(error_file))
+            self.assertListEqual([], [x for x in HEAVY_MODULES if x in modules])